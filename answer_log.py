@@ -0,0 +1,459 @@
+# answer_log.py
+"""
+Журнал ответов: каждое нажатие на вариант записывается событием
+фиксированного размера в сегментные файлы, только дописыванием.
+
+События копятся в памяти и записываются в отдельном потоке раз в
+flush_interval секунд, поэтому ответ пользователя не ждёт диска, а
+аналитика читает файлы, не трогая таблицы quiz_state и user_stats.
+
+Сегменты:
+    answers-<время создания, нс>-<процесс>.active — дописывается сейчас
+    answers-<время создания, нс>-<процесс>.log — закрыт (по размеру или возрасту)
+
+Сжатие (compact) объединяет закрытые сегменты в крупные и удаляет события
+старше срока хранения. Запуск вручную:
+    python -m answer_log compact data/answers --retention-days 90
+    python -m answer_log stats data/answers
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import struct
+import sys
+import time
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Заголовок сегмента: сигнатура, версия формата, размер события
+SEGMENT_MAGIC = b'ICAE'
+SEGMENT_VERSION = 1
+SEGMENT_HEADER = struct.Struct('<4sHH')
+
+# Событие: время ответа (unix, с), ID пользователя, номер сессии квиза,
+# ID вопроса, время на ответ (мс, 0 — неизвестно), номер вопроса в квизе,
+# исходный индекс выбранного варианта, правильный ли ответ
+ANSWER_EVENT = struct.Struct('<dqIIIBBBx')
+EVENT_FIELDS = ('timestamp', 'user_id', 'nonce', 'question_id', 'response_ms', 'position', 'option', 'correct')
+# Только время события — для отбора по сроку хранения без разбора остальных полей
+EVENT_TIMESTAMP = struct.Struct(f'<d{ANSWER_EVENT.size - 8}x')
+
+SEGMENT_PREFIX = 'answers-'
+ACTIVE_SUFFIX = '.active'
+SEALED_SUFFIX = '.log'
+# Незавершённое сжатие: какие сегменты заменяет записанный результат
+INTENT_FILE = 'compaction.intent'
+
+# После стольких байт в буфере запись начинается, не дожидаясь flush_interval
+FLUSH_BYTES = 1024 * 1024
+# Не больше стольких байт событий ждут записи; остальные отбрасываются, если диск не успевает
+MAX_PENDING_BYTES = 64 * 1024 * 1024
+
+
+def _segment_name(tag: str, suffix: str) -> str:
+    return f"{SEGMENT_PREFIX}{time.time_ns():020d}-{tag}{suffix}"
+
+
+def _read_intent(directory: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, INTENT_FILE), encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def list_segments(directory: str, include_active: bool = True) -> list:
+    """
+    Пути сегментов журнала в порядке создания
+
+    Args:
+        directory: Каталог журнала
+        include_active: Включать сегменты, которые ещё дописываются
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+
+    # Сжатие прервалось после записи результата — его исходные сегменты уже учтены в нём
+    intent = _read_intent(directory)
+    replaced = set(intent['inputs']) if intent is not None and intent['output'] in names else set()
+
+    suffixes = (SEALED_SUFFIX, ACTIVE_SUFFIX) if include_active else (SEALED_SUFFIX,)
+    return [
+        os.path.join(directory, name) for name in sorted(names)
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(suffixes) and name not in replaced
+    ]
+
+
+def read_segment(path: str) -> bytes:
+    """
+    События сегмента подряд, без заголовка
+
+    Недописанное последнее событие (сегмент пишется прямо сейчас или процесс
+    упал во время записи) отбрасывается.
+
+    Raises:
+        ValueError: Если файл не является сегментом журнала
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < SEGMENT_HEADER.size:
+        # Активный сегмент создан, но заголовок ещё не записан
+        return b''
+
+    magic, version, event_size = SEGMENT_HEADER.unpack_from(data)
+    if magic != SEGMENT_MAGIC or version != SEGMENT_VERSION or event_size != ANSWER_EVENT.size:
+        raise ValueError(f"{path}: не сегмент журнала ответов версии {SEGMENT_VERSION}")
+
+    body = memoryview(data)[SEGMENT_HEADER.size:]
+    return bytes(body[:len(body) - len(body) % ANSWER_EVENT.size])
+
+
+def iter_events(directory: str, include_active: bool = True) -> Iterator[tuple]:
+    """События журнала по порядку: кортежи с полями EVENT_FIELDS"""
+    for path in list_segments(directory, include_active):
+        yield from ANSWER_EVENT.iter_unpack(read_segment(path))
+
+
+class AnswerLog:
+    """
+    Запись событий ответов в сегменты одного процесса
+
+    append() только добавляет упакованное событие в буфер; запись в файл,
+    смена сегмента и его закрытие выполняются в отдельном потоке.
+    """
+
+    def __init__(
+            self,
+            directory: str,
+            tag: str = "main",
+            flush_interval: float = 1.0,
+            segment_max_bytes: int = 64 * 1024 * 1024,
+            segment_max_age: float = 60 * 60
+    ):
+        """
+        Args:
+            directory: Каталог журнала
+            tag: Имя процесса в именах сегментов (у каждого процесса свои сегменты)
+            flush_interval: Максимальная задержка записи в секундах
+            segment_max_bytes: Размер, после которого сегмент закрывается
+            segment_max_age: Возраст в секундах, после которого сегмент закрывается
+        """
+        self.directory = directory
+        self.tag = tag
+        self.flush_interval = flush_interval
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age
+
+        self._buffer = bytearray()
+        self._file = None
+        self._path: Optional[str] = None
+        self._opened_at = 0.0
+        self._write_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.written = 0
+        self.dropped = 0
+
+    def append(self, user_id: int, nonce: int, question_id: int, position: int, option: int, correct: bool,
+               response_ms: int = 0):
+        """Добавление события ответа в буфер записи"""
+        if len(self._buffer) >= MAX_PENDING_BYTES:
+            self.dropped += 1
+            return
+        self._buffer += ANSWER_EVENT.pack(
+            time.time(), user_id, nonce, question_id, min(response_ms, 0xFFFFFFFF), position, option, correct
+        )
+        if len(self._buffer) >= FLUSH_BYTES:
+            self._wakeup.set()
+
+    def start(self):
+        """Закрытие сегментов, оставшихся от прошлого запуска, и запуск фоновой записи"""
+        os.makedirs(self.directory, exist_ok=True)
+        suffix = f"-{self.tag}{ACTIVE_SUFFIX}"
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(suffix):
+                self._seal_path(os.path.join(self.directory, name))
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except OSError as exc_write:
+                logger.error(f"Ошибка записи журнала ответов: {exc_write}")
+
+    async def flush(self):
+        """Запись накопленных событий"""
+        async with self._write_lock:
+            if not self._buffer:
+                if self._file is not None and time.monotonic() - self._opened_at >= self.segment_max_age:
+                    await asyncio.to_thread(self._seal)
+                return
+            data, self._buffer = bytes(self._buffer), bytearray()
+            try:
+                await asyncio.to_thread(self._write, data)
+            except OSError:
+                # Возвращаем события в начало буфера, чтобы повторить запись
+                self._buffer[:0] = data
+                raise
+            self.written += len(data) // ANSWER_EVENT.size
+
+    def _write(self, data: bytes):
+        if self._file is None:
+            self._path = os.path.join(self.directory, _segment_name(self.tag, ACTIVE_SUFFIX))
+            self._file = open(self._path, 'ab')
+            self._file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, ANSWER_EVENT.size))
+            self._opened_at = time.monotonic()
+
+        self._file.write(data)
+        self._file.flush()
+
+        if (self._file.tell() >= self.segment_max_bytes
+                or time.monotonic() - self._opened_at >= self.segment_max_age):
+            self._seal()
+
+    def _seal(self):
+        """Закрытие текущего сегмента: следующая запись начнёт новый"""
+        if self._file is None:
+            return
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        self._seal_path(self._path)
+
+    @staticmethod
+    def _seal_path(path: str):
+        # Отрезаем недописанное событие, чтобы закрытый сегмент состоял из целых записей
+        size = os.path.getsize(path)
+        events_size = max(0, size - SEGMENT_HEADER.size) // ANSWER_EVENT.size * ANSWER_EVENT.size
+        if size < SEGMENT_HEADER.size:
+            os.remove(path)
+            return
+        if size != SEGMENT_HEADER.size + events_size:
+            os.truncate(path, SEGMENT_HEADER.size + events_size)
+        os.replace(path, path[:-len(ACTIVE_SUFFIX)] + SEALED_SUFFIX)
+
+    async def stop(self):
+        """Остановка фоновой записи, запись оставшихся событий и закрытие сегмента"""
+        # Не отменяем задачу: запись в потоке нельзя прервать посередине
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+
+        await self.flush()
+        async with self._write_lock:
+            await asyncio.to_thread(self._seal)
+
+
+def compact(directory: str, retention_days: float = 0, target_bytes: int = 256 * 1024 * 1024) -> dict:
+    """
+    Объединение закрытых сегментов и удаление старых событий
+
+    Подряд идущие сегменты собираются в новые размером до target_bytes.
+    Результат записывается во временный файл, затем в каталоге фиксируется,
+    какие сегменты он заменяет, и только после этого они удаляются, поэтому
+    прерванное сжатие не теряет и не дублирует события.
+
+    Args:
+        directory: Каталог журнала
+        retention_days: Срок хранения событий в днях (0 — без ограничения)
+        target_bytes: Размер объединённого сегмента
+
+    Returns:
+        Количество сегментов до и после сжатия и удалённых событий
+    """
+    _finish_compaction(directory)
+    segments = list_segments(directory, include_active=False)
+    cutoff = time.time() - retention_days * 86400 if retention_days else None
+
+    # Группы подряд идущих сегментов, не превышающие target_bytes
+    groups, group, group_size = [], [], 0
+    for path in segments:
+        size = os.path.getsize(path)
+        if group and group_size + size > target_bytes:
+            groups.append(group)
+            group, group_size = [], 0
+        group.append(path)
+        group_size += size
+    if group:
+        groups.append(group)
+
+    expired = 0
+    for group in groups:
+        if len(group) == 1 and cutoff is None:
+            continue
+
+        data = b''.join(read_segment(path) for path in group)
+        if cutoff is not None:
+            keep = [timestamp >= cutoff for (timestamp,) in EVENT_TIMESTAMP.iter_unpack(data)]
+            if not all(keep):
+                view = memoryview(data)
+                data = b''.join(
+                    view[index * ANSWER_EVENT.size:(index + 1) * ANSWER_EVENT.size]
+                    for index, kept in enumerate(keep) if kept
+                )
+                expired += len(keep) - len(data) // ANSWER_EVENT.size
+            elif len(group) == 1:
+                continue
+
+        inputs = [os.path.basename(path) for path in group]
+        if not data:
+            for path in group:
+                os.remove(path)
+            continue
+
+        # Новый сегмент сортируется на место первого из заменяемых
+        output = f"{inputs[0].split('-')[0]}-{inputs[0].split('-')[1]}-compact{time.time_ns()}{SEALED_SUFFIX}"
+        tmp_path = os.path.join(directory, output + '.tmp')
+        with open(tmp_path, 'wb') as file:
+            file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, ANSWER_EVENT.size))
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+
+        intent_tmp = os.path.join(directory, INTENT_FILE + '.tmp')
+        with open(intent_tmp, 'w', encoding='utf-8') as file:
+            json.dump({'output': output, 'inputs': inputs}, file)
+        os.replace(intent_tmp, os.path.join(directory, INTENT_FILE))
+
+        os.replace(tmp_path, os.path.join(directory, output))
+        _finish_compaction(directory)
+
+    return {
+        'segments_before': len(segments),
+        'segments_after': len(list_segments(directory, include_active=False)),
+        'expired_events': expired,
+    }
+
+
+def _finish_compaction(directory: str):
+    """Доведение до конца или откат прерванного сжатия"""
+    intent = _read_intent(directory)
+    if intent is None:
+        return
+
+    if os.path.exists(os.path.join(directory, intent['output'])):
+        for name in intent['inputs']:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    else:
+        # Результат не успел занять своё место — исходные сегменты остаются
+        try:
+            os.remove(os.path.join(directory, intent['output'] + '.tmp'))
+        except FileNotFoundError:
+            pass
+    os.remove(os.path.join(directory, INTENT_FILE))
+
+
+# Журнал этого процесса (None — журнал выключен) и фоновое сжатие
+_answer_log: Optional[AnswerLog] = None
+_compaction_task: Optional[asyncio.Task] = None
+
+
+def open_answer_log(directory: str, tag: str = "main", **options):
+    """Включение журнала ответов (параметры — как у AnswerLog)"""
+    global _answer_log
+    if _answer_log is not None:
+        return
+    answer_log = AnswerLog(directory, tag, **options)
+    answer_log.start()
+    _answer_log = answer_log
+
+
+async def close_answer_log():
+    """Запись оставшихся событий и выключение журнала"""
+    global _answer_log
+    if _answer_log is None:
+        return
+    answer_log, _answer_log = _answer_log, None
+    await answer_log.stop()
+
+
+def get_answer_log() -> Optional[AnswerLog]:
+    """Журнал ответов этого процесса или None, если он выключен"""
+    return _answer_log
+
+
+def log_answer(user_id: int, nonce: int, question_id: int, position: int, option: int, correct: bool,
+               response_ms: int = 0):
+    """Запись события ответа, если журнал включён"""
+    if _answer_log is not None:
+        _answer_log.append(user_id, nonce, question_id, position, option, correct, response_ms)
+
+
+async def _compact_periodically(directory: str, interval: float, retention_days: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = await asyncio.to_thread(compact, directory, retention_days)
+            if result['segments_before'] != result['segments_after'] or result['expired_events']:
+                logger.info(f"Журнал ответов сжат: сегментов {result['segments_before']} → "
+                            f"{result['segments_after']}, удалено старых событий {result['expired_events']}")
+        except (OSError, ValueError) as exc_compact:
+            logger.error(f"Ошибка сжатия журнала ответов: {exc_compact}")
+
+
+def start_compaction(directory: str, interval: float = 60 * 60, retention_days: float = 0):
+    """
+    Запуск фонового сжатия журнала раз в interval секунд
+
+    Сжатие должно выполняться одним процессом на каталог журнала.
+    """
+    global _compaction_task
+    if _compaction_task is None:
+        _compaction_task = asyncio.create_task(_compact_periodically(directory, interval, retention_days))
+
+
+async def stop_compaction():
+    """Остановка фонового сжатия журнала"""
+    global _compaction_task
+    if _compaction_task is None:
+        return
+
+    task = _compaction_task
+    _compaction_task = None
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обслуживание журнала ответов Icosa")
+    parser.add_argument("command", choices=("compact", "stats"), help="compact — сжатие, stats — сводка")
+    parser.add_argument("directory", help="Каталог журнала")
+    parser.add_argument("--retention-days", type=float, default=0, help="Удалить события старше N дней")
+    parser.add_argument("--target-mb", type=float, default=256, help="Размер объединённого сегмента, МБ")
+    args = parser.parse_args(argv)
+
+    if args.command == "compact":
+        result = compact(args.directory, args.retention_days, int(args.target_mb * 1024 * 1024))
+        print(f"Сегментов: {result['segments_before']} → {result['segments_after']}, "
+              f"удалено старых событий: {result['expired_events']}")
+        return
+
+    segments = list_segments(args.directory)
+    events = sum(len(read_segment(path)) // ANSWER_EVENT.size for path in segments)
+    size = sum(os.path.getsize(path) for path in segments)
+    print(f"Сегментов: {len(segments)}, событий: {events}, размер: {size / 1024 / 1024:.1f} МБ")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
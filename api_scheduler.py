@@ -0,0 +1,252 @@
+# api_scheduler.py
+import asyncio
+import heapq
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты вызовов Bot API: меньше — раньше. Ответ на нажатие кнопки
+# убирает «часики» у пользователя, поэтому он не ждёт за рассылкой сообщений
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+METHOD_PRIORITIES = {
+    "answerCallbackQuery": PRIORITY_HIGH,
+}
+
+
+class TokenBucket:
+    """Корзина токенов: rate токенов в секунду, не больше capacity в запасе"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated', 'paused_until')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def time_until_token(self, now: float) -> float:
+        """Сколько секунд ждать до появления токена (0 — токен есть)"""
+        self._refill(now)
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def take(self):
+        """Забрать токен, наличие которого проверено time_until_token()"""
+        self.tokens -= 1
+
+    def reserve(self, now: float) -> float:
+        """
+        Бронирование токена в порядке очереди
+
+        Запас может уйти в минус: каждый следующий вызов ждёт на 1/rate дольше.
+
+        Returns:
+            Сколько секунд ждать до отправки
+        """
+        self._refill(now)
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def pause(self, until: float):
+        """Остановка выдачи токенов до момента until (ответ 429 от Telegram)"""
+        self.paused_until = max(self.paused_until, until)
+
+    def is_idle(self, now: float) -> bool:
+        """Корзина полна и не на паузе — её можно удалить без потери состояния"""
+        self._refill(now)
+        return self.tokens >= self.capacity and self.paused_until <= now
+
+
+class OutgoingScheduler(BaseRequestMiddleware):
+    """
+    Планировщик исходящих вызовов Bot API (регистрируется в bot.session.middleware)
+
+    Каждый вызов проходит корзину своего чата (для вызовов с chat_id) и общую
+    корзину бота. Общие токены выдаются по приоритету, поэтому ответы на
+    нажатия кнопок не стоят в очереди за сообщениями. При ответе 429 корзина
+    чата (или общая, если чата нет) ставится на паузу на retry_after секунд,
+    и вызов повторяется.
+    """
+
+    def __init__(
+            self,
+            global_rate: float = 30.0,
+            chat_rate: float = 1.0,
+            chat_burst: float = 5.0,
+            group_rate: float = 20 / 60,
+            group_burst: float = 5.0,
+            max_retries: int = 3,
+            high_water: int = 500
+    ):
+        """
+        Args:
+            global_rate: Вызовов в секунду на весь бот (он же запас)
+            chat_rate: Вызовов в секунду в личный чат
+            chat_burst: Запас вызовов в личный чат
+            group_rate: Вызовов в секунду в группу или канал
+            group_burst: Запас вызовов в группу или канал
+            max_retries: Повторов вызова после ответа 429
+            high_water: Очередь вызовов, при которой приём новых обновлений приостанавливается
+        """
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.high_water = high_water
+
+        self._global: Optional[TokenBucket] = None
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._sweep_at = 1024
+
+        # Ожидающие общего токена: (приоритет, номер, future)
+        self._waiters: list = []
+        self._sequence = itertools.count()
+        self._pump_task: Optional[asyncio.Task] = None
+        self._chat_waiting = 0
+        self._has_capacity = asyncio.Event()
+        self._has_capacity.set()
+
+        self.retried = 0
+
+    @property
+    def backlog(self) -> int:
+        """Вызовы, ожидающие токена"""
+        return len(self._waiters) + self._chat_waiting
+
+    def _update_capacity(self):
+        if self.backlog >= self.high_water:
+            self._has_capacity.clear()
+        else:
+            self._has_capacity.set()
+
+    async def wait_for_capacity(self):
+        """Ожидание, пока очередь вызовов не опустится ниже high_water"""
+        while self.backlog >= self.high_water:
+            await self._has_capacity.wait()
+
+    def _chat_bucket(self, chat_id, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self._sweep_at:
+                # Полные корзины ничего не помнят — удаляем их, чтобы словарь не рос
+                self._chats = {key: value for key, value in self._chats.items() if not value.is_idle(now)}
+                self._sweep_at = max(1024, 2 * len(self._chats))
+            # Отрицательные id — группы и каналы, у них ограничения строже
+            is_private = isinstance(chat_id, int) and chat_id > 0
+            bucket = self._chats[chat_id] = TokenBucket(
+                self.chat_rate if is_private else self.group_rate,
+                self.chat_burst if is_private else self.group_burst,
+                now
+            )
+        return bucket
+
+    async def _wait_chat(self, chat_id):
+        now = asyncio.get_running_loop().time()
+        wait = self._chat_bucket(chat_id, now).reserve(now)
+        if wait <= 0:
+            return
+
+        self._chat_waiting += 1
+        self._update_capacity()
+        try:
+            await asyncio.sleep(wait)
+        finally:
+            self._chat_waiting -= 1
+            self._update_capacity()
+
+    async def _acquire_global(self, priority: int):
+        loop = asyncio.get_running_loop()
+        if self._global is None:
+            self._global = TokenBucket(self.global_rate, self.global_rate, loop.time())
+
+        if not self._waiters and self._global.time_until_token(loop.time()) <= 0:
+            self._global.take()
+            return
+
+        future = loop.create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self._update_capacity()
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        await future
+
+    async def _pump(self):
+        """Выдача общих токенов ожидающим в порядке приоритета"""
+        loop = asyncio.get_running_loop()
+        while self._waiters:
+            wait = self._global.time_until_token(loop.time())
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            _, _, future = heapq.heappop(self._waiters)
+            self._update_capacity()
+            # Вызов мог быть отменён, пока ждал — его токен достаётся следующему
+            if not future.done():
+                self._global.take()
+                future.set_result(None)
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        chat_id = getattr(method, "chat_id", None)
+        priority = METHOD_PRIORITIES.get(name, PRIORITY_NORMAL)
+
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self._wait_chat(chat_id)
+            await self._acquire_global(priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as exc_flood:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retried += 1
+
+                now = asyncio.get_running_loop().time()
+                until = now + exc_flood.retry_after
+                if chat_id is not None:
+                    self._chat_bucket(chat_id, now).pause(until)
+                else:
+                    self._global.pause(until)
+                logger.warning(f"Telegram ограничил {name} (чат {chat_id}) на {exc_flood.retry_after} с, "
+                               f"повтор {attempt} из {self.max_retries}")
+
+
+class BackpressureMiddleware(BaseMiddleware):
+    """
+    Приостановка обработки новых обновлений, пока очередь исходящих вызовов
+    планировщика переполнена (регистрируется как outer middleware на dp.update)
+
+    Уже начатые квизы продолжают получать ответы, а новые обновления ждут,
+    вместо того чтобы добавлять вызовы в очередь.
+    """
+
+    def __init__(self, scheduler: OutgoingScheduler):
+        self.scheduler = scheduler
+
+    async def __call__(
+            self,
+            handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+            event: Any,
+            data: Dict[str, Any]
+    ) -> Any:
+        await self.scheduler.wait_for_capacity()
+        return await handler(event, data)
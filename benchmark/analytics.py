@@ -0,0 +1,96 @@
+# benchmark/analytics.py
+"""
+Нагрузочный тест статистики вопросов: генерирует синтетический журнал ответов
+заданного размера и замеряет чтение и расчёт question_analytics.
+
+Ответы моделируются по способности пользователя и сложности вопроса, поэтому
+у сложных вопросов доля правильных ответов ниже, а индекс дискриминации
+положителен.
+
+Запуск из корня проекта:
+    python -m benchmark.analytics --events 20000000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from answer_log import ANSWER_EVENT, SEGMENT_HEADER, SEGMENT_MAGIC, SEGMENT_VERSION
+from question_analytics import _event_dtype, load_events, question_stats
+
+
+def write_synthetic_log(directory: str, events: int, questions: int, quiz_length: int,
+                        segment_events: int, seed: int = 0) -> np.ndarray:
+    """
+    Запись синтетического журнала сегментами по segment_events событий
+
+    Returns:
+        Истинная вероятность правильного ответа на каждый вопрос для среднего пользователя
+    """
+    rng = np.random.default_rng(seed)
+    difficulty = rng.normal(0, 1, questions)
+    sessions = events // quiz_length
+
+    dtype = _event_dtype()
+    for number, start in enumerate(range(0, sessions, segment_events // quiz_length)):
+        count = min(segment_events // quiz_length, sessions - start)
+        ability = np.repeat(rng.normal(0, 1, count), quiz_length)
+        question_ids = rng.integers(0, questions, count * quiz_length)
+        probability = 1 / (1 + np.exp(difficulty[question_ids] - ability))
+
+        chunk = np.zeros(count * quiz_length, dtype=dtype)
+        chunk['timestamp'] = time.time()
+        chunk['user_id'] = np.repeat(rng.integers(1, 10 ** 10, count), quiz_length)
+        chunk['nonce'] = np.repeat(rng.integers(0, 2 ** 32, count, dtype=np.uint32), quiz_length)
+        chunk['question_id'] = question_ids
+        chunk['position'] = np.tile(np.arange(quiz_length), count)
+        chunk['correct'] = rng.random(count * quiz_length) < probability
+        # Правильный вариант — 0, неправильные выбираются равновероятно
+        chunk['option'] = np.where(chunk['correct'], 0, rng.integers(1, 4, count * quiz_length))
+        chunk['response_ms'] = rng.lognormal(8.5, 0.5, count * quiz_length).astype(np.uint32)
+
+        path = os.path.join(directory, f"answers-{number:020d}-bench.log")
+        with open(path, 'wb') as file:
+            file.write(SEGMENT_HEADER.pack(SEGMENT_MAGIC, SEGMENT_VERSION, ANSWER_EVENT.size))
+            file.write(chunk.tobytes())
+
+    return 1 / (1 + np.exp(difficulty))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест статистики вопросов Icosa")
+    parser.add_argument("--events", type=int, default=10_000_000, help="Количество событий")
+    parser.add_argument("--questions", type=int, default=2000, help="Количество вопросов")
+    parser.add_argument("--quiz-length", type=int, default=10, help="Вопросов в квизе")
+    parser.add_argument("--segment-events", type=int, default=2_000_000, help="Событий в сегменте")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        expected = write_synthetic_log(directory, args.events, args.questions, args.quiz_length, args.segment_events)
+        generated = time.perf_counter()
+
+        events = load_events(directory)
+        loaded = time.perf_counter()
+        stats = question_stats(events)
+        finished = time.perf_counter()
+
+    answered = stats['answers'][:args.questions] > 0
+    correlation = np.corrcoef(stats['correct_rate'][:args.questions][answered], expected[answered])[0, 1]
+    print(f"Событий: {len(events)}, сессий: {stats['sessions']}, вопросов: {args.questions} "
+          f"(генерация {generated - started:.1f} с)")
+    print(f"Чтение: {loaded - started - (generated - started):.2f} с, расчёт: {finished - loaded:.2f} с, "
+          f"{len(events) / (finished - generated) / 1e6:.1f} млн событий/с")
+    print(f"Корреляция доли правильных ответов с заданной сложностью: {correlation:.3f}, "
+          f"средний индекс дискриминации: {np.nanmean(stats['discrimination']):+.3f}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
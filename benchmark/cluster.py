@@ -0,0 +1,222 @@
+# benchmark/cluster.py
+"""
+Нагрузочный тест многопроцессного режима: бот запускается отдельным процессом
+(фронт в webhook-режиме и WORKERS обработчиков), драйвер шлёт ему обновления
+по HTTP и ждёт ответов на заглушке Bot API.
+
+Квиз идёт в режиме редактирования сообщения, поэтому каждый ответ меняет
+клавиатуру ровно один раз, и по этому изменению драйвер понимает, что ответ
+обработан. Задержка — от отправки обновления до изменения клавиатуры.
+
+Запуск из корня проекта (сравнение 1, 2 и 4 обработчиков):
+    python -m benchmark.cluster --workers 1,2,4 --users 200 --quizzes 2
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from answer_log import iter_events
+from benchmark.fake_bot_api import BOT_USER, FakeBotAPI
+from webhook import SECRET_HEADER
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot.py")
+WEBHOOK_SECRET = "benchmark"
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Перцентиль по отсортированному списку (ближайший ранг, как в benchmark.run)"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def free_port() -> int:
+    """Свободный TCP-порт на localhost"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class ClusterDriver:
+    """Имитация пользователей, отправляющих обновления на webhook бота"""
+
+    def __init__(self, session: aiohttp.ClientSession, api: FakeBotAPI, url: str):
+        self.session = session
+        self.api = api
+        self.url = url
+        self.latencies = []
+        self.answers = 0
+        self.quizzes = 0
+        self._update_ids = itertools.count(1)
+
+    async def _post(self, update: dict):
+        headers = {SECRET_HEADER: WEBHOOK_SECRET}
+        async with self.session.post(self.url, json=update, headers=headers) as response:
+            response.raise_for_status()
+
+    async def _send(self, chat_id: int, update: dict):
+        """Отправка обновления и ожидание, пока бот не сменит клавиатуру чата"""
+        previous = self.api.keyboards.get(chat_id)
+        started = time.perf_counter()
+        await self._post(update)
+        await self.api.wait_keyboard_change(chat_id, previous)
+        self.latencies.append(time.perf_counter() - started)
+
+    async def run_user(self, user_id: int, quizzes: int):
+        """Прохождение пользователем нескольких квизов подряд"""
+        user = {"id": user_id, "is_bot": False, "first_name": f"Bench{user_id}"}
+        chat = {"id": user_id, "type": "private"}
+
+        for _ in range(quizzes):
+            await self._send(user_id, {
+                "update_id": next(self._update_ids),
+                "message": {"message_id": 0, "date": int(time.time()), "chat": chat, "from": user, "text": "/quiz"},
+            })
+
+            while True:
+                keyboard = self.api.keyboards.get(user_id)
+                if keyboard is None:
+                    break
+                message_id, rows = keyboard
+                button = random.choice([button for row in rows for button in row])
+                await self._send(user_id, {
+                    "update_id": next(self._update_ids),
+                    "callback_query": {
+                        "id": str(next(self._update_ids)),
+                        "chat_instance": str(user_id),
+                        "from": user,
+                        "message": {
+                            "message_id": message_id,
+                            "date": int(time.time()),
+                            "chat": chat,
+                            "from": BOT_USER,
+                            "text": "",
+                        },
+                        "data": button["callback_data"],
+                    },
+                })
+                self.answers += 1
+
+            self.quizzes += 1
+
+
+async def wait_until_listening(port: int, process: asyncio.subprocess.Process, timeout: float = 60.0):
+    """Ожидание, пока бот не начнёт принимать webhook (фронт открывает порт после запуска обработчиков)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.returncode is not None:
+            raise RuntimeError(f"Бот завершился при запуске с кодом {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Бот не открыл порт {port} за {timeout} с")
+
+
+async def run_cluster(workers: int, args) -> dict:
+    """Запуск бота с заданным числом обработчиков, нагрузка и сбор результатов"""
+    api = FakeBotAPI(latency=args.api_latency_ms / 1000)
+    await api.start()
+    port = free_port()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = dict(
+            os.environ,
+            API_TOKEN="123456:BENCHMARK",
+            BOT_MODE="webhook",
+            WEBHOOK_PORT=str(port),
+            WEBHOOK_SECRET=WEBHOOK_SECRET,
+            TELEGRAM_API_URL=api.base_url,
+            WORKERS=str(workers),
+            QUIZ_EDIT_IN_PLACE="1",
+            API_RATE_LIMIT="0",
+            QUESTIONS_RELOAD_INTERVAL="0",
+            METRICS_PORT="0",
+            ANSWER_LOG_DIR=os.path.join(tmp_dir, "answers"),
+        )
+        # База создаётся в рабочем каталоге бота
+        bot_process = await asyncio.create_subprocess_exec(
+            sys.executable, BOT_SCRIPT, cwd=tmp_dir, env=env,
+            stdout=asyncio.subprocess.DEVNULL, stderr=None if args.verbose else asyncio.subprocess.DEVNULL
+        )
+        try:
+            await wait_until_listening(port, bot_process)
+
+            connector = aiohttp.TCPConnector(limit=args.connections)
+            async with aiohttp.ClientSession(connector=connector) as session:
+                driver = ClusterDriver(session, api, f"http://127.0.0.1:{port}/webhook")
+                started = time.perf_counter()
+                await asyncio.gather(*(driver.run_user(1000 + user, args.quizzes) for user in range(args.users)))
+                elapsed = time.perf_counter() - started
+        finally:
+            bot_process.send_signal(signal.SIGTERM)
+            await bot_process.wait()
+
+        logged_answers = sum(1 for _ in iter_events(os.path.join(tmp_dir, "answers")))
+
+    await api.stop()
+
+    latencies = sorted(driver.latencies)
+    return {
+        "workers": workers,
+        "users": args.users,
+        "quizzes": driver.quizzes,
+        "answers": driver.answers,
+        "logged_answers": logged_answers,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+        },
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест многопроцессного режима бота Icosa")
+    parser.add_argument("--workers", default="1,2,4", help="Числа обработчиков через запятую")
+    parser.add_argument("--users", type=int, default=100, help="Количество одновременных пользователей")
+    parser.add_argument("--quizzes", type=int, default=1, help="Квизов на пользователя")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="Задержка ответа заглушки Bot API")
+    parser.add_argument("--connections", type=int, default=100, help="Одновременных HTTP-соединений драйвера")
+    parser.add_argument("--verbose", action="store_true", help="Показывать журнал бота")
+    parser.add_argument("--json", metavar="PATH", help="Сохранить результаты в JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = []
+    for workers in (int(value) for value in args.workers.split(",")):
+        result = asyncio.run(run_cluster(workers, args))
+        results.append(result)
+        speedup = result["updates_per_s"] / results[0]["updates_per_s"]
+        latency = result["latency_ms"]
+        print(f"Обработчиков: {workers}: {result['updates_per_s']} обновлений/с (x{speedup:.2f}), "
+              f"задержка p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} мс, "
+              f"ответов: {result['answers']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+# benchmark/fake_bot_api.py
+import asyncio
+import json
+import time
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+# Идентификатор пользователя-бота, от имени которого «отправляются» сообщения
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Icosa", "username": "icosa_bench_bot"}
+
+
+class FakeBotAPI:
+    """
+    Локальная заглушка Telegram Bot API для нагрузочного тестирования
+
+    Поддерживает методы, которые вызывает бот при прохождении квиза, и
+    отвечает на них с настраиваемой задержкой. Для каждого чата запоминает
+    сообщение с текущей инлайн-клавиатурой, чтобы драйвер мог «нажимать» кнопки.
+    """
+
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0, flood_every: int = 0,
+                 retry_after: int = 1):
+        """
+        Args:
+            latency: Задержка ответа на каждый вызов в секундах
+            host: Адрес сервера
+            port: Порт сервера (0 — любой свободный)
+            flood_every: Отвечать 429 на каждый flood_every-й вызов (0 — никогда)
+            retry_after: retry_after в ответах 429
+        """
+        self.latency = latency
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.host = host
+        self.port = port
+
+        self.calls = Counter()
+        self.floods = 0
+        self.keyboards = {}  # chat_id -> (message_id, inline_keyboard)
+        self._message_ids = {}
+        self._changed = {}  # chat_id -> asyncio.Event для wait_keyboard_change()
+        self._runner: Optional[web.AppRunner] = None
+
+        self.app = web.Application()
+        self.app.router.add_post("/bot{token}/{method}", self.handle)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        """Запуск сервера"""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        # При port=0 узнаём фактически выделенный порт
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        """Остановка сервера"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def wait_keyboard_change(self, chat_id: int, previous: Optional[tuple], timeout: float = 30.0):
+        """
+        Ожидание, пока клавиатура чата не сменится
+
+        Args:
+            chat_id: ID чата
+            previous: Прежнее значение keyboards.get(chat_id)
+            timeout: Максимальное ожидание в секундах
+        """
+        while self.keyboards.get(chat_id) is previous:
+            event = self._changed.setdefault(chat_id, asyncio.Event())
+            await asyncio.wait_for(event.wait(), timeout)
+
+    def _message(self, chat_id: int, text: str, reply_markup: Optional[dict], message_id: Optional[int] = None) -> dict:
+        if message_id is None:
+            message_id = self._message_ids.get(chat_id, 0) + 1
+            self._message_ids[chat_id] = message_id
+
+        if reply_markup and "inline_keyboard" in reply_markup:
+            self.keyboards[chat_id] = (message_id, reply_markup["inline_keyboard"])
+        elif self.keyboards.get(chat_id, (None,))[0] == message_id:
+            # Сообщение с клавиатурой отредактировано без неё
+            del self.keyboards[chat_id]
+
+        event = self._changed.pop(chat_id, None)
+        if event is not None:
+            event.set()
+
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text,
+        }
+        if reply_markup:
+            message["reply_markup"] = reply_markup
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        params = dict(await request.post())
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if self.flood_every and sum(self.calls.values()) % self.flood_every == 0:
+            self.floods += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.retry_after}",
+                "parameters": {"retry_after": self.retry_after},
+            }, status=429)
+
+        reply_markup = json.loads(params["reply_markup"]) if params.get("reply_markup") else None
+
+        if method == "getMe":
+            result = BOT_USER
+        elif method == "sendMessage":
+            result = self._message(int(params["chat_id"]), params.get("text", ""), reply_markup)
+        elif method == "editMessageText":
+            result = self._message(
+                int(params["chat_id"]), params.get("text", ""), reply_markup, int(params["message_id"])
+            )
+        elif method == "editMessageReplyMarkup":
+            self._message(int(params["chat_id"]), "", reply_markup, int(params["message_id"]))
+            result = True
+        elif method == "answerCallbackQuery":
+            result = True
+        else:
+            return web.json_response(
+                {"ok": False, "error_code": 404, "description": f"Not Found: method {method} is not emulated"},
+                status=404
+            )
+
+        return web.json_response({"ok": True, "result": result})
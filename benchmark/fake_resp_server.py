@@ -0,0 +1,187 @@
+# benchmark/fake_resp_server.py
+import asyncio
+import time
+from collections import Counter
+from typing import Optional
+
+from resp_client import RespError, read_reply
+
+
+class FakeRespServer:
+    """
+    Локальная заглушка RESP-сервера (Redis) для нагрузочного тестирования
+
+    Хранит строки и хеши в памяти и поддерживает команды, которые использует
+    хранилище состояния квизов (state_backend.RespStateBackend), включая
+    транзакции WATCH/MULTI/EXEC и время жизни ключей.
+    """
+
+    # Команды, которые изменяют ключ из первого аргумента (для WATCH)
+    WRITE_COMMANDS = {"SET", "DEL", "EXPIRE", "HSET", "HINCRBY"}
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        """
+        Args:
+            host: Адрес сервера
+            port: Порт сервера (0 — любой свободный)
+        """
+        self.host = host
+        self.port = port
+
+        self.calls = Counter()
+        self.data = {}
+        self._expires = {}
+        self._versions = Counter()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: set = set()
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}/0"
+
+    async def start(self):
+        """Запуск сервера"""
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Остановка сервера"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+        # Закрываем соединения клиентов и даём их обработчикам завершиться
+        tasks = [task for task, _ in self._connections]
+        for _, writer in self._connections:
+            writer.close()
+        if tasks:
+            await asyncio.wait(tasks, timeout=1.0)
+
+    def _expire(self, key):
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            del self._expires[key]
+            self.data.pop(key, None)
+            self._versions[key] += 1
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # Состояние соединения: отслеживаемые ключи и очередь команд транзакции
+        watched = {}
+        queued = None
+        connection = (asyncio.current_task(), writer)
+        self._connections.add(connection)
+        try:
+            while True:
+                command = await read_reply(reader)
+                if not isinstance(command, list) or not command:
+                    break
+
+                name = command[0].decode().upper()
+                args = command[1:]
+                self.calls[name] += 1
+
+                if name == "MULTI":
+                    queued = []
+                    reply = b"OK"
+                elif name == "DISCARD":
+                    queued, watched = None, {}
+                    reply = b"OK"
+                elif name == "EXEC":
+                    if queued is None:
+                        reply = RespError("ERR EXEC without MULTI")
+                    elif any(self._versions[key] != version for key, version in watched.items()):
+                        reply = None
+                    else:
+                        reply = [self._execute(queued_name, queued_args) for queued_name, queued_args in queued]
+                    queued, watched = None, {}
+                elif queued is not None:
+                    queued.append((name, args))
+                    reply = b"QUEUED"
+                elif name == "WATCH":
+                    for key in args:
+                        self._expire(key)
+                        watched[key] = self._versions[key]
+                    reply = b"OK"
+                elif name == "UNWATCH":
+                    watched = {}
+                    reply = b"OK"
+                else:
+                    reply = self._execute(name, args)
+
+                writer.write(self._encode(reply))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(connection)
+            writer.close()
+
+    def _encode(self, reply) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, RespError):
+            return b"-%s\r\n" % str(reply).encode()
+        if isinstance(reply, int):
+            return b":%d\r\n" % reply
+        if isinstance(reply, list):
+            return b"*%d\r\n" % len(reply) + b"".join(self._encode(item) for item in reply)
+        if reply in (b"OK", b"QUEUED", b"PONG"):
+            return b"+%s\r\n" % reply
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+    def _execute(self, name: str, args: list):
+        """Выполнение одной команды над данными"""
+        if args:
+            self._expire(args[0])
+        if name in self.WRITE_COMMANDS and args:
+            self._versions[args[0]] += 1
+
+        if name == "PING":
+            return b"PONG"
+        if name in ("AUTH", "SELECT"):
+            return b"OK"
+        if name == "FLUSHDB":
+            for key in self.data:
+                self._versions[key] += 1
+            self.data.clear()
+            self._expires.clear()
+            return b"OK"
+        if name == "GET":
+            value = self.data.get(args[0])
+            return value if not isinstance(value, dict) else RespError("WRONGTYPE")
+        if name == "SET":
+            if b"NX" in (arg.upper() for arg in args[2:]) and args[0] in self.data:
+                return None
+            self.data[args[0]] = args[1]
+            self._expires.pop(args[0], None)
+            return b"OK"
+        if name == "DEL":
+            removed = 0
+            for key in args:
+                if self.data.pop(key, None) is not None:
+                    removed += 1
+                self._expires.pop(key, None)
+            return removed
+        if name == "EXPIRE":
+            if args[0] not in self.data:
+                return 0
+            self._expires[args[0]] = time.monotonic() + int(args[1])
+            return 1
+        if name in ("HSET", "HGET", "HMGET", "HINCRBY"):
+            value = self.data.setdefault(args[0], {}) if name in ("HSET", "HINCRBY") else self.data.get(args[0], {})
+            if not isinstance(value, dict):
+                return RespError("WRONGTYPE Operation against a key holding the wrong kind of value")
+            if name == "HSET":
+                fields = args[1:]
+                added = sum(1 for field in fields[::2] if field not in value)
+                value.update(zip(fields[::2], fields[1::2]))
+                return added
+            if name == "HGET":
+                return value.get(args[1])
+            if name == "HMGET":
+                return [value.get(field) for field in args[1:]]
+            number = int(value.get(args[1], b"0")) + int(args[2])
+            value[args[1]] = str(number).encode()
+            return number
+        return RespError(f"ERR unknown command '{name}'")
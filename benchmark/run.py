@@ -0,0 +1,269 @@
+# benchmark/run.py
+"""
+Нагрузочный тест бота: N пользователей одновременно проходят квизы через
+настоящие диспетчер и обработчики, а Bot API подменён локальной заглушкой.
+
+Запуск из корня проекта:
+    python -m benchmark.run --users 200 --quizzes 3 --api-latency-ms 20
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+# bot.py проверяет токен при импорте; заглушке API подходит любой токен нужного формата
+os.environ.setdefault("API_TOKEN", "123456:BENCHMARK")
+os.environ["BOT_MODE"] = "polling"
+# Планировщик исходящих вызовов включается флагом --rate-limit на сессии заглушки
+os.environ["API_RATE_LIMIT"] = "0"
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+import bot as bot_module
+import database
+import quiz_data_full
+import state_backend
+from benchmark.fake_bot_api import BOT_USER, FakeBotAPI
+from benchmark.fake_resp_server import FakeRespServer
+from api_scheduler import OutgoingScheduler
+from metrics import ApiMetricsMiddleware
+
+# Управляющие выражения транзакций не считаются «запросами»
+TRANSACTION_STATEMENTS = ("BEGIN", "COMMIT", "ROLLBACK")
+
+
+class StatementCounter:
+    """Подсчёт SQL-выражений, выполненных соединениями пула (вызывается из их потоков)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.statements = 0
+        self.transactions = 0
+
+    def __call__(self, sql: str):
+        keyword = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ""
+        with self._lock:
+            if keyword == "COMMIT":
+                self.transactions += 1
+            elif keyword not in TRANSACTION_STATEMENTS:
+                self.statements += 1
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Перцентиль по отсортированному списку (ближайший ранг)"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class LoadDriver:
+    """Имитация пользователей, проходящих квизы"""
+
+    def __init__(self, bot: Bot, api: FakeBotAPI, think_time: float):
+        self.bot = bot
+        self.api = api
+        self.think_time = think_time
+        self.latencies = []
+        self.answers = 0
+        self.quizzes = 0
+        self._update_ids = itertools.count(1)
+
+    async def _feed(self, update: Update):
+        started = time.perf_counter()
+        await bot_module.dp.feed_update(self.bot, update)
+        self.latencies.append(time.perf_counter() - started)
+
+    def _user(self, user_id: int) -> User:
+        return User(id=user_id, is_bot=False, first_name=f"Bench{user_id}")
+
+    async def run_user(self, user_id: int, quizzes: int):
+        """Прохождение пользователем нескольких квизов подряд"""
+        user = self._user(user_id)
+        chat = Chat(id=user_id, type="private")
+
+        for _ in range(quizzes):
+            await self._feed(Update(
+                update_id=next(self._update_ids),
+                message=Message(message_id=0, date=int(time.time()), chat=chat, from_user=user, text="/quiz")
+            ))
+
+            # Нажимаем кнопки, пока у последнего сообщения есть клавиатура
+            for _ in range(100):
+                keyboard = self.api.keyboards.get(user_id)
+                if keyboard is None:
+                    break
+                message_id, rows = keyboard
+                button = random.choice([button for row in rows for button in row])
+
+                if self.think_time:
+                    await asyncio.sleep(random.uniform(0, 2 * self.think_time))
+
+                await self._feed(Update(
+                    update_id=next(self._update_ids),
+                    callback_query=CallbackQuery(
+                        id=str(next(self._update_ids)),
+                        chat_instance=str(user_id),
+                        from_user=user,
+                        message=Message(
+                            message_id=message_id,
+                            date=int(time.time()),
+                            chat=chat,
+                            from_user=User(**BOT_USER),
+                            text=""
+                        ),
+                        data=button["callback_data"]
+                    )
+                ))
+                self.answers += 1
+
+            self.quizzes += 1
+
+
+async def run_benchmark(args) -> dict:
+    """Запуск нагрузки и сбор результатов"""
+    api = FakeBotAPI(latency=args.api_latency_ms / 1000, flood_every=args.flood_every)
+    await api.start()
+
+    # Хранилище состояния resp работает с локальной заглушкой RESP-сервера
+    resp_server = None
+    if args.session_backend == "resp":
+        resp_server = FakeRespServer()
+        await resp_server.start()
+
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api.base_url))
+    scheduler = None
+    if args.rate_limit:
+        scheduler = OutgoingScheduler(global_rate=args.rate_limit, chat_rate=args.chat_rate)
+        session.middleware(scheduler)
+        # Обратное давление в setup_handlers() подключается к этому же планировщику
+        bot_module.api_scheduler = scheduler
+    # Как и в боте, вызовы API проходят через учёт метрик
+    session.middleware(ApiMetricsMiddleware())
+    bot = Bot(token=os.environ["API_TOKEN"], session=session)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database.DB_NAME = os.path.join(tmp_dir, "benchmark.db")
+        await database.open_pool()
+        await database.migrate_database()
+        if not args.no_write_buffer:
+            await database.start_write_buffer()
+        await state_backend.open_state_backend(
+            args.session_backend, resp_server.url if resp_server is not None else None
+        )
+        bot_module.QUIZ_EDIT_IN_PLACE = args.edit_in_place
+        bot_module.QUIZ_ADAPTIVE = args.adaptive
+        await quiz_data_full.open_question_bank()
+        await bot_module.setup_handlers()
+
+        counter = StatementCounter()
+        await database.set_trace_callback(counter)
+
+        driver = LoadDriver(bot, api, args.think_ms / 1000)
+        started = time.perf_counter()
+        await asyncio.gather(*(driver.run_user(1000 + user, args.quizzes) for user in range(args.users)))
+        elapsed = time.perf_counter() - started
+
+        # Отложенная запись — часть стоимости ответов, поэтому считаем её до остановки счётчика
+        await database.stop_write_buffer()
+        await database.set_trace_callback(None)
+        await state_backend.close_state_backend()
+        await database.close_pool()
+
+    await session.close()
+    await api.stop()
+    if resp_server is not None:
+        await resp_server.stop()
+
+    latencies = sorted(driver.latencies)
+    answers = max(driver.answers, 1)
+    return {
+        "session_backend": args.session_backend,
+        "users": args.users,
+        "quizzes": driver.quizzes,
+        "updates": len(latencies),
+        "answers": driver.answers,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(len(latencies) / elapsed, 1),
+        "quizzes_per_s": round(driver.quizzes / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99": round(percentile(latencies, 0.99) * 1000, 2),
+            "max": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        },
+        "db_statements_per_answer": round(counter.statements / answers, 2),
+        "db_transactions_per_answer": round(counter.transactions / answers, 3),
+        "api_calls_per_answer": round(sum(api.calls.values()) / answers, 2),
+        "api_calls": dict(api.calls),
+        "api_429": api.floods,
+        "api_retries": scheduler.retried if scheduler is not None else 0,
+        "resp_commands_per_answer": round(sum(resp_server.calls.values()) / answers, 2) if resp_server else 0.0,
+    }
+
+
+def print_report(result: dict):
+    """Вывод результатов в читаемом виде"""
+    latency = result["latency_ms"]
+    print(f"Пользователей: {result['users']}, квизов: {result['quizzes']}, "
+          f"обновлений: {result['updates']}, ответов: {result['answers']}")
+    print(f"Время: {result['elapsed_s']} с")
+    print(f"Пропускная способность: {result['updates_per_s']} обновлений/с, {result['quizzes_per_s']} квизов/с")
+    print(f"Задержка обновления, мс: p50={latency['p50']} p95={latency['p95']} "
+          f"p99={latency['p99']} max={latency['max']}")
+    print(f"Хранилище состояния квизов: {result['session_backend']}")
+    print(f"SQL-выражений на ответ: {result['db_statements_per_answer']}, "
+          f"транзакций на ответ: {result['db_transactions_per_answer']}")
+    if result["resp_commands_per_answer"]:
+        print(f"Команд RESP на ответ: {result['resp_commands_per_answer']}")
+    print(f"Вызовов Bot API на ответ: {result['api_calls_per_answer']} {result['api_calls']}")
+    if result["api_429"] or result["api_retries"]:
+        print(f"Ответов 429: {result['api_429']}, повторов планировщика: {result['api_retries']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест бота Icosa с заглушкой Bot API")
+    parser.add_argument("--users", type=int, default=100, help="Количество одновременных пользователей")
+    parser.add_argument("--quizzes", type=int, default=1, help="Квизов на пользователя")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="Задержка ответа заглушки Bot API")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Среднее время «раздумья» перед ответом")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Включить планировщик вызовов Bot API с таким лимитом в секунду")
+    parser.add_argument("--chat-rate", type=float, default=1.0, help="Лимит планировщика на один чат в секунду")
+    parser.add_argument("--flood-every", type=int, default=0, help="Заглушка отвечает 429 на каждый N-й вызов")
+    parser.add_argument("--edit-in-place", action="store_true",
+                        help="Показывать ответ и следующий вопрос редактированием сообщения")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Подбирать следующий вопрос по точности ответов пользователя")
+    parser.add_argument("--session-backend", choices=("sqlite", "memory", "resp"), default="sqlite",
+                        help="Хранилище состояния квизов (resp — с локальной заглушкой RESP-сервера)")
+    parser.add_argument("--no-write-buffer", action="store_true", help="Писать прогресс в базу без буфера")
+    parser.add_argument("--json", metavar="PATH", help="Сохранить результаты в JSON для сравнения прогонов")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Журнал aiogram о каждом обновлении искажает замеры
+    logging.getLogger().setLevel(logging.WARNING)
+
+    result = asyncio.run(run_benchmark(args))
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,54 @@
 import asyncio
+import hashlib
 import logging
 import os
+import shutil
 import signal
 import sys
+import tempfile
 
 from dotenv import load_dotenv
 from aiogram import Bot, Dispatcher, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.filters import Command
 
 # Импорт пользовательских модулей
-from database import create_tables
-from handlers.quiz_handlers import cmd_quiz, handle_answer
+from api_scheduler import BackpressureMiddleware, OutgoingScheduler
+from callback_codec import ANSWER_TAG, set_callback_secret
+from database import (
+    migrate_database,
+    open_pool,
+    close_pool,
+    set_leaderboard_cache_ttl,
+    start_write_buffer,
+    stop_write_buffer
+)
+from handlers.quiz_handlers import (
+    cmd_quiz,
+    cmd_choose_category,
+    handle_answer,
+    handle_category,
+    handle_legacy_answer,
+    set_adaptive_quiz,
+    set_edit_in_place
+)
 from handlers.start_handlers import cmd_start, cmd_help
 from handlers.stats_handlers import cmd_stats, cmd_leaderboard
+from metrics import (
+    ApiMetricsMiddleware,
+    HandlerMetricsMiddleware,
+    register_counter,
+    register_gauge,
+    start_metrics_server,
+    stop_metrics_server
+)
+from quiz_data_full import open_question_bank, start_question_watcher, stop_question_watcher
+from state_backend import close_state_backend, open_state_backend
+from answer_log import close_answer_log, get_answer_log, open_answer_log, start_compaction, stop_compaction
+from user_locks import UserLockMiddleware
+from webhook import WebhookServer
+from workers import WorkerPool, WorkerServer, poll_updates
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -23,6 +59,99 @@ if not API_TOKEN:
     logging.error("API_TOKEN не найден в переменных окружения. Проверьте файл .env")
     sys.exit(1)
 
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+# Настройки webhook: локальный адрес сервера, путь и секрет из заголовка
+# X-Telegram-Bot-Api-Secret-Token (допустимы символы A-Z, a-z, 0-9, _ и -)
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+# Внешний адрес (https://...), который регистрируется в Telegram через setWebhook.
+# Если не задан, webhook нужно настроить вручную или слать обновления локально
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+
+# Порт HTTP-сервера метрик Prometheus (/metrics); если не задан, сервер не запускается
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Ответ и следующий вопрос показываются редактированием сообщения с вопросом
+# (1 вызов API на ответ вместо 3): QUIZ_EDIT_IN_PLACE=1
+QUIZ_EDIT_IN_PLACE = os.getenv("QUIZ_EDIT_IN_PLACE", "0").lower() in ("1", "true", "yes")
+
+# Следующий вопрос подбирается по точности ответов пользователя и сложности вопросов: QUIZ_ADAPTIVE=1
+QUIZ_ADAPTIVE = os.getenv("QUIZ_ADAPTIVE", "0").lower() in ("1", "true", "yes")
+
+# Ключ подписи данных кнопок ответов. Должен совпадать у всех процессов бота;
+# по умолчанию выводится из токена
+CALLBACK_SECRET = hashlib.sha256(
+    b"icosa-callback:" + os.getenv("CALLBACK_SECRET", API_TOKEN).encode()
+).digest()
+
+# Ограничение исходящих вызовов Bot API: всего в секунду (0 — без ограничения),
+# в секунду и запасом на один личный чат
+API_RATE_LIMIT = float(os.getenv("API_RATE_LIMIT", "30"))
+API_CHAT_RATE = float(os.getenv("API_CHAT_RATE", "1"))
+API_CHAT_BURST = float(os.getenv("API_CHAT_BURST", "5"))
+
+# Интервал проверки изменений data/questions.json в секундах; 0 — без перезагрузки
+QUESTIONS_RELOAD_INTERVAL = float(os.getenv("QUESTIONS_RELOAD_INTERVAL", "5"))
+
+# Хранилище состояния активных квизов (сессия, текущий вопрос, правильные ответы):
+# sqlite — таблица quiz_state (по умолчанию), memory — память процесса,
+# resp — Redis-совместимый сервер по адресу SESSION_REDIS_URL
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://127.0.0.1:6379/0")
+
+# Каталог журнала событий ответов для аналитики (см. answer_log.py); пустое значение — без журнала
+ANSWER_LOG_DIR = os.getenv(
+    "ANSWER_LOG_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "answers")
+)
+# Сколько дней хранить события при сжатии журнала; 0 — хранить всё
+ANSWER_LOG_RETENTION_DAYS = float(os.getenv("ANSWER_LOG_RETENTION_DAYS", "0"))
+# Интервал сжатия журнала в секундах; 0 — только вручную (python answer_log.py compact)
+ANSWER_LOG_COMPACT_INTERVAL = float(os.getenv("ANSWER_LOG_COMPACT_INTERVAL", "3600"))
+
+# Количество процессов-обработчиков. При WORKERS > 1 этот процесс только принимает
+# обновления и раздаёт их обработчикам по user_id (см. workers.py)
+WORKERS = int(os.getenv("WORKERS", "1"))
+# Роль процесса: front (по умолчанию) или worker. Обработчикам её задаёт фронт,
+# вместе с номером процесса и путём сокета, через который приходят обновления
+BOT_ROLE = os.getenv("BOT_ROLE", "front")
+WORKER_INDEX = int(os.getenv("WORKER_INDEX", "0"))
+WORKER_SOCKET = os.getenv("WORKER_SOCKET")
+# Время жизни кэша лидерборда в обработчике, секунд: результаты других
+# обработчиков не сбрасывают его кэш
+LEADERBOARD_CACHE_TTL = float(os.getenv("LEADERBOARD_CACHE_TTL", "5"))
+
+# Адрес сервера Bot API, если это не api.telegram.org (например, локальный telegram-bot-api)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL")
+
+if BOT_MODE not in ("polling", "webhook"):
+    logging.error(f"Неизвестный BOT_MODE: {BOT_MODE}. Допустимо: polling, webhook")
+    sys.exit(1)
+
+if BOT_MODE == "webhook" and not WEBHOOK_SECRET:
+    logging.error("Для BOT_MODE=webhook необходимо задать WEBHOOK_SECRET")
+    sys.exit(1)
+
+if SESSION_BACKEND not in ("sqlite", "memory", "resp"):
+    logging.error(f"Неизвестный SESSION_BACKEND: {SESSION_BACKEND}. Допустимо: sqlite, memory, resp")
+    sys.exit(1)
+
+if WORKERS < 1:
+    logging.error(f"WORKERS должно быть не меньше 1, получено {WORKERS}")
+    sys.exit(1)
+
+if BOT_ROLE not in ("front", "worker"):
+    logging.error(f"Неизвестный BOT_ROLE: {BOT_ROLE}. Допустимо: front, worker")
+    sys.exit(1)
+
+if BOT_ROLE == "worker" and not WORKER_SOCKET:
+    logging.error("Для BOT_ROLE=worker необходимо задать WORKER_SOCKET")
+    sys.exit(1)
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -32,13 +161,79 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Инициализация бота и диспетчера
-bot = Bot(token=API_TOKEN)
+if TELEGRAM_API_URL:
+    bot = Bot(token=API_TOKEN, session=AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)))
+else:
+    bot = Bot(token=API_TOKEN)
 dp = Dispatcher()
 
+# Планировщик исходящих вызовов: ограничение частоты, приоритеты и повтор после 429.
+# Регистрируется первым, чтобы метрики API учитывали только сами HTTP-запросы
+api_scheduler = None
+if API_RATE_LIMIT > 0:
+    # Общий лимит Telegram делится между обработчиками; чат всегда обслуживает
+    # один обработчик, поэтому лимит на чат остаётся прежним
+    global_rate = API_RATE_LIMIT / WORKERS if BOT_ROLE == "worker" else API_RATE_LIMIT
+    api_scheduler = OutgoingScheduler(global_rate=global_rate, chat_rate=API_CHAT_RATE, chat_burst=API_CHAT_BURST)
+    bot.session.middleware(api_scheduler)
+    register_gauge("icosa_api_backlog", "Вызовы Bot API в очереди планировщика", lambda: api_scheduler.backlog)
+    register_counter("icosa_api_retry_after", "Повторы вызовов Bot API после ответа 429", lambda: api_scheduler.retried)
+
+# Учёт задержек вызовов Bot API
+bot.session.middleware(ApiMetricsMiddleware())
+
+# Очередь обновлений по пользователям (регистрируется в setup_handlers())
+user_lock_middleware = UserLockMiddleware()
+register_counter("icosa_answer_log_written", "События ответов, записанные в журнал",
+               lambda: get_answer_log().written if get_answer_log() else 0)
+register_counter("icosa_answer_log_dropped", "События ответов, отброшенные из-за переполнения буфера журнала",
+               lambda: get_answer_log().dropped if get_answer_log() else 0)
+register_gauge("icosa_user_locks", "Пользователи с обновлениями в обработке",
+               lambda: len(user_lock_middleware.locks))
+register_counter("icosa_user_updates_dropped", "Обновления, отброшенные из-за переполнения очереди пользователя",
+               lambda: user_lock_middleware.dropped)
+
+# Сервер метрик (запускается в main(), если задан METRICS_PORT)
+metrics_runner = None
+
 
 async def shutdown() -> None:
     """Корректное завершение работы бота"""
     logger.info("Начало graceful shutdown...")
+    try:
+        # Сначала записываем накопленный прогресс, пока соединения ещё открыты
+        await stop_write_buffer()
+        logger.info("Буфер прогресса квиза записан")
+    except Exception as exc_buffer:
+        logger.error(f"Ошибка при записи буфера прогресса квиза: {exc_buffer}")
+
+    try:
+        await close_state_backend()
+    except Exception as exc_state:
+        logger.error(f"Ошибка при закрытии хранилища состояния квизов: {exc_state}")
+
+    try:
+        await stop_compaction()
+        await close_answer_log()
+    except Exception as exc_answers:
+        logger.error(f"Ошибка при закрытии журнала ответов: {exc_answers}")
+
+    try:
+        await stop_question_watcher()
+    except Exception as exc_watcher:
+        logger.error(f"Ошибка при остановке перезагрузки вопросов: {exc_watcher}")
+
+    try:
+        await stop_metrics_server(metrics_runner)
+    except Exception as exc_metrics:
+        logger.error(f"Ошибка при остановке сервера метрик: {exc_metrics}")
+
+    try:
+        await close_pool()
+        logger.info("Соединения с базой данных закрыты")
+    except Exception as exc_db:
+        logger.error(f"Ошибка при закрытии соединений с базой данных: {exc_db}")
+
     try:
         await bot.session.close()
         logger.info("Сессия бота закрыта")
@@ -70,8 +265,8 @@ def signal_handler(sig_num: int, _frame: object) -> None:
         sys.exit(0)
 
 
-async def setup_handlers() -> None:
-    """Настройка обработчиков команд и кнопок"""
+def register_handlers() -> None:
+    """Регистрация обработчиков команд и кнопок в диспетчере (без настройки режимов квиза)"""
     # Регистрация обработчиков команд
     dp.message.register(cmd_start, Command("start"))
     dp.message.register(cmd_help, Command("help"))
@@ -81,27 +276,232 @@ async def setup_handlers() -> None:
 
     # Регистрация обработчиков для кнопок меню
     dp.message.register(cmd_quiz, F.text == "🧠 Начать квиз")
+    dp.message.register(cmd_choose_category, F.text == "🗂 Выбрать тему")
     dp.message.register(cmd_stats, F.text == "📊 Моя статистика")
     dp.message.register(cmd_leaderboard, F.text == "🏆 Лидерборд")
 
     # Регистрация обработчиков callback-запросов
-    dp.callback_query.register(handle_answer, F.data.startswith("q"))
+    dp.callback_query.register(handle_answer, F.data.startswith(ANSWER_TAG))
+    dp.callback_query.register(handle_legacy_answer, F.data.startswith("q"))
+    dp.callback_query.register(handle_category, F.data.startswith("c_"))
+
+
+async def setup_handlers() -> None:
+    """Настройка обработчиков команд и кнопок"""
+    # Режимы показа ответов и выбора вопросов в квизе, ключ подписи данных кнопок
+    set_edit_in_place(QUIZ_EDIT_IN_PLACE)
+    set_adaptive_quiz(QUIZ_ADAPTIVE)
+    set_callback_secret(CALLBACK_SECRET)
+
+    register_handlers()
+
+    # Обновления одного пользователя обрабатываются по очереди, разных — параллельно
+    dp.update.outer_middleware(user_lock_middleware)
+
+    # Пока очередь исходящих вызовов переполнена, новые обновления ждут
+    if api_scheduler is not None:
+        dp.update.outer_middleware(BackpressureMiddleware(api_scheduler))
+
+    # Учёт задержек и ошибок обработчиков
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
 
     logger.info("Обработчики успешно зарегистрированы")
 
 
+def stop_on_signals() -> asyncio.Event:
+    """Событие, которое устанавливается при получении SIGINT/SIGTERM"""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    return stop_event
+
+
+def process_update(update: dict):
+    """Обработка обновления (dict из JSON Telegram) диспетчером этого процесса"""
+    return dp.feed_raw_update(bot, update)
+
+
+async def run_webhook(process_update) -> None:
+    """
+    Приём обновлений через webhook до получения SIGINT/SIGTERM
+
+    Args:
+        process_update: Корутина обработки обновления (dict из JSON Telegram)
+    """
+    server = WebhookServer(
+        process_update,
+        secret_token=WEBHOOK_SECRET,
+        path=WEBHOOK_PATH,
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT
+    )
+
+    stop_event = stop_on_signals()
+
+    await server.start()
+    try:
+        if WEBHOOK_URL:
+            await bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=dp.resolve_used_update_types()
+            )
+            logger.info(f"Webhook зарегистрирован в Telegram: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+        await stop_event.wait()
+        logger.info("Получен сигнал остановки webhook")
+    finally:
+        # Дожидаемся обновлений в обработке до записи буфера в shutdown()
+        await server.stop()
+
+
+async def run_front() -> None:
+    """Фронт многопроцессного режима: приём обновлений и раздача их обработчикам"""
+    global metrics_runner
+    logger.info(f"Запуск бота Icosa: фронт и обработчиков {WORKERS}...")
+
+    socket_dir = tempfile.mkdtemp(prefix="icosa-workers-")
+    pool = WorkerPool(WORKERS, socket_dir, os.path.abspath(__file__))
+    register_gauge("icosa_front_backlog", "Обновления, ожидающие передачи обработчикам", lambda: pool.backlog)
+
+    try:
+        # Схема обновляется один раз до запуска обработчиков, а не каждым из них
+        await open_pool(1)
+        schema_version = await migrate_database()
+        await close_pool()
+        logger.info(f"Схема базы данных актуальна (версия {schema_version})")
+
+        # Обработчики регистрируются здесь только ради списка используемых типов обновлений:
+        # режимы квиза, корзины сложности и middleware нужны только процессам-обработчикам
+        register_handlers()
+
+        await pool.start()
+
+        # Обработчики пишут журнал ответов сами, а сжимает его только фронт
+        if ANSWER_LOG_DIR and ANSWER_LOG_COMPACT_INTERVAL > 0:
+            start_compaction(ANSWER_LOG_DIR, ANSWER_LOG_COMPACT_INTERVAL, ANSWER_LOG_RETENTION_DAYS)
+
+        if METRICS_PORT:
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+
+        logger.info(f"Бот @{(await bot.me()).username} запущен и готов к работе")
+        logger.info("Для остановки нажмите Ctrl+C")
+
+        if BOT_MODE == "webhook":
+            await run_webhook(pool.route)
+        else:
+            await poll_updates(
+                bot.session.api.api_url(token=bot.token, method="getUpdates"),
+                pool.route,
+                stop_on_signals(),
+                allowed_updates=dp.resolve_used_update_types()
+            )
+    except Exception as exc_front:
+        logger.critical(f"Критическая ошибка фронта: {exc_front}", exc_info=True)
+        await pool.stop()
+        await shutdown()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+        sys.exit(1)
+
+    # Обработчики получают оставшиеся обновления и сами записывают свои буферы
+    await pool.stop()
+    await shutdown()
+    shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+async def run_worker() -> None:
+    """Процесс-обработчик: обновления своих пользователей приходят от фронта через unix-сокет"""
+    global metrics_runner
+    logger.info(f"Запуск обработчика {WORKER_INDEX}...")
+    stop_event = stop_on_signals()
+
+    try:
+        await open_pool()
+        await migrate_database()
+        await start_write_buffer()
+        await open_state_backend(SESSION_BACKEND, SESSION_REDIS_URL)
+        if ANSWER_LOG_DIR:
+            open_answer_log(ANSWER_LOG_DIR, tag=f"w{WORKER_INDEX}")
+        await open_question_bank()
+        await setup_handlers()
+        set_leaderboard_cache_ttl(LEADERBOARD_CACHE_TTL)
+
+        if QUESTIONS_RELOAD_INTERVAL > 0:
+            start_question_watcher(QUESTIONS_RELOAD_INTERVAL)
+
+        # Порт METRICS_PORT занят фронтом, обработчики слушают следующие за ним
+        if METRICS_PORT:
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT + 1 + WORKER_INDEX)
+
+        server = WorkerServer(process_update, WORKER_SOCKET)
+        await server.start()
+    except Exception as exc_worker:
+        logger.critical(f"Критическая ошибка при запуске обработчика {WORKER_INDEX}: {exc_worker}", exc_info=True)
+        await shutdown()
+        sys.exit(1)
+
+    # Фронт закрывает соединение перед остановкой обработчиков; если он упал,
+    # соединение закрывает система, и обработчик тоже завершается
+    waiters = {asyncio.create_task(stop_event.wait()), asyncio.create_task(server.disconnected.wait())}
+    _, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+
+    await server.stop()
+    await shutdown()
+
+
 async def main() -> None:
     """Основная функция запуска бота"""
+    global metrics_runner
+    if BOT_ROLE == "worker":
+        await run_worker()
+        return
+    if WORKERS > 1:
+        await run_front()
+        return
+
     logger.info("Запуск бота Icosa...")
 
     try:
-        # Создание таблиц базы данных
-        await create_tables()
-        logger.info("Таблицы базы данных созданы/проверены")
+        # Открытие пула соединений с базой данных
+        await open_pool()
+        logger.info("Пул соединений с базой данных открыт")
+
+        # Применение миграций схемы базы данных
+        schema_version = await migrate_database()
+        logger.info(f"Схема базы данных актуальна (версия {schema_version})")
+
+        # Запуск отложенной пакетной записи прогресса квиза
+        await start_write_buffer()
+
+        # Подключение хранилища состояния активных квизов
+        await open_state_backend(SESSION_BACKEND, SESSION_REDIS_URL)
+        logger.info(f"Хранилище состояния квизов: {SESSION_BACKEND}")
+
+        # Журнал событий ответов для аналитики и его периодическое сжатие
+        if ANSWER_LOG_DIR:
+            open_answer_log(ANSWER_LOG_DIR)
+            if ANSWER_LOG_COMPACT_INTERVAL > 0:
+                start_compaction(ANSWER_LOG_DIR, ANSWER_LOG_COMPACT_INTERVAL, ANSWER_LOG_RETENTION_DAYS)
+            logger.info(f"Журнал ответов: {ANSWER_LOG_DIR}")
+
+        # Набор вопросов (при необходимости хранилище собирается заново)
+        await open_question_bank()
 
         # Настройка обработчиков
         await setup_handlers()
 
+        # Перезагрузка вопросов при изменении файла без перезапуска бота
+        if QUESTIONS_RELOAD_INTERVAL > 0:
+            start_question_watcher(QUESTIONS_RELOAD_INTERVAL)
+
+        # Запуск сервера метрик
+        if METRICS_PORT:
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+
         # Регистрация обработчиков сигналов
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
@@ -110,14 +510,22 @@ async def main() -> None:
         logger.info(f"Бот @{(await bot.me()).username} запущен и готов к работе")
         logger.info("Для остановки нажмите Ctrl+C")
 
-        # Запуск polling
-        await dp.start_polling(bot)
+        if BOT_MODE == "webhook":
+            await run_webhook(process_update)
+        else:
+            # Запуск polling
+            await dp.start_polling(bot)
 
     except Exception as exc_main:
         logger.critical(f"Критическая ошибка при запуске бота: {exc_main}", exc_info=True)
         await shutdown()
         sys.exit(1)
 
+    # Приём обновлений остановлен штатно: на время polling aiogram сам перехватывает
+    # SIGINT/SIGTERM, а в webhook-режиме это делает run_webhook(), поэтому буфер
+    # записи успевает сохраниться в shutdown()
+    await shutdown()
+
 
 if __name__ == "__main__":
     try:
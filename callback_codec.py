@@ -0,0 +1,69 @@
+# callback_codec.py
+import base64
+import hashlib
+import hmac
+import secrets
+import struct
+from typing import Optional
+
+# Первый символ callback_data определяет обработчик, поэтому диспетчер
+# выбирает его сравнением префикса, не разбирая остальное
+ANSWER_TAG = "a"
+
+# Номер сессии квиза, номер вопроса в квизе, номер варианта на клавиатуре
+ANSWER_PAYLOAD = struct.Struct('<IBB')
+# Длина усечённой подписи HMAC-SHA256 в байтах
+MAC_SIZE = 6
+
+# Ключ подписи; в боте задаётся через set_callback_secret() одинаковым для всех процессов
+_secret = secrets.token_bytes(32)
+
+
+def set_callback_secret(key: bytes):
+    """Установка ключа подписи callback_data"""
+    global _secret
+    _secret = key
+
+
+def new_nonce() -> int:
+    """Случайный ненулевой номер сессии квиза (0 — сессии старого формата)"""
+    return secrets.randbits(32) or 1
+
+
+def _mac(payload: bytes) -> bytes:
+    return hmac.new(_secret, payload, hashlib.sha256).digest()[:MAC_SIZE]
+
+
+def encode_answer(nonce: int, position: int, option: int) -> str:
+    """
+    callback_data кнопки ответа: тег и base64 от полей с подписью (17 символов)
+
+    Args:
+        nonce: Номер сессии квиза
+        position: Номер вопроса в квизе (0–255)
+        option: Номер варианта на клавиатуре (0–255)
+    """
+    payload = ANSWER_PAYLOAD.pack(nonce, position, option)
+    return ANSWER_TAG + base64.urlsafe_b64encode(payload + _mac(payload)).decode('ascii')
+
+
+def decode_answer(data: str) -> Optional[tuple]:
+    """
+    Разбор и проверка подписи callback_data кнопки ответа
+
+    Returns:
+        (nonce, position, option) или None, если данные повреждены или подделаны
+    """
+    if not data.startswith(ANSWER_TAG):
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(data[len(ANSWER_TAG):])
+    except ValueError:
+        return None
+    if len(raw) != ANSWER_PAYLOAD.size + MAC_SIZE:
+        return None
+
+    payload, mac = raw[:ANSWER_PAYLOAD.size], raw[ANSWER_PAYLOAD.size:]
+    if not hmac.compare_digest(mac, _mac(payload)):
+        return None
+    return ANSWER_PAYLOAD.unpack(payload)
@@ -1,69 +1,254 @@
 # database.py
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Callable, Optional
+
 import aiosqlite
-import json
+
+from metrics import timed_query
+from migrations import migrate
+from write_buffer import WriteBehindBuffer
 
 DB_NAME = 'quiz_bot.db'
 
+# Настройки, применяемые к каждому новому соединению.
+# WAL позволяет читателям не блокировать писателя, а synchronous=NORMAL
+# в режиме WAL убирает fsync на каждый коммит (fsync только при checkpoint).
+DB_PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA cache_size = -16000',  # ~16 МБ кэша страниц на соединение
+    'PRAGMA mmap_size = 268435456',  # до 256 МБ файла базы через mmap
+    'PRAGMA temp_store = MEMORY',
+)
 
-async def create_tables():
-    """Создание всех необходимых таблиц в базе данных"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        # Таблица для отслеживания текущего состояния квиза
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS quiz_state (
-                user_id INTEGER PRIMARY KEY,
-                question_index INTEGER DEFAULT 0,
-                correct_answers INTEGER DEFAULT 0,
-                selected_questions TEXT DEFAULT '[]'  -- JSON массив с индексами вопросов
-            )
-        ''')
-
-        # Таблица для хранения статистики пользователей
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS user_stats (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                last_correct INTEGER DEFAULT 0,
-                last_total INTEGER DEFAULT 0,
-                total_correct INTEGER DEFAULT 0,
-                total_attempts INTEGER DEFAULT 0
-            )
-        ''')
+# Количество долгоживущих соединений в пуле
+DB_POOL_SIZE = 4
+
+# Пул свободных соединений и список всех открытых соединений
+_pool: Optional[asyncio.Queue] = None
+_connections: list = []
+
+# Буфер отложенной записи прогресса квиза (None — запись сразу в базу)
+_write_buffer: Optional[WriteBehindBuffer] = None
+
+# Размер кэшируемого топа лидерборда
+LEADERBOARD_CACHE_SIZE = 10
+
+# Кэш топа лидерборда и счётчик его сбросов (None — кэш пуст)
+_leaderboard_cache: Optional[list] = None
+_leaderboard_version = 0
+
+# Время жизни кэша лидерборда в секундах (0 — до сброса). Результаты других
+# процессов бота не сбрасывают кэш этого процесса, поэтому при нескольких
+# процессах топ перечитывается из базы не реже раза в TTL
+_leaderboard_cache_ttl = 0.0
+_leaderboard_cached_at = 0.0
+
+
+async def connect() -> aiosqlite.Connection:
+    """Открытие нового соединения с применением настроек DB_PRAGMAS"""
+    db = await aiosqlite.connect(DB_NAME)
+    try:
+        for pragma in DB_PRAGMAS:
+            await db.execute(pragma)
+    except BaseException:
+        await db.close()
+        raise
+    return db
+
+
+async def open_pool(size: int = DB_POOL_SIZE):
+    """Открытие пула долгоживущих соединений с базой данных"""
+    global _pool
+    if _pool is not None:
+        return
+
+    pool = asyncio.Queue()
+    for _ in range(size):
+        db = await connect()
+        _connections.append(db)
+        pool.put_nowait(db)
+    _pool = pool
+
+
+async def close_pool():
+    """Закрытие пула: дожидаемся возврата всех соединений и закрываем их"""
+    global _pool
+    if _pool is None:
+        return
+
+    pool, _pool = _pool, None
+    for _ in range(len(_connections)):
+        db = await pool.get()
+        await db.close()
+    _connections.clear()
+
+
+async def set_trace_callback(callback):
+    """
+    Установка обработчика, получающего текст каждого SQL-выражения,
+    на все соединения пула (для диагностики и нагрузочных тестов)
+
+    Args:
+        callback: Функция от строки SQL или None, чтобы отключить трассировку
+    """
+    for db in _connections:
+        await db.set_trace_callback(callback)
+
+
+@asynccontextmanager
+async def get_connection():
+    """
+    Получение соединения из пула
 
+    Если пул не открыт (например, при запуске вспомогательных скриптов),
+    открывается временное соединение.
+    """
+    if _pool is None:
+        db = await connect()
+        try:
+            yield db
+        finally:
+            await db.close()
+        return
+
+    pool = _pool
+    db = await pool.get()
+    try:
+        yield db
+    except BaseException:
+        # Не возвращаем в пул соединение с незавершённой транзакцией
+        if db.in_transaction:
+            await db.rollback()
+        raise
+    finally:
+        pool.put_nowait(db)
+
+
+async def migrate_database() -> int:
+    """Приведение схемы базы данных к последней версии"""
+    async with get_connection() as db:
+        return await migrate(db)
+
+
+async def start_write_buffer(flush_interval: float = 0.05, max_operations: int = 500):
+    """Включение отложенной пакетной записи прогресса квиза"""
+    global _write_buffer
+    if _write_buffer is not None:
+        return
+
+    _write_buffer = WriteBehindBuffer(_write_pending_states, flush_interval, max_operations)
+    _write_buffer.start()
+
+
+async def stop_write_buffer():
+    """Запись накопленных изменений и возврат к немедленной записи"""
+    global _write_buffer
+    if _write_buffer is None:
+        return
+
+    write_buffer = _write_buffer
+    await write_buffer.stop()
+    _write_buffer = None
+
+
+@timed_query
+async def _write_pending_states(states: dict):
+    """Запись пачки изменений из буфера одной транзакцией"""
+    resets = []
+    sessions = []
+    indexes = []
+    increments = []
+    for user_id, state in states.items():
+        if state.reset:
+            resets.append((user_id, state.session_data))
+        elif state.session_data is not None:
+            sessions.append((state.session_data, user_id))
+        if state.question_index is not None:
+            indexes.append((user_id, state.question_index))
+        if state.correct_delta:
+            increments.append((state.correct_delta, user_id))
+
+    async with get_connection() as db:
+        await db.executemany('''
+            INSERT INTO quiz_state (user_id, question_index, correct_answers, session_data)
+            VALUES (?, 0, 0, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                question_index = excluded.question_index,
+                correct_answers = excluded.correct_answers,
+                session_data = excluded.session_data
+        ''', resets)
+        await db.executemany('''
+            UPDATE quiz_state
+            SET session_data = ?
+            WHERE user_id = ?
+        ''', sessions)
+        await db.executemany('''
+            INSERT INTO quiz_state (user_id, question_index)
+            VALUES (?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET question_index = excluded.question_index
+        ''', indexes)
+        await db.executemany('''
+            UPDATE quiz_state
+            SET correct_answers = correct_answers + ?
+            WHERE user_id = ?
+        ''', increments)
         await db.commit()
 
 
-async def reset_quiz_session(user_id: int, selected_questions: list):
-    """Сброс сессии квиза с заданными вопросами"""
-    selected_questions_json = json.dumps(selected_questions)
-    async with aiosqlite.connect(DB_NAME) as db:
+@timed_query
+async def reset_quiz_session(user_id: int, session_data: bytes):
+    """
+    Сброс сессии квиза с новыми вопросами
+
+    Args:
+        user_id: ID пользователя
+        session_data: Упакованная сессия (QuizSession.pack())
+    """
+    if _write_buffer is not None:
+        _write_buffer.reset(user_id, session_data)
+        return
+
+    async with get_connection() as db:
         await db.execute('''
-            INSERT INTO quiz_state (user_id, question_index, correct_answers, selected_questions)
+            INSERT INTO quiz_state (user_id, question_index, correct_answers, session_data)
             VALUES (?, ?, ?, ?)
             ON CONFLICT(user_id) DO UPDATE SET
                 question_index = excluded.question_index,
                 correct_answers = excluded.correct_answers,
-                selected_questions = excluded.selected_questions
-        ''', (user_id, 0, 0, selected_questions_json))
+                session_data = excluded.session_data
+        ''', (user_id, 0, 0, session_data))
         await db.commit()
 
 
-async def get_selected_questions(user_id: int) -> list:
-    """Получение списка выбранных вопросов для пользователя"""
-    async with aiosqlite.connect(DB_NAME) as db:
+@timed_query
+async def get_session_data(user_id: int) -> Optional[bytes]:
+    """Получение упакованной сессии квиза пользователя"""
+    if _write_buffer is not None:
+        pending = _write_buffer.pending_for(user_id)
+        if pending is not None and pending.session_data is not None:
+            return pending.session_data
+
+    async with get_connection() as db:
         async with db.execute(
-                'SELECT selected_questions FROM quiz_state WHERE user_id = ?',
+                'SELECT session_data FROM quiz_state WHERE user_id = ?',
                 (user_id,)
         ) as cursor:
             result = await cursor.fetchone()
-            if result and result[0]:
-                return json.loads(result[0])
-            return []
+            return result[0] if result else None
 
 
+@timed_query
 async def update_quiz_index(user_id: int, index: int):
     """Обновление индекса вопроса (без изменения счётчика правильных ответов)"""
-    async with aiosqlite.connect(DB_NAME) as db:
+    if _write_buffer is not None:
+        _write_buffer.set_index(user_id, index)
+        return
+
+    async with get_connection() as db:
         await db.execute('''
             INSERT INTO quiz_state (user_id, question_index)
             VALUES (?, ?)
@@ -72,9 +257,14 @@ async def update_quiz_index(user_id: int, index: int):
         await db.commit()
 
 
+@timed_query
 async def increment_correct_answer(user_id: int):
     """Увеличение счётчика правильных ответов на 1"""
-    async with aiosqlite.connect(DB_NAME) as db:
+    if _write_buffer is not None:
+        _write_buffer.add_correct(user_id)
+        return
+
+    async with get_connection() as db:
         await db.execute('''
             UPDATE quiz_state 
             SET correct_answers = correct_answers + 1 
@@ -83,63 +273,195 @@ async def increment_correct_answer(user_id: int):
         await db.commit()
 
 
+@timed_query
 async def get_quiz_session(user_id: int):
     """Получение текущего состояния сессии: индекс вопроса и правильные ответы"""
-    async with aiosqlite.connect(DB_NAME) as db:
+    while True:
+        generation = _write_buffer.generation if _write_buffer is not None else None
+
+        async with get_connection() as db:
+            async with db.execute(
+                    'SELECT question_index, correct_answers FROM quiz_state WHERE user_id = ?',
+                    (user_id,)
+            ) as cursor:
+                result = await cursor.fetchone()
+        question_index, correct_answers = result if result else (0, 0)
+
+        if _write_buffer is None:
+            return question_index, correct_answers
+
+        # Если за время запроса буфер записал очередную пачку, строка могла
+        # устареть относительно наложения — перечитываем
+        if generation == _write_buffer.generation:
+            return _write_buffer.overlay(user_id, question_index, correct_answers)
+
+
+@timed_query
+async def record_answer(user_id: int, expected_index: int, is_correct: bool,
+                        next_session: Optional[Callable[[int, int], Optional[bytes]]] = None) -> Optional[tuple]:
+    """
+    Атомарная запись ответа: переход к следующему вопросу, только если
+    текущий вопрос совпадает с ожидаемым
+
+    Args:
+        user_id: ID пользователя
+        expected_index: Индекс вопроса, на который дан ответ
+        is_correct: Правильный ли ответ
+        next_session: Вызывается с новым состоянием (question_index, correct_answers)
+            перед записью; возвращённая упакованная сессия записывается вместе с ним
+
+    Returns:
+        Новое состояние (question_index, correct_answers) или None,
+        если вопрос уже неактуален
+    """
+    if _write_buffer is not None:
+        # get_quiz_session накладывает буфер без переключения задач после
+        # чтения, а между проверкой и изменением буфера нет await, поэтому
+        # два одновременных ответа не могут пройти проверку оба
+        question_index, correct_answers = await get_quiz_session(user_id)
+        if question_index != expected_index:
+            return None
+
+        new_state = (question_index + 1, correct_answers + int(is_correct))
+        session_data = next_session(*new_state) if next_session is not None else None
+        _write_buffer.set_index(user_id, new_state[0])
+        if is_correct:
+            _write_buffer.add_correct(user_id)
+        if session_data is not None:
+            _write_buffer.set_session(user_id, session_data)
+        return new_state
+
+    async with get_connection() as db:
+        async with db.execute('''
+            UPDATE quiz_state
+            SET question_index = question_index + 1,
+                correct_answers = correct_answers + ?
+            WHERE user_id = ? AND question_index = ?
+            RETURNING question_index, correct_answers
+        ''', (int(is_correct), user_id, expected_index)) as cursor:
+            result = await cursor.fetchone()
+        # Сессия пишется в той же транзакции, что и переход к следующему вопросу
+        session_data = next_session(result[0], result[1]) if result and next_session is not None else None
+        if session_data is not None:
+            await db.execute('UPDATE quiz_state SET session_data = ? WHERE user_id = ?', (session_data, user_id))
+        await db.commit()
+        return (result[0], result[1]) if result else None
+
+
+@timed_query
+async def get_question_deck(user_id: int, pool: str = '') -> Optional[tuple]:
+    """
+    Получение состояния колоды вопросов пользователя
+
+    Returns:
+        (seed, size, position) или None, если колоды ещё нет
+    """
+    async with get_connection() as db:
         async with db.execute(
-                'SELECT question_index, correct_answers FROM quiz_state WHERE user_id = ?',
-                (user_id,)
+                'SELECT seed, size, position FROM question_deck WHERE user_id = ? AND pool = ?',
+                (user_id, pool)
         ) as cursor:
-            result = await cursor.fetchone()
-            if result:
-                return result[0], result[1]
-            return 0, 0
+            return await cursor.fetchone()
 
 
+@timed_query
+async def save_question_deck(user_id: int, pool: str, seed: int, size: int, position: int):
+    """Сохранение состояния колоды вопросов пользователя"""
+    async with get_connection() as db:
+        await db.execute('''
+            INSERT INTO question_deck (user_id, pool, seed, size, position)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id, pool) DO UPDATE SET
+                seed = excluded.seed,
+                size = excluded.size,
+                position = excluded.position
+        ''', (user_id, pool, seed, size, position))
+        await db.commit()
+
+
+def calculate_score(correct: int, total: int) -> float:
+    """Точность квиза в процентах — ключ сортировки лидерборда"""
+    return correct * 100.0 / total if total > 0 else 0.0
+
+
+def set_leaderboard_cache_ttl(ttl: float):
+    """Установка времени жизни кэша лидерборда в секундах (0 — до сброса)"""
+    global _leaderboard_cache_ttl
+    _leaderboard_cache_ttl = ttl
+
+
+def _invalidate_leaderboard(user_id: int, score: float, correct: int):
+    """Сброс кэша лидерборда, если новый результат может изменить топ"""
+    global _leaderboard_cache, _leaderboard_version
+    if _leaderboard_cache is None:
+        return
+
+    if len(_leaderboard_cache) >= LEADERBOARD_CACHE_SIZE:
+        in_top = any(row[0] == user_id for row in _leaderboard_cache)
+        _, _, last_correct, last_total, _, _ = _leaderboard_cache[-1]
+        # Результат ниже последнего места топа, а пользователя в топе нет — топ не меняется
+        if not in_top and (score, correct) < (calculate_score(last_correct, last_total), last_correct):
+            return
+
+    _leaderboard_cache = None
+    _leaderboard_version += 1
+
+
+@timed_query
 async def save_quiz_result(user_id: int, username: str, correct: int, total: int):
     """Сохранение результата прохождения квиза"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute('SELECT * FROM user_stats WHERE user_id = ?', (user_id,)) as cursor:
-            user_exists = await cursor.fetchone()
-
-        if user_exists:
-            await db.execute('''
-                UPDATE user_stats 
-                SET username = ?, 
-                    last_correct = ?, 
-                    last_total = ?,
-                    total_correct = total_correct + ?,
-                    total_attempts = total_attempts + 1
-                WHERE user_id = ?
-            ''', (username, correct, total, correct, user_id))
-        else:
-            await db.execute('''
-                INSERT INTO user_stats (user_id, username, last_correct, last_total, total_correct, total_attempts)
-                VALUES (?, ?, ?, ?, ?, 1)
-            ''', (user_id, username, correct, total, correct))
-
+    score = calculate_score(correct, total)
+    async with get_connection() as db:
+        await db.execute('''
+            INSERT INTO user_stats (user_id, username, last_correct, last_total, total_correct, total_attempts, score)
+            VALUES (?, ?, ?, ?, ?, 1, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                last_correct = excluded.last_correct,
+                last_total = excluded.last_total,
+                total_correct = total_correct + excluded.total_correct,
+                total_attempts = total_attempts + 1,
+                score = excluded.score
+        ''', (user_id, username, correct, total, correct, score))
         await db.commit()
 
+    _invalidate_leaderboard(user_id, score, correct)
 
+
+@timed_query
 async def get_user_stats(user_id: int):
     """Получение статистики пользователя"""
-    async with aiosqlite.connect(DB_NAME) as db:
-        async with db.execute('SELECT * FROM user_stats WHERE user_id = ?', (user_id,)) as cursor:
+    async with get_connection() as db:
+        async with db.execute('''
+            SELECT user_id, username, last_correct, last_total, total_correct, total_attempts
+            FROM user_stats
+            WHERE user_id = ?
+        ''', (user_id,)) as cursor:
             return await cursor.fetchone()
 
 
+@timed_query
 async def get_leaderboard(limit: int = 10):
     """Получение лидерборда"""
-    async with aiosqlite.connect(DB_NAME) as db:
+    global _leaderboard_cache, _leaderboard_cached_at
+    if limit <= LEADERBOARD_CACHE_SIZE and _leaderboard_cache is not None:
+        if not _leaderboard_cache_ttl or time.monotonic() - _leaderboard_cached_at < _leaderboard_cache_ttl:
+            return _leaderboard_cache[:limit]
+
+    version = _leaderboard_version
+    query_limit = max(limit, LEADERBOARD_CACHE_SIZE)
+    async with get_connection() as db:
+        # Сортировка обслуживается индексом idx_user_stats_leaderboard без полного прохода
         async with db.execute('''
             SELECT user_id, username, last_correct, last_total, total_correct, total_attempts
             FROM user_stats
-            ORDER BY 
-                CASE 
-                    WHEN last_total > 0 THEN last_correct * 100.0 / last_total 
-                    ELSE 0 
-                END DESC,
-                last_correct DESC
+            ORDER BY score DESC, last_correct DESC
             LIMIT ?
-        ''', (limit,)) as cursor:
-            return await cursor.fetchall()
+        ''', (query_limit,)) as cursor:
+            rows = await cursor.fetchall()
+
+    # Если за время запроса кэш сбрасывался, результат мог устареть — не кэшируем
+    if version == _leaderboard_version:
+        _leaderboard_cache = rows[:LEADERBOARD_CACHE_SIZE]
+        _leaderboard_cached_at = time.monotonic()
+    return rows[:limit]
@@ -1,119 +1,289 @@
 # handlers/quiz_handlers.py
+import functools
 import random
+import time
+from typing import Optional
+
 from aiogram import types
-from database import (
-    get_quiz_session,
-    update_quiz_index,
-    save_quiz_result,
-    reset_quiz_session,
-    increment_correct_answer
-)
-from quiz_data_full import get_random_questions
-from keyboards import generate_options_keyboard
+from aiogram.filters import CommandObject
+from answer_log import log_answer
+from database import save_quiz_result, get_question_deck, save_question_deck
+from quiz_data_full import enable_difficulty_pickers, get_question_bank
+from keyboards import generate_options_keyboard, generate_category_keyboard
+from callback_codec import decode_answer, encode_answer, new_nonce
+from metrics import register_counter, register_gauge
+from question_bank import DIFFICULTY_LEVELS
+from question_deck import QuestionDeck
+from question_picker import difficulty_picker
+from session_store import QuizSession, SessionStore
+from state_backend import AnswerConflictError, get_state_backend
 from utils import get_user_name, escape_html
 
+# Активные квизы пользователей: ограничены по количеству и времени простоя
+sessions = SessionStore()
+
+# Режим «редактирования на месте»: ответ и следующий вопрос показываются в том же
+# сообщении одним вызовом API (включается через set_edit_in_place())
+EDIT_IN_PLACE = False
+
+# Адаптивный режим: следующий вопрос квиза выбирается после ответа на предыдущий
+# по точности пользователя и сложности вопросов (включается через set_adaptive_quiz())
+ADAPTIVE_QUIZ = False
+
+# Вопросов в квизе
+QUIZ_LENGTH = 10
+
+register_gauge("icosa_sessions", "Активные квизы в памяти", lambda: len(sessions))
+register_gauge("icosa_sessions_memory_bytes", "Память активных квизов (оценка)", sessions.memory_usage)
+register_counter("icosa_sessions_evicted_by_capacity", "Квизы, вытесненные по размеру хранилища",
+                 lambda: sessions.evicted_by_capacity)
+register_counter("icosa_sessions_evicted_by_ttl", "Квизы, удалённые по времени простоя",
+                 lambda: sessions.evicted_by_ttl)
+
+
+def set_edit_in_place(enabled: bool):
+    """Включение или выключение режима редактирования вопроса на месте"""
+    global EDIT_IN_PLACE
+    EDIT_IN_PLACE = enabled
+
+
+def set_adaptive_quiz(enabled: bool):
+    """Включение или выключение адаптивного выбора вопросов (корзины сложности строятся сразу)"""
+    global ADAPTIVE_QUIZ
+    ADAPTIVE_QUIZ = enabled
+    if enabled:
+        enable_difficulty_pickers()
+
+
+async def cmd_quiz(message: types.Message, command: Optional[CommandObject] = None):
+    """Обработчик команды /quiz [тема] [сложность] и кнопки 'Начать квиз'"""
+    bank = get_question_bank()
+    category = difficulty = None
+
+    # Разбор аргументов: код темы и/или уровень сложности в любом порядке
+    for token in (command.args or '').lower().split() if command is not None else ():
+        if token.isdigit() and int(token) in DIFFICULTY_LEVELS:
+            difficulty = int(token)
+        elif token in bank.by_category:
+            category = token
+        else:
+            await message.answer(
+                f"Неизвестная тема или сложность: {token}\n\nВыберите тему:",
+                reply_markup=category_keyboard(bank)
+            )
+            return
+
+    if not bank.pool(category, difficulty):
+        await message.answer("В этой теме пока нет вопросов такой сложности. Выберите тему:",
+                             reply_markup=category_keyboard(bank))
+        return
 
-async def cmd_quiz(message: types.Message):
-    """Обработчик команды /quiz и кнопки 'Начать квиз'"""
-    await message.answer("🎯 Отлично! Начинаем квиз.\n\nПервый вопрос:")
-    await new_quiz(message)
-
-
-async def new_quiz(message: types.Message):
-    """Начало нового квиза со случайными вопросами и перемешанными вариантами"""
-    user_id = message.from_user.id
-
-    # Получаем 10 случайных вопросов
-    selected_questions = get_random_questions(10)
+    title = bank.categories.get(category, category) if category is not None else None
+    await message.answer(
+        f"🎯 Отлично! Начинаем квиз{f' по теме «{title}»' if title else ''}.\n\nПервый вопрос:"
+    )
+    await new_quiz(message, message.from_user.id, category, difficulty)
 
-    # Сохраняем индексы вопросов
-    question_indices = list(range(len(selected_questions)))
 
-    # Сбрасываем сессию с выбранными вопросами
-    await reset_quiz_session(user_id, question_indices)
+@functools.lru_cache(maxsize=4)
+def category_keyboard(bank):
+    """Клавиатура выбора темы с количеством вопросов в каждой"""
+    counts = {category: len(pool) for category, pool in bank.by_category.items()}
+    return generate_category_keyboard(bank.categories or {category: category for category in counts}, counts)
 
-    # Инициализируем кэш для вопросов
-    if not hasattr(new_quiz, 'selected_questions_cache'):
-        new_quiz.selected_questions_cache = {}
 
-    # Очищаем предыдущие данные для этого пользователя
-    if hasattr(new_quiz, 'question_mapping'):
-        new_quiz.question_mapping.pop(user_id, None)
+async def cmd_choose_category(message: types.Message):
+    """Обработчик кнопки 'Выбрать тему'"""
+    await message.answer("🗂 Выберите тему квиза:", reply_markup=category_keyboard(get_question_bank()))
 
-    new_quiz.selected_questions_cache[user_id] = selected_questions
 
-    await get_question(message, user_id)
+async def handle_category(callback: types.CallbackQuery):
+    """Обработка выбора темы на клавиатуре"""
+    bank = get_question_bank()
+    category = callback.data[2:] or None
+    if category is not None and category not in bank.by_category:
+        await callback.answer("Такой темы больше нет!")
+        return
 
+    # Убираем клавиатуру выбора, чтобы тему не выбрали повторно
+    await callback.bot.edit_message_reply_markup(
+        chat_id=callback.from_user.id,
+        message_id=callback.message.message_id,
+        reply_markup=None
+    )
 
-async def get_question(message: types.Message, user_id: int):
-    """Получение текущего вопроса с перемешанными вариантами"""
-    current_index, correct_count = await get_quiz_session(user_id)
+    title = bank.categories.get(category, category) if category is not None else None
+    await callback.message.answer(
+        f"🎯 Отлично! Начинаем квиз{f' по теме «{title}»' if title else ''}.\n\nПервый вопрос:"
+    )
+    await new_quiz(callback.message, callback.from_user.id, category)
+    await callback.answer()
 
-    # Получаем выбранные вопросы для пользователя
-    selected_questions = new_quiz.selected_questions_cache.get(user_id, [])
 
-    if not selected_questions or current_index >= len(selected_questions):
+def deck_key(category: Optional[str] = None, difficulty: Optional[int] = None) -> str:
+    """Код набора, для которого ведётся колода пользователя ('' — все вопросы)"""
+    if category is None and difficulty is None:
+        return ''
+    return f"{category or ''}/{difficulty or ''}"
+
+
+async def new_quiz(message: types.Message, user_id: int, category: Optional[str] = None,
+                   difficulty: Optional[int] = None):
+    """
+    Начало нового квиза со случайными вопросами и перемешанными вариантами
+
+    Args:
+        message: Сообщение, в чат которого отправляются вопросы
+        user_id: ID пользователя
+        category: Код темы (None — все темы)
+        difficulty: Уровень сложности (None — любой)
+    """
+    bank = get_question_bank()
+    pool = bank.pool(category, difficulty)
+
+    # Номер сессии попадает в данные кнопок: ответы с клавиатур прошлых квизов отклоняются
+    if ADAPTIVE_QUIZ and difficulty is None:
+        # Адаптивный квиз начинается с вопроса средней сложности, остальные
+        # выбираются при записи каждого ответа (adaptive_next_session)
+        question_id = difficulty_picker(bank, category).pick(0, 0)
+        session = QuizSession(bank, [question_id], [shuffled_order(bank, question_id)], new_nonce(),
+                              min(QUIZ_LENGTH, len(pool)), category)
+    else:
+        # Берём 10 следующих вопросов из колоды пользователя по выбранному набору, чтобы они
+        # не повторялись в следующих квизах (сами тексты понадобятся только при показе)
+        question_ids = await draw_question_ids(user_id, pool, QUIZ_LENGTH, deck_key(category, difficulty))
+        orders = [shuffled_order(bank, question_id) for question_id in question_ids]
+        session = QuizSession(bank, question_ids, orders, new_nonce())
+
+    # Сбрасываем сессию: в хранилище состояния сохраняется её упакованный вид, чтобы
+    # квиз пережил перезапуск бота или продолжился в другом процессе
+    await get_state_backend().reset_session(user_id, session.pack())
+
+    # Новая сессия заменяет данные предыдущего квиза пользователя
+    sessions.put(user_id, session)
+
+    await get_question(message, user_id, 0)
+
+
+def shuffled_order(bank, question_id: int) -> tuple:
+    """Исходные индексы вариантов вопроса в случайном порядке показа"""
+    original_indices = list(range(bank.option_count(question_id)))
+    random.shuffle(original_indices)
+    return tuple(original_indices)
+
+
+def adaptive_next_session(session: QuizSession):
+    """
+    Выбор следующего вопроса адаптивной сессии для record_answer()
+
+    Сложность подбирается по доле правильных ответов с учётом текущего, а
+    сессия с новым вопросом записывается вместе с ответом. Если запись
+    повторяется, вопрос выбирается заново и заменяет прежний.
+    """
+    def next_session(question_index: int, correct_answers: int) -> Optional[bytes]:
+        if question_index >= len(session):
+            return None
+        picker = difficulty_picker(session.bank, session.category)
+        question_id = picker.pick(question_index, correct_answers, session.question_ids[:question_index])
+        if question_id is None:
+            return None
+        session.set_question(question_index, question_id, shuffled_order(session.bank, question_id))
+        return session.pack()
+
+    return next_session
+
+
+async def draw_question_ids(user_id: int, pool, count: int, pool_key: str = '') -> list:
+    """
+    Выдача вопросов из колоды пользователя: сначала те, что он ещё не видел
+
+    Args:
+        user_id: ID пользователя
+        pool: Идентификаторы вопросов набора
+        count: Количество вопросов
+        pool_key: Код набора, для которого ведётся отдельная колода
+    """
+    state = await get_question_deck(user_id, pool_key)
+    deck = QuestionDeck(*state) if state is not None else QuestionDeck()
+    question_ids = deck.draw(pool, count)
+    await save_question_deck(user_id, pool_key, deck.seed, deck.size, deck.position)
+    return question_ids
+
+
+async def get_session(user_id: int) -> Optional[QuizSession]:
+    """Получение сессии пользователя из памяти, а при её отсутствии — из хранилища состояния"""
+    session = sessions.get(user_id)
+    if session is not None:
+        return session
+
+    # Сессии нет в памяти (перезапуск, вытеснение или другой процесс) — восстанавливаем
+    return await load_session(user_id)
+
+
+async def load_session(user_id: int) -> Optional[QuizSession]:
+    """Чтение сессии пользователя из хранилища состояния в обход памяти"""
+    session = QuizSession.unpack(await get_state_backend().get_session_data(user_id), get_question_bank())
+    if session is not None:
+        sessions.put(user_id, session)
+    return session
+
+
+def render_question(session: QuizSession, index: int) -> tuple:
+    """
+    Текст вопроса и клавиатура с перемешанными вариантами
+
+    Returns:
+        (текст в HTML, клавиатура)
+    """
+    question = session.question(index)
+    order = session.orders[index]
+
+    # Данные кнопок несут номер сессии, поэтому клавиатура строится для каждого показа
+    options = [question.options[original_index] for original_index in order]
+    callback_data = [encode_answer(session.nonce, index, option_index) for option_index in range(len(options))]
+    kb = generate_options_keyboard(options, callback_data)
+    return f"❓ <b>Вопрос {index + 1} из {len(session)}:</b>\n\n{question.text}", kb
+
+
+async def get_question(message: types.Message, user_id: int, current_index: Optional[int] = None):
+    """
+    Получение текущего вопроса с перемешанными вариантами
+
+    Args:
+        message: Сообщение, в чат которого отправляется вопрос
+        user_id: ID пользователя
+        current_index: Индекс вопроса, если он уже известен (иначе читается из хранилища)
+    """
+    if current_index is None:
+        current_index, _ = await get_state_backend().get_progress(user_id)
+
+    # Получаем сессию пользователя
+    session = await get_session(user_id)
+
+    # У адаптивной сессии, для которой не нашлось вопроса, выбранных вопросов меньше запланированных
+    if session is None or current_index >= len(session) or current_index >= len(session.question_ids):
         await finish_quiz(message, user_id)
         return
 
-    question = selected_questions[current_index]
-
-    # === НАЧАЛО: ПЕРЕМЕШИВАНИЕ ВАРИАНТОВ ОТВЕТОВ ===
-    # Создаём копию вариантов и их оригинальных индексов
-    options_with_indices = list(enumerate(question['options']))
+    text, kb = render_question(session, current_index)
 
-    # Перемешиваем варианты в случайном порядке
-    random.shuffle(options_with_indices)
-
-    # Извлекаем новые порядки и индексы
-    shuffled_options = [option for _, option in options_with_indices]
-    original_indices = [original_index for original_index, _ in options_with_indices]
-
-    # Находим новый индекс правильного ответа
-    original_correct_index = question['correct_option']
-    new_correct_index = original_indices.index(original_correct_index)
-
-    # Сохраняем сопоставление для текущего вопроса
-    if not hasattr(new_quiz, 'question_mapping'):
-        new_quiz.question_mapping = {}
-
-    if user_id not in new_quiz.question_mapping:
-        new_quiz.question_mapping[user_id] = {}
-
-    new_quiz.question_mapping[user_id][current_index] = {
-        'original_indices': original_indices,
-        'new_correct_index': new_correct_index
-    }
-
-    kb = generate_options_keyboard(current_index, shuffled_options)
-
-    await message.answer(
-        f"❓ <b>Вопрос {current_index + 1} из {len(selected_questions)}:</b>\n\n{question['question']}",
-        reply_markup=kb,
-        parse_mode="HTML"
-    )
+    await message.answer(text, reply_markup=kb, parse_mode="HTML")
+    session.shown_at = time.monotonic()
 
 
 async def handle_answer(callback: types.CallbackQuery):
-    """Обработка ответа пользователя с учётом перемешанных вариантов"""
-    user_id = callback.from_user.id
-    current_index, correct_count = await get_quiz_session(user_id)
-
-    # Получаем выбранные вопросы для пользователя
-    selected_questions = new_quiz.selected_questions_cache.get(user_id, [])
-
-    if not selected_questions or current_index >= len(selected_questions):
-        await callback.answer("Квиз уже завершен!")
+    """Обработка нажатия кнопки ответа (данные в формате callback_codec)"""
+    # РАСПАКОВКА CALLBACK_DATA: подпись проверяется без обращения к базе
+    answer = decode_answer(callback.data)
+    if answer is None:
+        await callback.answer("Неверные данные кнопки!")
         return
 
-    # Удаляем клавиатуру с вопроса
-    await callback.bot.edit_message_reply_markup(
-        chat_id=callback.from_user.id,
-        message_id=callback.message.message_id,
-        reply_markup=None
-    )
+    await process_answer(callback, *answer)
+
 
-    # РАСПАКОВКА CALLBACK_DATA
+async def handle_legacy_answer(callback: types.CallbackQuery):
+    """Обработка кнопок старого формата q{номер вопроса}_a{номер варианта}"""
     try:
         parts = callback.data.split('_')
         received_question_index = int(parts[0][1:])
@@ -122,93 +292,188 @@ async def handle_answer(callback: types.CallbackQuery):
         await callback.answer("Неверные данные кнопки!")
         return
 
-    # ПРОВЕРКА: это ответ на текущий вопрос?
-    if received_question_index != current_index:
-        await callback.answer("Этот вопрос уже неактуален!")
+    # Такие кнопки были только у сессий без номера, поэтому сессии с номером их не примут
+    await process_answer(callback, 0, received_question_index, selected_option_index)
+
+
+async def process_answer(callback: types.CallbackQuery, nonce: int, received_question_index: int,
+                         selected_option_index: int):
+    """
+    Обработка ответа пользователя с учётом перемешанных вариантов
+
+    Args:
+        callback: Нажатие кнопки
+        nonce: Номер сессии, для которой построена клавиатура
+        received_question_index: Номер вопроса в квизе
+        selected_option_index: Номер нажатой кнопки
+    """
+    user_id = callback.from_user.id
+
+    # Получаем сессию пользователя
+    session = await get_session(user_id)
+
+    if session is None:
+        await callback.answer("Квиз уже завершен!")
         return
 
+    # Клавиатура от другого квиза пользователя: прошлого или начатого в другом
+    # процессе, пока в памяти этого лежит старая сессия, — перечитываем один раз
+    if nonce != session.nonce:
+        session = await load_session(user_id)
+        if session is None or nonce != session.nonce:
+            await callback.answer("Этот вопрос уже неактуален!")
+            return
+
     # === НАЧАЛО: ОБРАБОТКА ПЕРЕМЕШАННЫХ ВАРИАНТОВ ===
-    # Получаем сопоставление для текущего вопроса
-    if (not hasattr(new_quiz, 'question_mapping') or
-            user_id not in new_quiz.question_mapping or
-            current_index not in new_quiz.question_mapping[user_id]):
+    # У адаптивной сессии выбраны не все запланированные вопросы — проверяем по выбранным
+    if not 0 <= received_question_index < len(session.question_ids):
         await callback.answer("Ошибка: не найдены данные о вариантах ответов")
         return
 
-    mapping = new_quiz.question_mapping[user_id][current_index]
-    new_correct_index = mapping['new_correct_index']
-    original_indices = mapping['original_indices']
+    # Получаем порядок вариантов для вопроса, на который пришёл ответ
+    original_indices = session.orders[received_question_index]
+
+    if not 0 <= selected_option_index < len(original_indices):
+        await callback.answer("Неверные данные кнопки!")
+        return
 
     # Получаем данные вопроса
-    question = selected_questions[current_index]
+    question = session.question(received_question_index)
+    new_correct_index = original_indices.index(question.correct_option)
 
     # Определяем правильность ответа
     is_correct = (selected_option_index == new_correct_index)
 
+    # ПРОВЕРКА И ЗАПИСЬ ОДНИМ ДЕЙСТВИЕМ: ответ засчитывается, только если это текущий вопрос
+    # Адаптивный квиз выбирает следующий вопрос по новому состоянию и сохраняет его вместе с ответом
+    next_session = adaptive_next_session(session) if session.length is not None else None
+    try:
+        new_state = await get_state_backend().record_answer(user_id, received_question_index, is_correct, next_session)
+    except AnswerConflictError:
+        if next_session is not None:
+            sessions.pop(user_id)
+        await callback.answer("Не удалось принять ответ, нажмите ещё раз")
+        return
+    if new_state is None:
+        if next_session is not None:
+            # Вопрос мог быть выбран до неудачной записи — сессия перечитается из хранилища
+            sessions.pop(user_id)
+        await callback.answer("Этот вопрос уже неактуален!")
+        return
+    next_index, correct_count = new_state
+
+    # Событие ответа для аналитики: пишется в журнал в фоне, ответ его не ждёт
+    response_ms = int((time.monotonic() - session.shown_at) * 1000) if session.shown_at is not None else 0
+    log_answer(user_id, session.nonce, question.id, received_question_index,
+               original_indices[selected_option_index], is_correct, response_ms)
+
     # Получаем тексты ответов для отображения
-    selected_option_text = question['options'][original_indices[selected_option_index]]
-    correct_option_text = question['options'][original_indices[new_correct_index]]
+    selected_option_text = question.options[original_indices[selected_option_index]]
+    correct_option_text = question.options[original_indices[new_correct_index]]
 
     # === КОНЕЦ: ОБРАБОТКА ПЕРЕМЕШАННЫХ ВАРИАНТОВ ===
 
-    # Если ответ правильный — увеличиваем счётчик
-    if is_correct:
-        await increment_correct_answer(user_id)
-        correct_count += 1
-
-    # Отправляем сообщение с ответом пользователя
     status_emoji = "✅" if is_correct else "❌"
     status_text = "Правильно!" if is_correct else f"Неправильно. Правильный ответ: {escape_html(correct_option_text)}"
+    feedback = f"👤 <b>Ваш ответ:</b> {escape_html(selected_option_text)}\n{status_emoji} {status_text}"
+
+    if EDIT_IN_PLACE:
+        # Одно редактирование: вопрос превращается в ответ и следующий вопрос (или итог),
+        # а правильность ответа видна во всплывающем уведомлении
+        if next_index >= len(session) or next_index >= len(session.question_ids):
+            text = f"{feedback}\n\n{await complete_quiz(callback.from_user, user_id, correct_count)}"
+            kb = None
+        else:
+            question_text, kb = render_question(session, next_index)
+            text = f"{feedback}\n\n{question_text}"
+
+        await callback.bot.edit_message_text(
+            text=text,
+            chat_id=callback.from_user.id,
+            message_id=callback.message.message_id,
+            reply_markup=kb,
+            parse_mode="HTML"
+        )
+        session.shown_at = time.monotonic()
+        await callback.answer(
+            "✅ Правильно!" if is_correct else f"❌ Неправильно. Правильный ответ: {correct_option_text}"[:200]
+        )
+        return
 
-    await callback.message.answer(
-        f"👤 <b>Ваш ответ:</b> {escape_html(selected_option_text)}\n"
-        f"{status_emoji} {status_text}",
-        parse_mode="HTML"
+    # Удаляем клавиатуру с вопроса: ответ принят, повторные нажатия уже неактуальны
+    await callback.bot.edit_message_reply_markup(
+        chat_id=callback.from_user.id,
+        message_id=callback.message.message_id,
+        reply_markup=None
     )
 
-    # Обновляем индекс вопроса
-    next_index = current_index + 1
-    await update_quiz_index(user_id, next_index)
+    # Отправляем сообщение с ответом пользователя
+    await callback.message.answer(feedback, parse_mode="HTML")
 
-    # Если квиз завершен
-    if next_index >= len(selected_questions):
-        await finish_quiz(callback.message, user_id)
+    # Если квиз завершен (адаптивный — и раньше плана, если не нашлось следующего вопроса)
+    if next_index >= len(session) or next_index >= len(session.question_ids):
+        await finish_quiz(callback.message, user_id, correct_count, callback.from_user)
     else:
         # Задаем следующий вопрос
-        await get_question(callback.message, user_id)
+        await get_question(callback.message, user_id, next_index)
 
     await callback.answer()
 
 
-async def finish_quiz(message: types.Message, user_id: int):
-    """Завершение квиза и очистка кэша"""
-    _, correct_count = await get_quiz_session(user_id)
+async def complete_quiz(user: types.User, user_id: int, correct_count: Optional[int] = None) -> str:
+    """
+    Сохранение результата квиза и очистка кэша
+
+    Args:
+        user: Пользователь Telegram (для имени в лидерборде)
+        user_id: ID пользователя
+        correct_count: Число правильных ответов, если оно уже известно (иначе читается из хранилища)
 
-    # Получаем выбранные вопросы для подсчёта общего количества
-    selected_questions = new_quiz.selected_questions_cache.get(user_id, [])
-    total_questions = len(selected_questions) if selected_questions else 10
+    Returns:
+        Текст с итогами квиза в HTML
+    """
+    # Получаем сессию для подсчёта общего количества вопросов: заданных, а не
+    # запланированных — адаптивный квиз мог закончиться раньше плана
+    session = await get_session(user_id)
+    if session is None or correct_count is None:
+        # Номер текущего вопроса в хранилище состояния — это число отвеченных вопросов
+        answered, stored_correct = await get_state_backend().get_progress(user_id)
+        if correct_count is None:
+            correct_count = stored_correct
+    total_questions = len(session.question_ids) if session is not None else answered
 
-    username = await get_user_name(message.from_user)
+    username = await get_user_name(user)
 
     # Сохраняем результат
     await save_quiz_result(user_id, username, correct_count, total_questions)
 
-    # Отправляем результат
+    # Удаляем завершённую сессию из памяти и хранилища состояния
+    sessions.pop(user_id)
+    await get_state_backend().finish_session(user_id)
+
     accuracy = round(correct_count * 100 / total_questions, 1) if total_questions > 0 else 0
     result_emoji = "🏆" if accuracy >= 80 else "🥈" if accuracy >= 60 else "🥉" if accuracy >= 40 else "💪"
 
-    await message.answer(
+    return (
         f"{result_emoji} <b>Квиз завершён!</b>\n\n"
         f"✅ Правильных ответов: {correct_count} из {total_questions}\n"
         f"📊 Точность: {accuracy}%\n\n"
         f"Посмотреть статистику: /stats или кнопка «📊 Моя статистика»\n"
-        f"Пройти снова: нажмите «🧠 Начать квиз»",
-        parse_mode="HTML"
+        f"Пройти снова: нажмите «🧠 Начать квиз»"
     )
 
-    # Очищаем кеш для пользователя
-    if hasattr(new_quiz, 'question_mapping') and user_id in new_quiz.question_mapping:
-        del new_quiz.question_mapping[user_id]
 
-    if hasattr(new_quiz, 'selected_questions_cache') and user_id in new_quiz.selected_questions_cache:
-        del new_quiz.selected_questions_cache[user_id]
+async def finish_quiz(message: types.Message, user_id: int, correct_count: Optional[int] = None,
+                      user: Optional[types.User] = None):
+    """
+    Завершение квиза и отправка результата
+
+    Args:
+        message: Сообщение, в чат которого отправляется результат
+        user_id: ID пользователя
+        correct_count: Число правильных ответов, если оно уже известно (иначе читается из хранилища)
+        user: Пользователь Telegram, если сообщение отправлено не им (например, это сообщение бота)
+    """
+    text = await complete_quiz(user or message.from_user, user_id, correct_count)
+
+    await message.answer(text, parse_mode="HTML")
@@ -1,5 +1,5 @@
 from aiogram import types
-from keyboards import generate_start_keyboard
+from keyboards import START_KEYBOARD
 
 
 async def cmd_start(message: types.Message):
@@ -9,7 +9,7 @@ async def cmd_start(message: types.Message):
         "Я подготовил для вас 10 интересных вопросов из разных областей.\n"
         "Проверьте свои знания и узнайте, как вы справитесь!\n\n"
         "Выберите действие в меню ниже:",
-        reply_markup=generate_start_keyboard(),
+        reply_markup=START_KEYBOARD,
         parse_mode="Markdown"
     )
 
@@ -20,6 +20,7 @@ async def cmd_help(message: types.Message):
         "📚 *Доступные команды:*\n\n"
         "/start - начать работу с ботом\n"
         "/quiz - начать квиз\n"
+        "/quiz тема \\[сложность] - квиз по теме, например /quiz math 2\n"
         "/stats - посмотреть свою статистику\n"
         "/leaderboard - посмотреть лидеров\n"
         "/help - показать эту справку\n\n"
@@ -1,31 +1,62 @@
-from aiogram.types import KeyboardButton, InlineKeyboardButton
+from aiogram.types import KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 
-
 def generate_start_keyboard():
     """Генерация клавиатуры для стартового сообщения"""
     builder = ReplyKeyboardBuilder()
     buttons = [
         KeyboardButton(text="🧠 Начать квиз"),
+        KeyboardButton(text="🗂 Выбрать тему"),
         KeyboardButton(text="📊 Моя статистика"),
         KeyboardButton(text="🏆 Лидерборд")
     ]
     builder.add(*buttons)
-    builder.adjust(2, 1)  # 2 кнопки в первой строке, 1 во второй
+    builder.adjust(2, 2)  # по 2 кнопки в строке
     return builder.as_markup(resize_keyboard=True)
 
 
-def generate_options_keyboard(question_index: int, options: list):
-    """Генерация клавиатуры с вариантами ответов"""
+# Главное меню одинаково для всех, поэтому строится один раз при импорте.
+# Готовые клавиатуры не изменяются: aiogram только читает их при отправке
+START_KEYBOARD = generate_start_keyboard()
+
+
+def generate_options_keyboard(options: list, callback_data: list):
+    """
+    Генерация клавиатуры с вариантами ответов
+
+    Кнопки собираются без проверки моделей: тексты и данные уже проверены,
+    а клавиатура строится для каждого показанного вопроса.
+
+    Args:
+        options: Тексты вариантов в порядке показа
+        callback_data: Данные кнопок в том же порядке (callback_codec.encode_answer())
+    """
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=[
+        [InlineKeyboardButton.model_construct(text=option_text, callback_data=data)]
+        for option_text, data in zip(options, callback_data)
+    ])
+
+
+def generate_category_keyboard(categories: dict, counts: dict):
+    """
+    Генерация клавиатуры выбора темы квиза
+
+    Args:
+        categories: Названия категорий по их кодам
+        counts: Количество вопросов по кодам категорий (категории без вопросов не показываются)
+    """
     builder = InlineKeyboardBuilder()
 
-    for option_index, option_text in enumerate(options):
-        # Формат: "q{question_index}_a{option_index}"
-        callback_data = f"q{question_index}_a{option_index}"
+    for code, title in categories.items():
+        if not counts.get(code):
+            continue
+        # Формат: "c_{code}", пустой код — все темы
         builder.add(InlineKeyboardButton(
-            text=option_text,
-            callback_data=callback_data
+            text=f"{title} ({counts[code]})",
+            callback_data=f"c_{code}"
         ))
+    builder.add(InlineKeyboardButton(text="🎲 Все темы", callback_data="c_"))
 
     builder.adjust(1)
     return builder.as_markup()
+
@@ -0,0 +1,212 @@
+# metrics.py
+import functools
+import logging
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержек в секундах
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class Histogram:
+    """Гистограмма задержек: счётчики по корзинам, сумма и количество"""
+
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class LatencyMetric:
+    """Гистограммы задержек и счётчики ошибок с одной меткой (имя обработчика, запроса, метода)"""
+
+    def __init__(self, name: str, label: str, description: str):
+        """
+        Args:
+            name: Префикс имён метрик
+            label: Имя метки
+            description: Описание для HELP
+        """
+        self.name = name
+        self.label = label
+        self.description = description
+        self._histograms: Dict[str, Histogram] = {}
+        self._errors: Dict[str, int] = {}
+
+    def observe(self, label_value: str, seconds: float, error: bool = False):
+        """Учёт одного вызова"""
+        histogram = self._histograms.get(label_value)
+        if histogram is None:
+            histogram = self._histograms[label_value] = Histogram()
+        histogram.observe(seconds)
+        if error:
+            self._errors[label_value] = self._errors.get(label_value, 0) + 1
+
+    def render(self) -> list:
+        """Строки в текстовом формате Prometheus"""
+        duration = f"{self.name}_duration_seconds"
+        errors = f"{self.name}_errors_total"
+        lines = [
+            f"# HELP {duration} {self.description}: длительность вызова",
+            f"# TYPE {duration} histogram",
+        ]
+        for label_value, histogram in sorted(self._histograms.items()):
+            label = f'{self.label}="{_escape_label(label_value)}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'{duration}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f'{duration}_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f'{duration}_sum{{{label}}} {histogram.total}')
+            lines.append(f'{duration}_count{{{label}}} {histogram.count}')
+
+        lines.append(f"# HELP {errors} {self.description}: количество ошибок")
+        lines.append(f"# TYPE {errors} counter")
+        for label_value in sorted(self._histograms):
+            label = f'{self.label}="{_escape_label(label_value)}"'
+            lines.append(f'{errors}{{{label}}} {self._errors.get(label_value, 0)}')
+        return lines
+
+
+HANDLER_LATENCY = LatencyMetric("icosa_handler", "handler", "Обработчики обновлений")
+DB_LATENCY = LatencyMetric("icosa_db_query", "query", "Запросы к базе данных")
+API_LATENCY = LatencyMetric("icosa_telegram_api", "method", "Вызовы Telegram Bot API")
+
+# Мгновенные значения, вычисляемые при каждом запросе метрик: имя -> (описание, функция)
+_gauges: Dict[str, tuple] = {}
+# Счётчики, которые только растут (события с запуска процесса): имя без _total -> (описание, функция)
+_counters: Dict[str, tuple] = {}
+
+
+def register_gauge(name: str, description: str, value: Callable[[], float]):
+    """Регистрация метрики-значения, вычисляемой при каждом запросе /metrics"""
+    _gauges[name] = (description, value)
+
+
+def register_counter(name: str, description: str, value: Callable[[], float]):
+    """
+    Регистрация счётчика, вычисляемого при каждом запросе /metrics
+
+    Счётчик выводится с типом counter и суффиксом _total, чтобы к нему
+    применялись rate() и increase().
+    """
+    _counters[f"{name}_total"] = (description, value)
+
+
+def render() -> str:
+    """Все метрики в текстовом формате Prometheus"""
+    lines = []
+    for metric in (HANDLER_LATENCY, DB_LATENCY, API_LATENCY):
+        lines.extend(metric.render())
+
+    for kind, metrics in (("gauge", _gauges), ("counter", _counters)):
+        for name, (description, value) in sorted(metrics.items()):
+            try:
+                current = value()
+            except Exception as exc_gauge:
+                logger.error(f"Ошибка вычисления метрики {name}: {exc_gauge}")
+                continue
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {current}")
+
+    return "\n".join(lines) + "\n"
+
+
+def timed_query(func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+    """Декоратор учёта задержки и ошибок асинхронной функции работы с базой"""
+    name = func.__name__
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            DB_LATENCY.observe(name, time.perf_counter() - started, error=True)
+            raise
+        DB_LATENCY.observe(name, time.perf_counter() - started)
+        return result
+
+    return wrapper
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Учёт задержки и ошибок обработчиков (регистрируется как inner middleware)"""
+
+    async def __call__(
+            self,
+            handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+            event: Any,
+            data: Dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = handler_object.callback.__name__ if handler_object is not None else "unknown"
+
+        started = time.perf_counter()
+        try:
+            result = await handler(event, data)
+        except Exception:
+            HANDLER_LATENCY.observe(name, time.perf_counter() - started, error=True)
+            raise
+        HANDLER_LATENCY.observe(name, time.perf_counter() - started)
+        return result
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Учёт задержки и ошибок вызовов Bot API (регистрируется в bot.session.middleware)"""
+
+    async def __call__(self, make_request, bot, method):
+        name = method.__api_method__
+        started = time.perf_counter()
+        try:
+            result = await make_request(bot, method)
+        except Exception:
+            API_LATENCY.observe(name, time.perf_counter() - started, error=True)
+            raise
+        API_LATENCY.observe(name, time.perf_counter() - started)
+        return result
+
+
+async def _handle_metrics(_request: web.Request) -> web.Response:
+    return web.Response(body=render().encode(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """
+    Запуск HTTP-сервера с метриками в формате Prometheus на /metrics
+
+    Returns:
+        AppRunner для последующей остановки через stop_metrics_server()
+    """
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
+
+
+async def stop_metrics_server(runner: Optional[web.AppRunner]):
+    """Остановка сервера метрик"""
+    if runner is not None:
+        await runner.cleanup()
@@ -0,0 +1,116 @@
+# migrations.py
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Версионированные миграции схемы: (версия, список SQL-выражений).
+# Применённая версия хранится в PRAGMA user_version. Новые изменения схемы
+# добавляются только в конец списка с очередным номером версии.
+MIGRATIONS = [
+    # 1: исходная схема. IF NOT EXISTS оставлен только здесь, чтобы принять
+    # базы, созданные до появления миграций (у них user_version = 0).
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS quiz_state (
+            user_id INTEGER PRIMARY KEY,
+            question_index INTEGER DEFAULT 0,
+            correct_answers INTEGER DEFAULT 0,
+            selected_questions TEXT DEFAULT '[]'  -- JSON массив с индексами вопросов
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            last_correct INTEGER DEFAULT 0,
+            last_total INTEGER DEFAULT 0,
+            total_correct INTEGER DEFAULT 0,
+            total_attempts INTEGER DEFAULT 0
+        )
+        ''',
+    ]),
+    # 2: упакованная сессия квиза (вопросы и порядок вариантов), чтобы незавершённые
+    # квизы переживали перезапуск и могли продолжаться любым процессом
+    (2, [
+        'ALTER TABLE quiz_state ADD COLUMN session_data BLOB',
+    ]),
+    # 3: хранимая точность последнего квиза и индекс под сортировку лидерборда
+    (3, [
+        'ALTER TABLE user_stats ADD COLUMN score REAL NOT NULL DEFAULT 0',
+        '''
+        UPDATE user_stats
+        SET score = CASE WHEN last_total > 0 THEN last_correct * 100.0 / last_total ELSE 0 END
+        ''',
+        'CREATE INDEX idx_user_stats_leaderboard ON user_stats (score DESC, last_correct DESC)',
+    ]),
+    # 4: колоды вопросов пользователей (question_deck.QuestionDeck), чтобы вопросы
+    # не повторялись в следующих квизах. pool — код набора ('' — все вопросы)
+    (4, [
+        '''
+        CREATE TABLE question_deck (
+            user_id INTEGER NOT NULL,
+            pool TEXT NOT NULL,
+            seed INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (user_id, pool)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+]
+
+# Последняя версия схемы, известная коду
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_schema_version(db) -> int:
+    """Получение применённой версии схемы"""
+    async with db.execute('PRAGMA user_version') as cursor:
+        row = await cursor.fetchone()
+        return row[0]
+
+
+async def migrate(db) -> int:
+    """
+    Применение недостающих миграций
+
+    Каждая миграция выполняется в отдельной транзакции BEGIN IMMEDIATE вместе
+    с обновлением user_version, поэтому несколько процессов, стартующих
+    одновременно, не применят одну миграцию дважды.
+
+    Args:
+        db: Соединение aiosqlite
+
+    Returns:
+        Версия схемы после применения миграций
+    """
+    version = await get_schema_version(db)
+    if version > LATEST_VERSION:
+        raise RuntimeError(
+            f"Версия схемы базы ({version}) новее, чем поддерживает код ({LATEST_VERSION})"
+        )
+
+    for target_version, statements in MIGRATIONS:
+        if target_version <= version:
+            continue
+
+        await db.execute('BEGIN IMMEDIATE')
+        try:
+            # Версию перечитываем под блокировкой записи: её мог поднять другой процесс
+            version = await get_schema_version(db)
+            if target_version <= version:
+                await db.commit()
+                continue
+
+            for statement in statements:
+                await db.execute(statement)
+            await db.execute(f'PRAGMA user_version = {target_version}')
+            await db.commit()
+        except BaseException:
+            await db.rollback()
+            raise
+
+        version = target_version
+        logger.info(f"Применена миграция схемы базы данных до версии {target_version}")
+
+    return version
@@ -0,0 +1,319 @@
+# question_analytics.py
+"""
+Статистика вопросов по журналу ответов (см. answer_log.py)
+
+Для каждого вопроса считаются доля правильных ответов, доля выбора каждого
+неправильного варианта, медианное время ответа и индекс дискриминации:
+разность долей правильных ответов в верхних и нижних 27% сессий по
+результату квиза. Все события загружаются в столбцы NumPy и агрегируются
+целиком (bincount, сортировка ключей), без цикла по событиям в Python.
+
+Оценка сложности вопроса (доля неправильных ответов) может быть записана
+обратно в data/questions.json полем difficulty_score:
+    python -m question_analytics data/answers --write
+    python -m question_analytics data/answers --json stats.json
+
+Требуется NumPy (pip install -r requirements-analytics.txt); самому боту он не нужен.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from answer_log import ANSWER_EVENT, EVENT_FIELDS, SEGMENT_HEADER, list_segments, read_segment
+from question_bank import MAX_OPTIONS
+
+QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'questions.json')
+
+# Доля сессий в верхней и нижней группах для индекса дискриминации
+GROUP_FRACTION = 0.27
+# Сессии короче этого не участвуют в группах: по двум ответам результат квиза не оценить
+MIN_SESSION_ANSWERS = 5
+# Множитель хеша пары (пользователь, nonce) при поиске сессий (2^64 / золотое сечение)
+SESSION_HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+def _event_dtype():
+    """Тип записи NumPy, совпадающий с ANSWER_EVENT"""
+    return np.dtype({
+        'names': list(EVENT_FIELDS),
+        'formats': ['<f8', '<i8', '<u4', '<u4', '<u4', 'u1', 'u1', 'u1'],
+        'offsets': [0, 8, 16, 20, 24, 28, 29, 30],
+        'itemsize': ANSWER_EVENT.size,
+    })
+
+
+def load_events(directory: str):
+    """
+    Все события журнала одним массивом записей
+
+    Массив выделяется один раз по размерам сегментов, поэтому в памяти
+    сверх него находится только читаемый сегмент.
+    """
+    if np is None:
+        raise RuntimeError("Для аналитики журнала ответов нужен NumPy: pip install -r requirements-analytics.txt")
+
+    dtype = _event_dtype()
+    segments = list_segments(directory)
+    capacity = sum(max(0, os.path.getsize(path) - SEGMENT_HEADER.size) // ANSWER_EVENT.size for path in segments)
+    events = np.empty(capacity, dtype=dtype)
+
+    count = 0
+    for path in segments:
+        try:
+            data = read_segment(path)
+        except FileNotFoundError:
+            # Сегмент успели объединить при сжатии — его события уже в новом сегменте
+            continue
+        # Активный сегмент мог вырасти после подсчёта размеров — лишние события не влезут
+        size = min(len(data) // ANSWER_EVENT.size, capacity - count)
+        events[count:count + size] = np.frombuffer(data, dtype=dtype, count=size)
+        count += size
+    return events[:count]
+
+
+def _group_medians(groups, values, size: int):
+    """Медиана values для каждой группы 0..size-1 (NaN для пустых групп)"""
+    # Один ключ (группа, значение) сортируется быстрее, чем lexsort по двум столбцам
+    keys = (groups.astype(np.uint64) << np.uint64(32)) | values.astype(np.uint64)
+    keys.sort()
+    counts = np.bincount(keys >> np.uint64(32), minlength=size)
+    starts = np.cumsum(counts) - counts
+    sorted_values = (keys & np.uint64(0xFFFFFFFF)).astype(np.float64)
+
+    medians = np.full(size, np.nan)
+    present = counts > 0
+    lower = starts[present] + (counts[present] - 1) // 2
+    upper = starts[present] + counts[present] // 2
+    medians[present] = (sorted_values[lower] + sorted_values[upper]) / 2
+    return medians
+
+
+def _session_numbers(events):
+    """Номер сессии (пользователь, nonce) для каждого события и количество сессий"""
+    users = events['user_id']
+    nonces = events['nonce']
+    # Сортировка одного 64-битного хеша пары в несколько раз быстрее lexsort по двум столбцам
+    keys = (users.view(np.uint64) * np.uint64(SESSION_HASH_MULTIPLIER)) ^ nonces
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+    starts = np.empty(len(order), dtype=bool)
+    starts[:1] = True
+    np.not_equal(sorted_keys[1:], sorted_keys[:-1], out=starts[1:])
+
+    # У разных сессий совпал хеш: соседние события с равным ключом различаются — сортируем точно
+    same = ~starts[1:]
+    sorted_users, sorted_nonces = users[order], nonces[order]
+    collided = ((sorted_users[1:] != sorted_users[:-1]) | (sorted_nonces[1:] != sorted_nonces[:-1])) & same
+    if collided.any():
+        order = np.lexsort((nonces, users))
+        sorted_users, sorted_nonces = users[order], nonces[order]
+        np.not_equal(sorted_users[1:], sorted_users[:-1], out=starts[1:])
+        starts[1:] |= sorted_nonces[1:] != sorted_nonces[:-1]
+
+    sessions = np.empty(len(order), dtype=np.int64)
+    sessions[order] = np.cumsum(starts) - 1
+    return sessions, int(starts.sum())
+
+
+def question_stats(events, group_fraction: float = GROUP_FRACTION,
+                   min_session_answers: int = MIN_SESSION_ANSWERS) -> dict:
+    """
+    Агрегаты по вопросам
+
+    Args:
+        events: Массив событий (load_events())
+        group_fraction: Доля сессий в верхней и нижней группах
+        min_session_answers: Минимум ответов в сессии для участия в группах
+
+    Returns:
+        Словарь массивов, индексированных ID вопроса: answers, correct_rate,
+        pick_rate (вопрос × исходный вариант), median_response_ms и discrimination
+    """
+    if np is None:
+        raise RuntimeError("Для аналитики журнала ответов нужен NumPy: pip install -r requirements-analytics.txt")
+
+    question_ids = events['question_id'].astype(np.int64)
+    size = int(question_ids.max()) + 1 if len(events) else 0
+    correct = events['correct'].astype(bool)
+
+    answers = np.bincount(question_ids, minlength=size)
+    correct_answers = np.bincount(question_ids[correct], minlength=size)
+    picks = np.bincount(
+        question_ids * MAX_OPTIONS + events['option'], minlength=size * MAX_OPTIONS
+    ).reshape(size, MAX_OPTIONS)
+
+    timed = events['response_ms'] > 0
+    median_response_ms = _group_medians(question_ids[timed], events['response_ms'][timed], size)
+
+    # Индекс дискриминации: сессии ранжируются по доле правильных ответов
+    discrimination = np.full(size, np.nan)
+    sessions, session_count = _session_numbers(events)
+    session_answers = np.bincount(sessions, minlength=session_count)
+    session_scores = np.bincount(sessions, weights=correct, minlength=session_count) / np.maximum(session_answers, 1)
+    eligible = session_answers >= min_session_answers
+    if eligible.any():
+        low_cut, high_cut = np.quantile(session_scores[eligible], [group_fraction, 1 - group_fraction])
+        upper = (eligible & (session_scores >= high_cut))[sessions]
+        lower = (eligible & (session_scores <= low_cut))[sessions]
+        upper_answers = np.bincount(question_ids[upper], minlength=size)
+        lower_answers = np.bincount(question_ids[lower], minlength=size)
+        grouped = (upper_answers > 0) & (lower_answers > 0)
+        upper_rate = np.bincount(question_ids[upper & correct], minlength=size)[grouped] / upper_answers[grouped]
+        lower_rate = np.bincount(question_ids[lower & correct], minlength=size)[grouped] / lower_answers[grouped]
+        discrimination[grouped] = upper_rate - lower_rate
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        correct_rate = correct_answers / answers
+        pick_rate = picks / answers[:, None]
+
+    return {
+        'answers': answers,
+        'correct_rate': correct_rate,
+        'pick_rate': pick_rate,
+        'median_response_ms': median_response_ms,
+        'discrimination': discrimination,
+        'sessions': session_count,
+    }
+
+
+def _rounded(value, digits: int = 3) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def question_report(stats: dict, questions: list) -> list:
+    """
+    Статистика по вопросам набора в виде словарей для вывода и JSON
+
+    Args:
+        stats: Результат question_stats()
+        questions: Вопросы из questions.json (словари с id, options, correct_option)
+    """
+    report = []
+    size = len(stats['answers'])
+    for raw in questions:
+        question_id = raw['id']
+        answers = int(stats['answers'][question_id]) if question_id < size else 0
+        if not answers:
+            report.append({'id': question_id, 'answers': 0})
+            continue
+        report.append({
+            'id': question_id,
+            'answers': answers,
+            'correct_rate': _rounded(stats['correct_rate'][question_id]),
+            'distractor_rates': {
+                str(option): _rounded(stats['pick_rate'][question_id, option])
+                for option in range(len(raw['options'])) if option != raw['correct_option']
+            },
+            'median_response_ms': _rounded(stats['median_response_ms'][question_id], 1),
+            'discrimination': _rounded(stats['discrimination'][question_id]),
+        })
+    return report
+
+
+def _dump_questions(data: dict) -> str:
+    """Сериализация в формате data/questions.json: по вопросу на строку, прочие ключи — как есть"""
+    sections = []
+    for key, value in data.items():
+        if key == 'categories':
+            items = ',\n'.join(
+                f"    {json.dumps(code, ensure_ascii=False)}: {json.dumps(name, ensure_ascii=False)}"
+                for code, name in value.items()
+            )
+            body = f"{{\n{items}\n  }}"
+        elif key == 'questions':
+            items = ',\n'.join(f"    {json.dumps(raw, ensure_ascii=False)}" for raw in value)
+            body = f"[\n{items}\n  ]"
+        else:
+            body = json.dumps(value, ensure_ascii=False, indent=2).replace('\n', '\n  ')
+        sections.append(f"  {json.dumps(key, ensure_ascii=False)}: {body}")
+    return "{\n" + ',\n'.join(sections) + "\n}\n"
+
+
+def write_difficulty_scores(path: str, report: list, min_answers: int) -> int:
+    """
+    Запись оценок сложности (1 − доля правильных ответов) в файл вопросов
+
+    Вопросы, на которые ответили реже min_answers раз, не меняются. Файл
+    заменяется атомарно, и запущенный бот перечитывает его сам.
+
+    Returns:
+        Количество обновлённых вопросов
+    """
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+
+    scores = {
+        row['id']: round(1 - row['correct_rate'], 3)
+        for row in report if row['answers'] >= min_answers and row.get('correct_rate') is not None
+    }
+    for raw in data['questions']:
+        if raw['id'] in scores:
+            raw['difficulty_score'] = scores[raw['id']]
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix='.questions-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write(_dump_questions(data))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return len(scores)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Статистика вопросов Icosa по журналу ответов")
+    parser.add_argument("directory", help="Каталог журнала ответов")
+    parser.add_argument("--questions", default=QUESTIONS_PATH, help="Файл вопросов")
+    parser.add_argument("--min-answers", type=int, default=30,
+                        help="Минимум ответов на вопрос для записи оценки сложности")
+    parser.add_argument("--write", action="store_true", help="Записать оценки сложности в файл вопросов")
+    parser.add_argument("--json", metavar="PATH", help="Сохранить статистику по вопросам в JSON")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("Для аналитики журнала ответов нужен NumPy: pip install -r requirements-analytics.txt", file=sys.stderr)
+        return 1
+
+    started = time.perf_counter()
+    events = load_events(args.directory)
+    loaded = time.perf_counter()
+    stats = question_stats(events)
+    finished = time.perf_counter()
+    print(f"Событий: {len(events)}, сессий: {stats['sessions']}; "
+          f"чтение {loaded - started:.2f} с, расчёт {finished - loaded:.2f} с")
+
+    with open(args.questions, encoding='utf-8') as file:
+        questions = json.load(file)['questions']
+    report = question_report(stats, questions)
+
+    for row in report:
+        if not row['answers']:
+            continue
+        median = row['median_response_ms']
+        discrimination = row['discrimination']
+        print(f"{row['id']:>6}: ответов {row['answers']:>8}, правильно {row['correct_rate']:.1%}, "
+              f"медиана {'—' if median is None else f'{median / 1000:.1f} с'}, "
+              f"дискриминация {'—' if discrimination is None else f'{discrimination:+.2f}'}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+    if args.write:
+        updated = write_difficulty_scores(args.questions, report, args.min_answers)
+        print(f"Оценки сложности записаны для {updated} вопросов: {args.questions}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# question_bank.py
+import json
+import random
+import sys
+from typing import Dict, Iterable, Optional
+
+# Уровни сложности вопросов
+DIFFICULTY_LEVELS = (1, 2, 3)
+
+# Больше вариантов не поместится в номер перестановки сессии (8! < 2**16)
+MAX_OPTIONS = 8
+
+# Длина текста вопроса или варианта в UTF-8: в хранилище она записывается в u16 (см. question_store.LENGTH)
+MAX_TEXT_BYTES = 0xFFFF
+
+
+class Question:
+    """Вопрос квиза"""
+
+    __slots__ = ('id', 'text', 'options', 'correct_option', 'category', 'difficulty', 'difficulty_score')
+
+    def __init__(self, question_id: int, text: str, options: tuple, correct_option: int,
+                 category: str, difficulty: int, difficulty_score: Optional[float] = None):
+        self.id = question_id
+        self.text = text
+        self.options = options
+        self.correct_option = correct_option
+        self.category = category
+        self.difficulty = difficulty
+        # Доля неправильных ответов по журналу (см. question_analytics.py); None — ещё не посчитана
+        self.difficulty_score = difficulty_score
+
+    def __repr__(self):
+        return f"Question(id={self.id}, category={self.category!r}, text={self.text!r})"
+
+
+class QuestionBank:
+    """
+    Набор вопросов с индексами для выборки
+
+    Вопросы адресуются стабильными целочисленными идентификаторами из
+    исходного файла. Для каждой категории и уровня сложности заранее
+    построены кортежи идентификаторов, поэтому поиск по идентификатору
+    и случайная выборка не требуют прохода по всему набору.
+    """
+
+    def __init__(self, questions: Iterable[Question], categories: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            questions: Вопросы
+            categories: Названия категорий по их кодам
+        """
+        self.categories = dict(categories or {})
+        self._by_id: Dict[int, Question] = {}
+
+        by_category: Dict[str, list] = {}
+        by_difficulty: Dict[int, list] = {}
+        by_category_difficulty: Dict[tuple, list] = {}
+        for question in questions:
+            if question.id in self._by_id:
+                raise ValueError(f"Повторяющийся идентификатор вопроса: {question.id}")
+            self._by_id[question.id] = question
+            by_category.setdefault(question.category, []).append(question.id)
+            by_difficulty.setdefault(question.difficulty, []).append(question.id)
+            by_category_difficulty.setdefault((question.category, question.difficulty), []).append(question.id)
+
+        self.ids = tuple(self._by_id)
+        self.by_category = {key: tuple(ids) for key, ids in by_category.items()}
+        self.by_difficulty = {key: tuple(ids) for key, ids in by_difficulty.items()}
+        self.by_category_difficulty = {key: tuple(ids) for key, ids in by_category_difficulty.items()}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, question_id: int):
+        return question_id in self._by_id
+
+    def get(self, question_id: int) -> Optional[Question]:
+        """Вопрос по идентификатору или None"""
+        return self._by_id.get(question_id)
+
+    def option_count(self, question_id: int) -> Optional[int]:
+        """Количество вариантов ответа или None, если вопроса нет"""
+        question = self._by_id.get(question_id)
+        return len(question.options) if question is not None else None
+
+    def difficulty(self, question_id: int) -> Optional[tuple]:
+        """Уровень сложности и оценка сложности (или None) вопроса; None, если вопроса нет"""
+        question = self._by_id.get(question_id)
+        return (question.difficulty, question.difficulty_score) if question is not None else None
+
+    def pool(self, category: Optional[str] = None, difficulty: Optional[int] = None) -> tuple:
+        """
+        Заранее построенный кортеж идентификаторов вопросов с фильтром
+
+        Args:
+            category: Код категории (None — любая)
+            difficulty: Уровень сложности (None — любой)
+        """
+        if category is not None and difficulty is not None:
+            pool = self.by_category_difficulty.get((category, difficulty), ())
+        elif category is not None:
+            pool = self.by_category.get(category, ())
+        elif difficulty is not None:
+            pool = self.by_difficulty.get(difficulty, ())
+        else:
+            pool = self.ids
+        return pool
+
+    def sample_ids(self, count: int, category: Optional[str] = None, difficulty: Optional[int] = None) -> list:
+        """
+        Случайные идентификаторы вопросов без повторов
+
+        Args:
+            count: Количество вопросов (не больше доступных)
+            category: Код категории (None — любая)
+            difficulty: Уровень сложности (None — любой)
+        """
+        pool = self.pool(category, difficulty)
+        return random.sample(pool, min(count, len(pool)))
+
+
+def _parse_question(raw: dict, categories: Dict[str, str]) -> Question:
+    question_id = raw['id']
+    options = tuple(sys.intern(option) for option in raw['options'])
+    correct_option = raw['correct_option']
+    category = sys.intern(raw.get('category', 'general'))
+    difficulty = raw.get('difficulty', 2)
+    difficulty_score = raw.get('difficulty_score')
+
+    if not isinstance(question_id, int) or question_id < 0:
+        raise ValueError(f"Некорректный идентификатор вопроса: {question_id!r}")
+    if not 2 <= len(options) <= MAX_OPTIONS:
+        raise ValueError(f"Вопрос {question_id}: должно быть от 2 до {MAX_OPTIONS} вариантов")
+    if not 0 <= correct_option < len(options):
+        raise ValueError(f"Вопрос {question_id}: номер правильного варианта вне диапазона")
+    if difficulty not in DIFFICULTY_LEVELS:
+        raise ValueError(f"Вопрос {question_id}: неизвестная сложность {difficulty!r}")
+    if difficulty_score is not None and not (isinstance(difficulty_score, (int, float)) and 0 <= difficulty_score <= 1):
+        raise ValueError(f"Вопрос {question_id}: оценка сложности должна быть числом от 0 до 1")
+    if categories and category not in categories:
+        raise ValueError(f"Вопрос {question_id}: неизвестная категория {category!r}")
+    for text in (raw['question'], *options):
+        if len(text.encode('utf-8')) > MAX_TEXT_BYTES:
+            raise ValueError(f"Вопрос {question_id}: текст длиннее {MAX_TEXT_BYTES} байт в UTF-8")
+
+    return Question(question_id, raw['question'], options, correct_option, category, difficulty, difficulty_score)
+
+
+def load_question_bank(path: str) -> QuestionBank:
+    """
+    Загрузка набора вопросов из JSON-файла
+
+    Формат: {"categories": {код: название}, "questions": [{"id", "category",
+    "difficulty", "question", "options", "correct_option"[, "difficulty_score"]}, ...]}
+    """
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+
+    categories = data.get('categories', {})
+    return QuestionBank((_parse_question(raw, categories) for raw in data['questions']), categories)
@@ -0,0 +1,112 @@
+# question_deck.py
+import random
+from typing import Optional, Sequence
+
+MASK64 = (1 << 64) - 1
+
+# Раундов сети Фейстеля достаточно для «перемешанного» вида колоды
+FEISTEL_ROUNDS = 4
+
+
+def _mix(value: int) -> int:
+    """Перемешивание битов 64-битного числа (финализатор splitmix64)"""
+    value = (value ^ (value >> 30)) * 0xBF58476D1CE4E5B9 & MASK64
+    value = (value ^ (value >> 27)) * 0x94D049BB133111EB & MASK64
+    return value ^ (value >> 31)
+
+
+class DeckPermutation:
+    """
+    Псевдослучайная перестановка чисел 0..size-1, заданная зерном
+
+    Позиция переводится в элемент колоды сетью Фейстеля на ближайшем чётном
+    числе битов, а значения за пределами size пропускаются повторным
+    применением (cycle walking). Перестановку не нужно хранить: достаточно
+    зерна и размера, а каждый элемент вычисляется за O(1) в среднем.
+    """
+
+    __slots__ = ('size', '_half_bits', '_half_mask', '_keys')
+
+    def __init__(self, seed: int, size: int):
+        """
+        Args:
+            seed: Зерно перестановки
+            size: Количество элементов
+        """
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        bits += bits % 2
+        self._half_bits = bits // 2
+        self._half_mask = (1 << self._half_bits) - 1
+        self._keys = tuple(_mix(seed + round_number) for round_number in range(1, FEISTEL_ROUNDS + 1))
+
+    def _encrypt(self, value: int) -> int:
+        left = value >> self._half_bits
+        right = value & self._half_mask
+        for key in self._keys:
+            left, right = right, left ^ (_mix(right ^ key) & self._half_mask)
+        return (left << self._half_bits) | right
+
+    def __getitem__(self, position: int) -> int:
+        value = self._encrypt(position)
+        # Домен сети не больше 4 * size, поэтому в среднем хватает нескольких шагов
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+
+class QuestionDeck:
+    """
+    Колода вопросов пользователя: вопросы выдаются в перемешанном порядке
+    без повторов, пока колода не закончится, после чего она тасуется заново
+
+    Состояние — три числа (зерно, размер набора, позиция), поэтому его можно
+    хранить в базе для каждого пользователя.
+    """
+
+    __slots__ = ('seed', 'size', 'position')
+
+    def __init__(self, seed: Optional[int] = None, size: int = 0, position: int = 0):
+        """
+        Args:
+            seed: Зерно текущего круга колоды (None — новое случайное)
+            size: Размер набора вопросов, для которого перетасована колода
+            position: Сколько вопросов текущего круга уже выдано
+        """
+        self.seed = random.getrandbits(63) if seed is None else seed
+        self.size = size
+        self.position = position
+
+    def draw(self, pool: Sequence[int], count: int) -> list:
+        """
+        Выдача следующих count вопросов колоды
+
+        Если набор изменился в размере, колода начинается заново. На стыке
+        кругов вопросы, уже выданные в этот раз, пропускаются.
+
+        Args:
+            pool: Идентификаторы вопросов набора
+            count: Количество вопросов (не больше размера набора)
+
+        Returns:
+            Идентификаторы вопросов
+        """
+        size = len(pool)
+        count = min(count, size)
+        if size != self.size or not 0 <= self.position <= size:
+            self.seed, self.size, self.position = random.getrandbits(63), size, 0
+
+        permutation = DeckPermutation(self.seed, size)
+        drawn = []
+        drawn_set = set()
+        while len(drawn) < count:
+            if self.position >= size:
+                self.seed, self.position = random.getrandbits(63), 0
+                permutation = DeckPermutation(self.seed, size)
+
+            question_id = pool[permutation[self.position]]
+            self.position += 1
+            if question_id not in drawn_set:
+                drawn.append(question_id)
+                drawn_set.add(question_id)
+        return drawn
@@ -0,0 +1,148 @@
+# question_picker.py
+"""
+Выбор следующего вопроса адаптивного квиза по точности ответов пользователя
+
+Вопросы набора заранее раскладываются по корзинам сложности, поэтому выбор
+вопроса — несколько случайных обращений к кортежу, сколько бы вопросов ни
+было в наборе. Корзины строятся при загрузке набора (build_pickers(), вне
+цикла событий) и публикуются вместе с ним (register_pickers()); пока на
+набор ссылаются квизы, его корзины живут вместе с ним.
+"""
+import logging
+import random
+import weakref
+from array import array
+from typing import Container, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Количество корзин сложности на отрезке [0, 1]
+DIFFICULTY_BUCKETS = 10
+
+# Оценка сложности для вопросов, ещё не измеренных по журналу ответов (по уровню)
+LEVEL_SCORES = {1: 0.25, 2: 0.5, 3: 0.75}
+
+# Случайных попыток в корзине, прежде чем перебирать её по порядку
+MAX_PICK_ATTEMPTS = 8
+
+
+def _bucket(score: float) -> int:
+    return min(int(score * DIFFICULTY_BUCKETS), DIFFICULTY_BUCKETS - 1)
+
+
+def _question_bucket(bank, question_id: int) -> int:
+    level, score = bank.difficulty(question_id)
+    return _bucket(score if score is not None else LEVEL_SCORES.get(level, 0.5))
+
+
+def question_buckets(bank) -> array:
+    """Номер корзины сложности для каждого ID вопроса набора (оценки читаются один раз)"""
+    ids = bank.pool()
+    buckets = array('B', bytes(max(ids) + 1 if len(ids) else 0))
+    for question_id in ids:
+        buckets[question_id] = _question_bucket(bank, question_id)
+    return buckets
+
+
+class DifficultyPicker:
+    """
+    Корзины вопросов набора по оценке сложности (доле неправильных ответов)
+
+    Для каждой корзины заранее известен порядок ближайших непустых корзин,
+    поэтому пустые участки шкалы не требуют поиска при выборе.
+    """
+
+    def __init__(self, bank, pool, bucket_of: Optional[Sequence[int]] = None):
+        """
+        Args:
+            bank: Набор вопросов (QuestionBank или MappedQuestionBank)
+            pool: Идентификаторы вопросов, из которых идёт выбор
+            bucket_of: Номер корзины по ID вопроса (question_buckets());
+                если не задан, вычисляется по набору
+        """
+        buckets = [[] for _ in range(DIFFICULTY_BUCKETS)]
+        if bucket_of is None:
+            for question_id in pool:
+                buckets[_question_bucket(bank, question_id)].append(question_id)
+        else:
+            for question_id in pool:
+                buckets[bucket_of[question_id]].append(question_id)
+
+        self.buckets = tuple(tuple(bucket) for bucket in buckets)
+        self.size = len(pool)
+        filled = [number for number, bucket in enumerate(self.buckets) if bucket]
+        # При равном расстоянии сначала более лёгкая корзина
+        self._nearest = tuple(
+            tuple(sorted(filled, key=lambda number: (abs(number - target), number)))
+            for target in range(DIFFICULTY_BUCKETS)
+        )
+
+    @staticmethod
+    def target_score(answered: int, correct: int) -> float:
+        """
+        Желаемая сложность следующего вопроса: сглаженная доля правильных ответов
+
+        Чем точнее отвечает пользователь, тем чаще ему ошибаются другие на
+        следующем вопросе; до первого ответа — середина шкалы.
+        """
+        return (correct + 1) / (answered + 2)
+
+    def pick(self, answered: int, correct: int, exclude: Container[int] = ()) -> Optional[int]:
+        """
+        Выбор вопроса под текущую точность пользователя
+
+        Args:
+            answered: Сколько вопросов квиза уже отвечено
+            correct: Сколько из них правильно
+            exclude: Вопросы, которые уже были в квизе
+
+        Returns:
+            Идентификатор вопроса или None, если все вопросы набора исключены
+        """
+        for number in self._nearest[_bucket(self.target_score(answered, correct))]:
+            bucket = self.buckets[number]
+            for _ in range(MAX_PICK_ATTEMPTS):
+                question_id = bucket[random.randrange(len(bucket))]
+                if question_id not in exclude:
+                    return question_id
+            # Корзина почти целиком исключена: подходящий вопрос найдётся не дальше len(exclude) шагов
+            for question_id in bucket:
+                if question_id not in exclude:
+                    return question_id
+        return None
+
+
+# Корзины опубликованных наборов: набор → {тема (None — все темы): DifficultyPicker}
+_pickers = weakref.WeakKeyDictionary()
+
+
+def build_pickers(bank) -> dict:
+    """
+    Корзины сложности для всего набора (ключ None) и каждой его темы
+
+    Занимает время, пропорциональное размеру набора, поэтому вызывается при
+    загрузке набора, а при перезагрузке — в отдельном потоке.
+    """
+    buckets = question_buckets(bank)
+    return {category: DifficultyPicker(bank, bank.pool(category), buckets)
+            for category in (None, *bank.by_category)}
+
+
+def register_pickers(bank, pickers: dict):
+    """Публикация корзин набора, построенных build_pickers()"""
+    _pickers[bank] = pickers
+
+
+def difficulty_picker(bank, category: Optional[str] = None) -> DifficultyPicker:
+    """Корзины сложности для темы набора (построенные при его загрузке)"""
+    pickers = _pickers.get(bank)
+    if pickers is None:
+        # Набор не прошёл через register_pickers(): строим корзины здесь, один раз
+        logger.warning("Корзины сложности не построены при загрузке набора, строятся при выборе вопроса")
+        pickers = build_pickers(bank)
+        register_pickers(bank, pickers)
+    picker = pickers.get(category)
+    if picker is None:
+        # Темы нет в наборе: выбирать не из чего
+        picker = pickers[category] = DifficultyPicker(bank, ())
+    return picker
@@ -0,0 +1,349 @@
+# question_store.py
+"""
+Двоичный файл набора вопросов, открываемый через mmap
+
+Все процессы бота отображают один и тот же файл в память, поэтому страницы
+с текстами вопросов общие (через кэш ОС), а в памяти процесса создаётся
+только вопрос, который сейчас показывается. Пересборку устаревшего файла
+процессы выполняют под блокировкой файла <хранилище>.lock: собирает его
+один процесс, остальные открывают готовый файл.
+
+Структура файла (все числа little-endian):
+    заголовок        HEADER
+    метаданные       JSON: названия и порядок категорий, подпись исходного JSON
+    записи вопросов  RECORD × количество вопросов (фиксированного размера)
+    таблица слотов   u32 × (максимальный id + 1): номер записи по id или EMPTY_SLOT
+    таблица индексов INDEX_ENTRY × количество индексов
+    массивы id       u32 для каждого индекса (все вопросы, категория, сложность, пара)
+    тексты           для каждого вопроса: u16 длины текста и вариантов, затем UTF-8
+
+Сборка из JSON:
+    python -m question_store data/questions.json data/questions.qbank
+"""
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from question_bank import Question, QuestionBank, load_question_bank
+
+MAGIC = b'QBNK'
+FORMAT_VERSION = 2
+
+# magic, версия, резерв, вопросов, слотов, индексов, смещение и длина метаданных,
+# смещения записей, слотов, таблицы индексов и текстов
+HEADER = struct.Struct('<4sHHIIIIIIIII')
+# id, смещение текстов, длина текстов, номер категории, сложность, вариантов, правильный вариант,
+# оценка сложности (0..SCORE_SCALE, SCORE_UNKNOWN — нет)
+RECORD = struct.Struct('<IIIHBBBB')
+# номер категории (ANY_CATEGORY — любая), сложность (0 — любая), смещение массива id, длина
+INDEX_ENTRY = struct.Struct('<HBxII')
+LENGTH = struct.Struct('<H')
+
+EMPTY_SLOT = 0xFFFFFFFF
+SCORE_SCALE = 254
+SCORE_UNKNOWN = 0xFF
+ANY_CATEGORY = 0xFFFF
+# Ограничение размера таблицы слотов (id используются как прямой индекс)
+MAX_QUESTION_ID = 1 << 24
+
+
+def _id_array(values) -> bytes:
+    ids = array('I', values)
+    if sys.byteorder != 'little':
+        ids.byteswap()
+    return ids.tobytes()
+
+
+def source_signature(source_path: str) -> list:
+    """Подпись исходного файла (время изменения в наносекундах и размер)"""
+    stat = os.stat(source_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def compile_question_bank(bank: QuestionBank, signature: Optional[list] = None) -> bytes:
+    """
+    Сборка двоичного представления набора вопросов
+
+    Args:
+        bank: Набор вопросов
+        signature: Подпись исходного файла (source_signature()), по которой
+            open_question_store() отличает устаревшее хранилище
+    """
+    category_codes = list(bank.categories) or sorted(bank.by_category)
+    for category in bank.by_category:
+        if category not in category_codes:
+            category_codes.append(category)
+    category_numbers = {category: number for number, category in enumerate(category_codes)}
+
+    ids = sorted(bank.ids)
+    if ids and ids[-1] >= MAX_QUESTION_ID:
+        raise ValueError(f"Идентификатор вопроса {ids[-1]} слишком велик для хранилища")
+    slot_count = ids[-1] + 1 if ids else 0
+
+    # Тексты и записи
+    blobs = bytearray()
+    records = bytearray()
+    for question_id in ids:
+        question = bank.get(question_id)
+        encoded = [question.text.encode('utf-8')] + [option.encode('utf-8') for option in question.options]
+        blob = b''.join(LENGTH.pack(len(part)) for part in encoded) + b''.join(encoded)
+        records += RECORD.pack(
+            question_id, len(blobs), len(blob), category_numbers[question.category],
+            question.difficulty, len(question.options), question.correct_option,
+            SCORE_UNKNOWN if question.difficulty_score is None else round(question.difficulty_score * SCORE_SCALE)
+        )
+        blobs += blob
+
+    slots = [EMPTY_SLOT] * slot_count
+    for number, question_id in enumerate(ids):
+        slots[question_id] = number
+
+    # Индексы: все вопросы, по категории, по сложности и по паре
+    indexes = [((ANY_CATEGORY, 0), ids)]
+    indexes += [((category_numbers[category], 0), sorted(pool)) for category, pool in bank.by_category.items()]
+    indexes += [((ANY_CATEGORY, difficulty), sorted(pool)) for difficulty, pool in bank.by_difficulty.items()]
+    indexes += [((category_numbers[category], difficulty), sorted(pool))
+                for (category, difficulty), pool in bank.by_category_difficulty.items()]
+
+    meta = json.dumps(
+        {'categories': bank.categories, 'category_codes': category_codes, 'source': signature}, ensure_ascii=False
+    ).encode('utf-8')
+
+    meta_offset = HEADER.size
+    records_offset = meta_offset + len(meta)
+    slots_offset = records_offset + len(records)
+    index_table_offset = slots_offset + 4 * slot_count
+    arrays_offset = index_table_offset + INDEX_ENTRY.size * len(indexes)
+
+    index_table = bytearray()
+    arrays = bytearray()
+    for (category_number, difficulty), pool in indexes:
+        index_table += INDEX_ENTRY.pack(category_number, difficulty, arrays_offset + len(arrays), len(pool))
+        arrays += _id_array(pool)
+    blobs_offset = arrays_offset + len(arrays)
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, 0, len(ids), slot_count, len(indexes), meta_offset, len(meta),
+        records_offset, slots_offset, index_table_offset, blobs_offset
+    )
+    return b''.join((header, meta, bytes(records), _id_array(slots), bytes(index_table), bytes(arrays), bytes(blobs)))
+
+
+def compile_question_file(source_path: str, store_path: str):
+    """Сборка файла хранилища из JSON с атомарной заменой старого файла"""
+    # Подпись снимается до чтения: если файл изменят во время сборки, хранилище окажется устаревшим
+    signature = source_signature(source_path)
+    data = compile_question_bank(load_question_bank(source_path), signature)
+    directory = os.path.dirname(os.path.abspath(store_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.questions-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, store_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class MappedQuestionBank:
+    """
+    Набор вопросов поверх отображённого в память файла хранилища
+
+    Интерфейс совпадает с QuestionBank: индексы — это представления
+    memoryview над массивами id в файле, а Question создаётся при каждом
+    вызове get() из байтов файла.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Путь к файлу, собранному compile_question_file()
+        """
+        self.path = path
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        (magic, version, _, self._count, slot_count, index_count, meta_offset, meta_len,
+         self._records_offset, slots_offset, index_table_offset, self._blobs_offset) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path}: не файл хранилища вопросов версии {FORMAT_VERSION}")
+
+        meta = json.loads(bytes(self._view[meta_offset:meta_offset + meta_len]).decode('utf-8'))
+        self.categories: Dict[str, str] = meta['categories']
+        self._category_codes = [sys.intern(code) for code in meta['category_codes']]
+        # Подпись исходного JSON, из которого собран файл (None — собран без неё)
+        self.source_signature = meta.get('source')
+        self._slots = self._ids(slots_offset, slot_count)
+
+        self.by_category = {}
+        self.by_difficulty = {}
+        self.by_category_difficulty = {}
+        self.ids = ()
+        for number in range(index_count):
+            category_number, difficulty, offset, count = INDEX_ENTRY.unpack_from(
+                self._mmap, index_table_offset + number * INDEX_ENTRY.size
+            )
+            pool = self._ids(offset, count)
+            category = None if category_number == ANY_CATEGORY else self._category_codes[category_number]
+            if category is None and not difficulty:
+                self.ids = pool
+            elif category is None:
+                self.by_difficulty[difficulty] = pool
+            elif not difficulty:
+                self.by_category[category] = pool
+            else:
+                self.by_category_difficulty[(category, difficulty)] = pool
+
+    def _ids(self, offset: int, count: int):
+        view = self._view[offset:offset + 4 * count]
+        if sys.byteorder == 'little':
+            return view.cast('I')
+        # На big-endian платформах массив приходится копировать с перестановкой байтов
+        ids = array('I', view.tobytes())
+        ids.byteswap()
+        return ids
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, question_id: int) -> Optional[tuple]:
+        if not 0 <= question_id < len(self._slots):
+            return None
+        number = self._slots[question_id]
+        if number == EMPTY_SLOT:
+            return None
+        return RECORD.unpack_from(self._mmap, self._records_offset + number * RECORD.size)
+
+    def __contains__(self, question_id: int):
+        return self._record(question_id) is not None
+
+    def option_count(self, question_id: int) -> Optional[int]:
+        """Количество вариантов ответа без декодирования текстов"""
+        record = self._record(question_id)
+        return record[5] if record is not None else None
+
+    def difficulty(self, question_id: int) -> Optional[tuple]:
+        """Уровень и оценка сложности без декодирования текстов (см. QuestionBank.difficulty)"""
+        record = self._record(question_id)
+        if record is None:
+            return None
+        score = record[7]
+        return record[4], None if score == SCORE_UNKNOWN else score / SCORE_SCALE
+
+    def get(self, question_id: int) -> Optional[Question]:
+        """Вопрос по идентификатору (декодируется из файла) или None"""
+        record = self._record(question_id)
+        if record is None:
+            return None
+
+        _, blob_offset, _, category_number, difficulty, option_count, correct_option, score = record
+        position = self._blobs_offset + blob_offset
+        lengths = [LENGTH.unpack_from(self._mmap, position + 2 * number)[0] for number in range(option_count + 1)]
+        position += 2 * (option_count + 1)
+
+        parts = []
+        for length in lengths:
+            parts.append(str(self._view[position:position + length], 'utf-8'))
+            position += length
+
+        return Question(question_id, parts[0], tuple(parts[1:]), correct_option,
+                        self._category_codes[category_number], difficulty,
+                        None if score == SCORE_UNKNOWN else score / SCORE_SCALE)
+
+    def pool(self, category: Optional[str] = None, difficulty: Optional[int] = None):
+        """Идентификаторы вопросов с фильтром (см. QuestionBank.pool)"""
+        if category is not None and difficulty is not None:
+            pool = self.by_category_difficulty.get((category, difficulty), ())
+        elif category is not None:
+            pool = self.by_category.get(category, ())
+        elif difficulty is not None:
+            pool = self.by_difficulty.get(difficulty, ())
+        else:
+            pool = self.ids
+        return pool
+
+    def sample_ids(self, count: int, category: Optional[str] = None, difficulty: Optional[int] = None) -> list:
+        """Случайные идентификаторы вопросов без повторов (см. QuestionBank.sample_ids)"""
+        pool = self.pool(category, difficulty)
+        return random.sample(pool, min(count, len(pool)))
+
+
+def _store_signature(store_path: str) -> Optional[list]:
+    """Подпись исходного JSON из метаданных хранилища или None, если файл другой версии или без подписи"""
+    with open(store_path, 'rb') as file:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size or header[:4] != MAGIC:
+            return None
+        _, version, _, _, _, _, meta_offset, meta_len = HEADER.unpack(header)[:8]
+        if version != FORMAT_VERSION:
+            return None
+        file.seek(meta_offset)
+        try:
+            return json.loads(file.read(meta_len).decode('utf-8')).get('source')
+        except ValueError:
+            return None
+
+
+@contextmanager
+def _store_lock(store_path: str):
+    """Блокировка пересборки хранилища между процессами (без fcntl — без блокировки)"""
+    if fcntl is None:
+        yield
+        return
+    with open(store_path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def _store_is_current(source_path: str, store_path: str) -> bool:
+    return os.path.exists(store_path) and _store_signature(store_path) == source_signature(source_path)
+
+
+def open_question_store(source_path: str, store_path: str):
+    """
+    Открытие набора вопросов через mmap с пересборкой устаревшего файла
+
+    Если файл хранилища отсутствует, собран в другой версии формата или из
+    другого состояния исходного JSON (подпись не совпадает — в том числе
+    когда JSON заменили файлом с более старым временем изменения), он
+    собирается заново. Процессы, одновременно заметившие изменение, ждут
+    того, кто собирает файл, и открывают тот же файл, а не свои копии.
+    Если собрать его нельзя (например, каталог только для чтения), набор
+    загружается из JSON в память процесса.
+    """
+    try:
+        if not _store_is_current(source_path, store_path):
+            with _store_lock(store_path):
+                # Пока ждали блокировку, файл мог собрать другой процесс
+                if not _store_is_current(source_path, store_path):
+                    compile_question_file(source_path, store_path)
+    except OSError:
+        return load_question_bank(source_path)
+    return MappedQuestionBank(store_path)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Использование: python -m question_store <questions.json> <questions.qbank>")
+        sys.exit(2)
+    compile_question_file(sys.argv[1], sys.argv[2])
+    print(f"Хранилище вопросов собрано: {sys.argv[2]}")
@@ -1,749 +1,157 @@
 # quiz_data_full.py
-import random
-
-FULL_QUIZ_QUESTIONS = [
-    # Python и программирование (15 вопросов)
-    {
-        'question': 'Что такое Python?',
-        'options': ['Язык программирования', 'Тип данных', 'Музыкальный инструмент', 'Змея на английском'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой тип данных используется для хранения целых чисел в Python?',
-        'options': ['int', 'float', 'str', 'natural'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что делает функция len() в Python?',
-        'options': ['Возвращает длину объекта', 'Сортирует список', 'Преобразует в строку', 'Вычисляет логарифм'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой символ используется для комментариев в Python?',
-        'options': ['#', '//', '/*', '--'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое PEP 8?',
-        'options': ['Стиль кодирования в Python', 'Версия Python', 'Библиотека для работы с изображениями',
-                    'Ошибка интерпретатора'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Как создать пустой список в Python?',
-        'options': ['[]', '{}', '()', 'list()'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое декоратор в Python?',
-        'options': ['Функция, модифицирующая другую функцию', 'Специальный тип переменной',
-                    'Элемент дизайна интерфейса', 'Ошибка при импорте модуля'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой метод используется для добавления элемента в конец списка?',
-        'options': ['append()', 'add()', 'insert()', 'push()'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что вернет выражение "3" + "4" в Python?',
-        'options': ['"34"', '"7"', '7', 'Ошибка'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой модуль используется для работы со временем в Python?',
-        'options': ['datetime', 'time', 'calendar', 'clock'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое lambda-функция в Python?',
-        'options': ['Анонимная функция', 'Функция с несколькими параметрами', 'Рекурсивная функция',
-                    'Функция-генератор'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой оператор используется для наследования класса в Python?',
-        'options': ['class Child(Parent):', 'extends', 'inherits', '->'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое __init__ в Python?',
-        'options': ['Конструктор класса', 'Деструктор класса', 'Метод инициализации модуля', 'Специальная переменная'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой метод вызывается при использовании print() для объекта?',
-        'options': ['__str__', '__print__', '__repr__', '__display__'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что делает оператор *args в Python?',
-        'options': ['Принимает неопределенное количество позиционных аргументов', 'Умножает аргументы',
-                    'Принимает именованные аргументы', 'Распаковывает список'],
-        'correct_option': 0
-    },
-
-    # Математика (15 вопросов)
-    {
-        'question': 'Чему равно число π (пи) с точностью до двух знаков?',
-        'options': ['3.14', '3.16', '3.12', '3.18'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Сколько градусов в прямом угле?',
-        'options': ['90°', '180°', '45°', '360°'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое гипотенуза?',
-        'options': ['Сторона прямоугольного треугольника, противолежащая прямому углу',
-                    'Сторона равностороннего треугольника', 'Диаметр окружности', 'Высота пирамиды'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Сколько будет 2⁵?',
-        'options': ['32', '25', '10', '64'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое простое число?',
-        'options': ['Число, которое делится только на 1 и само на себя', 'Число без дробной части',
-                    'Число с одним делителем', 'Число, большее 10'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Чему равно √64?',
-        'options': ['8', '6', '4', '32'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Сколько сторон у гексагона?',
-        'options': ['6', '5', '7', '8'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое факториал числа 5 (5!)?',
-        'options': ['120', '25', '60', '15'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой угол описывает минутная стрелка за 15 минут?',
-        'options': ['90°', '45°', '180°', '30°'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Чему равно 15% от 200?',
-        'options': ['30', '15', '45', '60'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое теорема Пифагора?',
-        'options': ['a² + b² = c²', 'a + b = c', 'a² - b² = c²', 'a/b = c'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Сколько радиан в 180 градусах?',
-        'options': ['π', '2π', 'π/2', '1'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое производная функции?',
-        'options': ['Скорость изменения функции', 'Значение функции в точке', 'График функции', 'Область определения'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Чему равен sin(0)?',
-        'options': ['0', '1', '0.5', '-1'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое интеграл?',
-        'options': ['Площадь под кривой', 'Производная функции', 'Корень уравнения', 'Максимум функции'],
-        'correct_option': 0
-    },
-
-    # Наука (15 вопросов)
-    {
-        'question': 'Какой химический элемент обозначается символом "O"?',
-        'options': ['Кислород', 'Озон', 'Золото', 'Олово'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что изучает ботаника?',
-        'options': ['Растения', 'Животных', 'Грибы', 'Микроорганизмы'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Сколько планет в Солнечной системе?',
-        'options': ['8', '9', '10', '7'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое фотосинтез?',
-        'options': ['Процесс создания органических веществ растениями с помощью света', 'Дыхание растений',
-                    'Размножение водорослей', 'Образование почвы'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая планета ближе всего к Солнцу?',
-        'options': ['Меркурий', 'Венера', 'Земля', 'Марс'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что измеряет барометр?',
-        'options': ['Атмосферное давление', 'Температуру', 'Влажность', 'Скорость ветра'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой газ составляет основную часть земной атмосферы?',
-        'options': ['Азот', 'Кислород', 'Углекислый газ', 'Водород'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое ДНК?',
-        'options': ['Молекула, несущая наследственную информацию', 'Белок в клетке', 'Витамин группы B',
-                    'Фермент пищеварения'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая сила удерживает планеты на орбитах?',
-        'options': ['Гравитация', 'Электромагнетизм', 'Сила трения', 'Центробежная сила'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое нейтрон?',
-        'options': ['Нейтральная элементарная частица в атомном ядре', 'Положительно заряженная частица',
-                    'Отрицательно заряженная частица', 'Волна в квантовой механике'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто открыл закон всемирного тяготения?',
-        'options': ['Исаак Ньютон', 'Альберт Эйнштейн', 'Галилео Галилей', 'Николай Коперник'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое фотон?',
-        'options': ['Квант света', 'Частица темной материи', 'Электрон в возбужденном состоянии', 'Протон в ядре'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая единица измерения силы в системе СИ?',
-        'options': ['Ньютон', 'Джоуль', 'Ватт', 'Паскаль'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что изучает экология?',
-        'options': ['Взаимодействие организмов с окружающей средой', 'Строение клеток', 'Химические реакции',
-                    'Геологические процессы'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой химический элемент является основой органической химии?',
-        'options': ['Углерод', 'Водород', 'Кислород', 'Азот'],
-        'correct_option': 0
-    },
-
-    # История (15 вопросов)
-    {
-        'question': 'В каком году началась Вторая мировая война?',
-        'options': ['1939', '1941', '1914', '1945'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто был первым человеком в космосе?',
-        'options': ['Юрий Гагарин', 'Нил Армстронг', 'Валентина Терешкова', 'Алексей Леонов'],
-        'correct_option': 0
-    },
-    {
-        'question': 'В каком городе произошла битва на Курской дуге?',
-        'options': ['Курск', 'Москва', 'Сталинград', 'Ленинград'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто написал "95 тезисов", положивших начало Реформации?',
-        'options': ['Мартин Лютер', 'Иоганн Кальвин', 'Ульрих Цвингли', 'Генрих VIII'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая империя пала в 1453 году?',
-        'options': ['Византийская', 'Римская', 'Османская', 'Монгольская'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто открыл Америку в 1492 году?',
-        'options': ['Христофор Колумб', 'Америго Веспуччи', 'Фернан Магеллан', 'Васко да Гама'],
-        'correct_option': 0
-    },
-    {
-        'question': 'В каком году произошла Французская революция?',
-        'options': ['1789', '1776', '1812', '1848'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто был фараоном во время исхода евреев из Египта?',
-        'options': ['Рамзес II', 'Тутанхамон', 'Хеопс', 'Клеопатра'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Как назывался главный торговый путь между Европой и Азией в Средневековье?',
-        'options': ['Шелковый путь', 'Амбарный путь', 'Специевый путь', 'Золотой путь'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто был последним царем России?',
-        'options': ['Николай II', 'Александр III', 'Михаил Федорович', 'Павел I'],
-        'correct_option': 0
-    },
-    {
-        'question': 'В каком году была основана Москва?',
-        'options': ['1147', '1237', '1380', '1485'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто написал "Капитал"?',
-        'options': ['Карл Маркс', 'Фридрих Энгельс', 'Владимир Ленин', 'Адам Смит'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая война длилась 100 лет?',
-        'options': ['Сто летняя война', 'Тридцатилетняя война', 'Семилетняя война', 'Наполеоновские войны'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто был первым президентом США?',
-        'options': ['Джордж Вашингтон', 'Томас Джефферсон', 'Авраам Линкольн', 'Бенджамин Франклин'],
-        'correct_option': 0
-    },
-    {
-        'question': 'В каком году началась Первая мировая война?',
-        'options': ['1914', '1918', '1939', '1945'],
-        'correct_option': 0
-    },
-
-    # География (15 вопросов)
-    {
-        'question': 'Какая страна является самой большой по площади?',
-        'options': ['Россия', 'Канада', 'Китай', 'США'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая река самая длинная в мире?',
-        'options': ['Нил', 'Амазонка', 'Миссисипи', 'Янцзы'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой океан самый большой?',
-        'options': ['Тихий', 'Атлантический', 'Индийский', 'Северный Ледовитый'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Столица Австралии?',
-        'options': ['Канберра', 'Сидней', 'Мельбурн', 'Брисбен'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какое море самое соленое в мире?',
-        'options': ['Мертвое море', 'Красное море', 'Средиземное море', 'Каспийское море'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой водопад самый высокий в мире?',
-        'options': ['Анхель', 'Ниагарский', 'Виктория', 'Игуасу'],
-        'correct_option': 0
-    },
-    {
-        'question': 'В какой стране находится гора Эверест?',
-        'options': ['Непал', 'Китай', 'Индия', 'Тибет'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой континент самый жаркий?',
-        'options': ['Африка', 'Австралия', 'Южная Америка', 'Азия'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Как называется самая длинная горная система в мире?',
-        'options': ['Анды', 'Гималаи', 'Альпы', 'Кордильеры'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой город является столицей Канады?',
-        'options': ['Оттава', 'Торонто', 'Монреаль', 'Ванкувер'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какое озеро самое глубокое в мире?',
-        'options': ['Байкал', 'Танганьика', 'Виктория', 'Верхнее'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой полуостров самый большой в мире?',
-        'options': ['Аравийский', 'Индостан', 'Лабрадор', 'Скандинавский'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая страна имеет наибольшее количество островов?',
-        'options': ['Швеция', 'Греция', 'Индонезия', 'Канада'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой пролив соединяет Средиземное море и Атлантический океан?',
-        'options': ['Гибралтарский', 'Босфор', 'Дарданеллы', 'Малаккский'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая пустыня самая большая в мире?',
-        'options': ['Сахара', 'Гоби', 'Калахари', 'Атакама'],
-        'correct_option': 0
-    },
-
-    # Литература (15 вопросов)
-    {
-        'question': 'Кто написал "Преступление и наказание"?',
-        'options': ['Федор Достоевский', 'Лев Толстой', 'Александр Пушкин', 'Михаил Булгаков'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Как зовут главного героя романа "Мастер и Маргарита"?',
-        'options': ['Мастер', 'Иешуа', 'Воланд', 'Понтий Пилат'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто автор "Гарри Поттера"?',
-        'options': ['Дж. К. Роулинг', 'Дж. Р. Р. Толкин', 'Стивен Кинг', 'Джордж Мартин'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какое произведение начинается со слов "Меня зовут Ким"?',
-        'options': ['Дети капитана Гранта', 'Двадцать тысяч лье под водой', 'Таинственный остров',
-                    'Пятнадцатилетний капитан'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто написал "Войну и мир"?',
-        'options': ['Лев Толстой', 'Федор Достоевский', 'Антон Чехов', 'Иван Тургенев'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Как зовут автора "Три товарища"?',
-        'options': ['Эрих Мария Ремарк', 'Томас Манн', 'Герман Гессе', 'Бертольт Брехт'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой роман считается первым в мире?',
-        'options': ['Повесть о Гэндзи', 'Дон Кихот', 'Робинзон Крузо', 'Улисс'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто написал "1984"?',
-        'options': ['Джордж Оруэлл', 'Олдос Хаксли', 'Рэй Брэдбери', 'Курт Воннегут'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Как зовут писателя, создавшего Шерлока Холмса?',
-        'options': ['Артур Конан Дойл', 'Агата Кристи', 'Эдгар Аллан По', 'Джонатан Свифт'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какое стихотворение начинается со слов "У лукоморья дуб зеленый"?',
-        'options': ['Руслан и Людмила', 'Евгений Онегин', 'Мертвые души', 'Бородино'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто написал "Мертвые души"?',
-        'options': ['Николай Гоголь', 'Михаил Лермонтов', 'Иван Тургенев', 'Александр Островский'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой роман начинается со слов "Все счастливые семьи похожи друг на друга, каждая несчастливая семья несчастлива по-своему"?',
-        'options': ['Анна Каренина', 'Война и мир', 'Отцы и дети', 'Преступление и наказание'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто автор "Собачьего сердца"?',
-        'options': ['Михаил Булгаков', 'Максим Горький', 'Александр Солженицын', 'Владимир Набоков'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Как зовут главного героя "Преступления и наказания"?',
-        'options': ['Родион Раскольников', 'Митя Карамазов', 'Пьер Безухов', 'Евгений Онегин'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто написал "Отцы и дети"?',
-        'options': ['Иван Тургенев', 'Федор Достоевский', 'Лев Толстой', 'Александр Пушкин'],
-        'correct_option': 0
-    },
-
-    # Искусство и музыка (10 вопросов)
-    {
-        'question': 'Кто написал картину "Мона Лиза"?',
-        'options': ['Леонардо да Винчи', 'Рафаэль', 'Микеланджело', 'Ван Гог'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой музыкальный инструмент является символом джаза?',
-        'options': ['Саксофон', 'Фортепиано', 'Гитара', 'Труба'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто композитор балета "Лебединое озеро"?',
-        'options': ['Пётр Ильич Чайковский', 'Сергей Прокофьев', 'Игорь Стравинский', 'Дмитрий Шостакович'],
-        'correct_option': 0
-    },
-    {
-        'question': 'В каком городе находится музей Эрмитаж?',
-        'options': ['Санкт-Петербург', 'Москва', 'Париж', 'Лондон'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто автор скульптуры "Давид"?',
-        'options': ['Микеланджело', 'Донателло', 'Бернини', 'Роден'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какое произведение не написал Шекспир?',
-        'options': ['Дон Кихот', 'Гамлет', 'Ромео и Джульетта', 'Отелло'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто известен как "Король поп-музыки"?',
-        'options': ['Майкл Джексон', 'Элвис Пресли', 'Мадонна', 'Принс'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой стиль живописи характеризуется размытыми формами и световыми эффектами?',
-        'options': ['Импрессионизм', 'Сюрреализм', 'Кубизм', 'Абстракционизм'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто написал оперу "Евгений Онегин"?',
-        'options': ['Пётр Ильич Чайковский', 'Михаил Глинка', 'Сергей Рахманинов', 'Дмитрий Шостакович'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой танец является национальным в Испании?',
-        'options': ['Фламенко', 'Самба', 'Полька', 'Вальс'],
-        'correct_option': 0
-    },
-
-    # Спорт (10 вопросов)
-    {
-        'question': 'Какой спортсмен имеет прозвище "Король футбола"?',
-        'options': ['Пеле', 'Мароко Дина', 'Лионель Месси', 'Криштиану Роналду'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Сколько игроков в баскетбольной команде на площадке?',
-        'options': ['5', '6', '4', '7'],
-        'correct_option': 0
-    },
-    {
-        'question': 'В каком городе проходили первые современные Олимпийские игры?',
-        'options': ['Афины', 'Париж', 'Лондон', 'Рим'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая страна выиграла Чемпионат мира по футболу 2018 года?',
-        'options': ['Франция', 'Хорватия', 'Бельгия', 'Англия'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Сколько кругов в олимпийском бассейне?',
-        'options': ['8', '6', '10', '12'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто является самым титулованным теннисистом в истории по количеству титулов Большого шлема?',
-        'options': ['Новак Джокович', 'Роджер Федерер', 'Рафаэль Надаль', 'Пит Сампрас'],
-        'correct_option': 0
-    },
-    {
-        'question': 'В каком виде спорта используется термин "паралимпийский"?',
-        'options': ['Спорт для людей с инвалидностью', 'Вид спорта на льду', 'Экстремальный вид спорта',
-                    'Командный вид спорта'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая страна является родиной олимпийских игр?',
-        'options': ['Греция', 'Рим', 'Египет', 'Китай'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Сколько времени длится один период в хоккее с шайбой?',
-        'options': ['20 минут', '15 минут', '25 минут', '30 минут'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто является рекордсменом по забитым голам в истории Чемпионатов мира по футболу?',
-        'options': ['Миро Слав', 'Лионель Месси', 'Криштиану Роналду', 'Пеле'],
-        'correct_option': 0
-    },
-
-    # Технологии (10 вопросов) - новые
-    {
-        'question': 'Что означает аббревиатура "AI" в контексте технологий?',
-        'options': ['Artificial Intelligence', 'Automated Integration', 'Advanced Interface',
-                    'Algorithmic Instruction'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая компания разработала операционную систему Android?',
-        'options': ['Google', 'Apple', 'Microsoft', 'Samsung'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое блокчейн?',
-        'options': ['Технология распределённого реестра', 'Система шифрования данных', 'Облачное хранилище',
-                    'Протокол передачи данных'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой протокол используется для безопасной передачи данных в интернете?',
-        'options': ['HTTPS', 'HTTP', 'FTP', 'SMTP'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое NFT?',
-        'options': ['Невзаимозаменяемый токен', 'Сетевой фильтр передачи', 'Национальный фонд технологий',
-                    'Новое форматирование текста'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая компания создала язык программирования Swift?',
-        'options': ['Apple', 'Google', 'Microsoft', 'Facebook'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое квантовый компьютер?',
-        'options': ['Компьютер, использующий квантовые биты для вычислений', 'Сверхбыстрый суперкомпьютер',
-                    'Компьютер для научных расчётов', 'Миниатюрный компьютер'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какая технология позволяет устройствам подключаться к интернету без проводов?',
-        'options': ['Wi-Fi', 'Bluetooth', 'NFC', 'USB'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что такое кибербезопасность?',
-        'options': ['Защита компьютерных систем от кибератак', 'Антивирусная программа', 'Защита от спама',
-                    'Шифрование данных'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой формат используется для сжатия изображений без потери качества?',
-        'options': ['PNG', 'JPEG', 'GIF', 'BMP'],
-        'correct_option': 0
-    },
-
-    # Логика и головоломки (10 вопросов) - новые
-    {
-        'question': 'Что становится мокрым при высыхании?',
-        'options': ['Полотенце', 'Вода', 'Дождь', 'Солнце'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что можно сломать, даже не прикасаясь?',
-        'options': ['Обещание', 'Стекло', 'Дерево', 'Камень'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что имеет голову и хвост, но нет туловища?',
-        'options': ['Монета', 'Змея', 'Булавка', 'Рыба'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что идет вверх и вниз, но остается на месте?',
-        'options': ['Лестница', 'Река', 'Ветер', 'Облако'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что можно увидеть с закрытыми глазами?',
-        'options': ['Сон', 'Тьму', 'Свет', 'Цвета'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что тяжелее: килограмм ваты или килограмм железа?',
-        'options': ['Одинаково', 'Железо', 'Вата', 'Зависит от формы'],
-        'correct_option': 0
-    },
-    {
-        'question': 'У отца Мэри есть пять дочерей: Чача, Чече, Чичи, Чочо. Как зовут пятую дочь?',
-        'options': ['Мэри', 'Чучу', 'Чача', 'Чичи'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что можно поделить, только умножив?',
-        'options': ['Число', 'Время', 'Деньги', 'Работу'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что имеет множество ключей, но не может открыть ни одного замка?',
-        'options': ['Клавиатура', 'Музыкальный инструмент', 'Ключница', 'Мастер'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Что можно слышать, но не видеть и не трогать?',
-        'options': ['Голос', 'Музыку', 'Шум', 'Эхо'],
-        'correct_option': 0
-    },
-
-    # Искусство и культура (10 вопросов) - новые
-    {
-        'question': 'Кто нарисовал картину "Звёздная ночь"?',
-        'options': ['Винсент Ван Гог', 'Пабло Пикассо', 'Клод Моне', 'Сальвадор Дали'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой город считается родиной оперы?',
-        'options': ['Флоренция', 'Париж', 'Вена', 'Милан'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто автор романа "Война и мир"?',
-        'options': ['Лев Толстой', 'Федор Достоевский', 'Иван Тургенев', 'Александр Пушкин'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой стиль архитектуры характеризуется стрельчатыми арками?',
-        'options': ['Готика', 'Барокко', 'Ренессанс', 'Классицизм'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто является создателем театра "Современник"?',
-        'options': ['Олег Ефремов', 'Константин Станиславский', 'Всеволод Мейерхольд', 'Юрий Любимов'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой музыкальный инструмент является национальным в России?',
-        'options': ['Балалайка', 'Гусли', 'Домбра', 'Аккордеон'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто написал симфонию №9 "От раскулачивания до победы"? (шуточный вопрос)',
-        'options': ['Это шуточный вопрос, такой симфонии нет', 'Дмитрий Шостакович', 'Иоганн Себастьян Бах',
-                    'Людвиг ван Бетховен'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой танец стал символом бразильского карнавала?',
-        'options': ['Самба', 'Румба', 'Танго', 'Фламенко'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Кто является автором пьесы "Вишневый сад"?',
-        'options': ['Антон Чехов', 'Максим Горький', 'Лев Толстой', 'Александр Островский'],
-        'correct_option': 0
-    },
-    {
-        'question': 'Какой цвет получается при смешении синего и жёлтого?',
-        'options': ['Зелёный', 'Оранжевый', 'Фиолетовый', 'Коричневый'],
-        'correct_option': 0
-    }
-]
-
-
-def get_random_questions(count: int = 10) -> list:
-    """Получить случайные вопросы из полного набора"""
-    return random.sample(FULL_QUIZ_QUESTIONS, count)
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from metrics import register_gauge
+from question_picker import build_pickers, register_pickers
+from question_store import open_question_store, source_signature
+
+logger = logging.getLogger(__name__)
+
+# Исходный файл с вопросами (категории, сложность, варианты ответов)
+QUESTIONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'questions.json')
+
+# Собранное из него хранилище, которое все процессы бота открывают через mmap
+QUESTION_STORE_PATH = os.environ.get(
+    'QUESTION_STORE_PATH', os.path.join(os.path.dirname(QUESTIONS_PATH), 'questions.qbank')
+)
+
+
+def _bank_signature(bank, signature: list) -> list:
+    """Подпись JSON, из которого собрано хранилище набора (у загруженного в память — signature)"""
+    return getattr(bank, 'source_signature', None) or signature
+
+
+# Текущий набор вопросов и его версия (растёт при каждой перезагрузке).
+# Набор открывается при запуске (open_question_bank()) и заменяется целиком
+# одним присваиванием: начатые квизы держат ссылку на набор, с которым
+# начинались, и продолжают работать с ним
+QUESTION_BANK = None
+QUESTION_BANK_VERSION = 0
+_loaded_signature: Optional[list] = None
+
+# Строить ли корзины сложности адаптивного квиза при загрузке набора (enable_difficulty_pickers())
+_build_pickers = False
+
+_watcher_task: Optional[asyncio.Task] = None
+
+register_gauge("icosa_question_bank_version", "Версия загруженного набора вопросов", lambda: QUESTION_BANK_VERSION)
+register_gauge("icosa_question_bank_size", "Вопросов в загруженном наборе",
+               lambda: len(QUESTION_BANK) if QUESTION_BANK is not None else 0)
+
+
+def get_question_bank():
+    """Текущий набор вопросов"""
+    return QUESTION_BANK
+
+
+def enable_difficulty_pickers():
+    """
+    Построение корзин сложности для текущего набора и всех следующих
+
+    Вызывается при запуске, до обработки обновлений: при перезагрузке
+    корзины строятся в том же потоке, что и новый набор.
+    """
+    global _build_pickers
+    if not _build_pickers:
+        _build_pickers = True
+        if QUESTION_BANK is not None:
+            register_pickers(QUESTION_BANK, build_pickers(QUESTION_BANK))
+
+
+def _load_question_bank() -> tuple:
+    bank = open_question_store(QUESTIONS_PATH, QUESTION_STORE_PATH)
+    return bank, build_pickers(bank) if _build_pickers else None
+
+
+def _publish_question_bank(bank, pickers: Optional[dict], signature: list):
+    global QUESTION_BANK, QUESTION_BANK_VERSION, _loaded_signature
+    # Корзины публикуются до набора: первый же квиз на новом наборе их найдёт
+    if pickers is not None:
+        register_pickers(bank, pickers)
+    QUESTION_BANK = bank
+    QUESTION_BANK_VERSION += 1
+    # Если файл успели изменить ещё раз, подпись собранного набора отличается — он перезагрузится на следующей проверке
+    _loaded_signature = _bank_signature(bank, signature)
+
+
+async def open_question_bank():
+    """
+    Открытие набора вопросов при запуске бота
+
+    Устаревшее хранилище собирается заново в отдельном потоке. Ошибка в
+    файле вопросов не даёт боту запуститься.
+    """
+    signature = source_signature(QUESTIONS_PATH)
+    bank, pickers = await asyncio.to_thread(_load_question_bank)
+    _publish_question_bank(bank, pickers, signature)
+    logger.info(f"Набор вопросов загружен: вопросов {len(bank)}")
+
+
+async def reload_question_bank() -> bool:
+    """
+    Перезагрузка набора вопросов, если исходный файл изменился
+
+    Новый набор собирается в отдельном потоке и подменяет текущий только
+    после успешной загрузки; при ошибке в файле остаётся прежний набор.
+    Обработчики многопроцессного режима проверяют файл каждый сам, но
+    хранилище собирает только один из них (см. open_question_store()), а
+    остальные отображают тот же файл.
+
+    Returns:
+        True, если набор был заменён
+    """
+    global _loaded_signature
+    try:
+        signature = source_signature(QUESTIONS_PATH)
+    except OSError as exc_stat:
+        logger.error(f"Файл вопросов недоступен: {exc_stat}")
+        return False
+    if signature == _loaded_signature:
+        return False
+
+    try:
+        bank, pickers = await asyncio.to_thread(_load_question_bank)
+    except (OSError, ValueError, KeyError, TypeError) as exc_load:
+        # Файл могли сохранить не полностью или с ошибкой — повторим после следующего изменения
+        _loaded_signature = signature
+        logger.error(f"Не удалось перезагрузить вопросы, используется версия {QUESTION_BANK_VERSION}: {exc_load}")
+        return False
+
+    _publish_question_bank(bank, pickers, signature)
+    logger.info(f"Набор вопросов перезагружен: версия {QUESTION_BANK_VERSION}, вопросов {len(bank)}")
+    return True
+
+
+async def _watch(interval: float):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reload_question_bank()
+        except Exception as exc_reload:
+            logger.error(f"Ошибка перезагрузки вопросов: {exc_reload}", exc_info=True)
+
+
+def start_question_watcher(interval: float = 5.0):
+    """Запуск фоновой проверки изменений файла вопросов раз в interval секунд"""
+    global _watcher_task
+    if _watcher_task is None:
+        _watcher_task = asyncio.create_task(_watch(interval))
+
+
+async def stop_question_watcher():
+    """Остановка фоновой проверки изменений файла вопросов"""
+    global _watcher_task
+    if _watcher_task is None:
+        return
+
+    task = _watcher_task
+    _watcher_task = None
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
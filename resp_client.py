@@ -0,0 +1,180 @@
+# resp_client.py
+"""
+Минимальный асинхронный клиент протокола RESP (Redis, Valkey, KeyDB и
+совместимые серверы): пул соединений, конвейерная отправка команд и
+транзакции WATCH/MULTI/EXEC на выделенном соединении.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
+from urllib.parse import unquote, urlparse
+
+
+class RespError(Exception):
+    """Ошибка, которую вернул сервер (ответ вида -ERR ...)"""
+
+
+def encode_command(*args) -> bytes:
+    """Кодирование команды массивом bulk-строк"""
+    parts = [b'*%d\r\n' % len(args)]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        elif isinstance(arg, str):
+            data = arg.encode()
+        else:
+            data = str(arg).encode()
+        parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+    return b''.join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    """
+    Чтение одного ответа сервера
+
+    Returns:
+        bytes, int, None, list или RespError (ошибки внутри массивов не прерывают разбор)
+    """
+    line = await reader.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError("Соединение с сервером закрыто")
+    prefix, body = line[:1], line[1:-2]
+
+    if prefix == b'+':
+        return body
+    if prefix == b'-':
+        return RespError(body.decode(errors='replace'))
+    if prefix == b':':
+        return int(body)
+    if prefix == b'$':
+        size = int(body)
+        if size < 0:
+            return None
+        data = await reader.readexactly(size + 2)
+        return data[:-2]
+    if prefix == b'*':
+        count = int(body)
+        if count < 0:
+            return None
+        return [await read_reply(reader) for _ in range(count)]
+    raise ConnectionError(f"Неизвестный тип ответа: {line[:32]!r}")
+
+
+class RespConnection:
+    """Одно соединение с сервером; команды отправляются пачкой, ответы читаются по порядку"""
+
+    def __init__(self, host: str, port: int, db: int = 0, password: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        setup = []
+        if self.password:
+            setup.append(('AUTH', self.password))
+        if self.db:
+            setup.append(('SELECT', self.db))
+        if setup:
+            await self.pipeline(*setup)
+
+    async def pipeline(self, *commands) -> list:
+        """
+        Отправка нескольких команд одной записью и чтение всех ответов
+
+        Args:
+            commands: Кортежи аргументов команд
+
+        Returns:
+            Ответы в порядке команд
+
+        Raises:
+            RespError: Если сервер вернул ошибку на одну из команд
+        """
+        if self._writer is None:
+            await self._connect()
+        try:
+            self._writer.write(b''.join(encode_command(*command) for command in commands))
+            await self._writer.drain()
+            replies = [await read_reply(self._reader) for _ in commands]
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Ответы на отправленные команды потеряны — соединение больше не годится
+            self.close()
+            raise
+
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    async def execute(self, *args):
+        """Выполнение одной команды"""
+        (reply,) = await self.pipeline(args)
+        return reply
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+
+
+class RespClient:
+    """
+    Пул соединений с RESP-сервером
+
+    Каждая операция получает соединение из пула целиком, поэтому транзакции
+    WATCH/MULTI/EXEC не смешиваются с командами других задач.
+    """
+
+    def __init__(self, url: str = "redis://127.0.0.1:6379/0", size: int = 8):
+        """
+        Args:
+            url: Адрес сервера redis://[:пароль@]хост[:порт][/номер базы]
+            size: Количество соединений
+        """
+        parsed = urlparse(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f"Неподдерживаемая схема адреса: {url}")
+        db = int(parsed.path.lstrip('/') or 0)
+        password = unquote(parsed.password) if parsed.password else None
+
+        self._connections = [
+            RespConnection(parsed.hostname or '127.0.0.1', parsed.port or 6379, db, password) for _ in range(size)
+        ]
+        self._pool: asyncio.Queue = asyncio.Queue()
+        for connection in self._connections:
+            self._pool.put_nowait(connection)
+
+    @asynccontextmanager
+    async def connection(self):
+        """Получение соединения из пула"""
+        connection = await self._pool.get()
+        try:
+            yield connection
+        except BaseException:
+            # На соединении мог остаться WATCH (в том числе после ошибки команды
+            # между WATCH и EXEC) или открытая транзакция — следующая задача
+            # начнёт с нового соединения
+            connection.close()
+            raise
+        finally:
+            self._pool.put_nowait(connection)
+
+    async def execute(self, *args):
+        """Выполнение одной команды на свободном соединении"""
+        async with self.connection() as connection:
+            return await connection.execute(*args)
+
+    async def pipeline(self, *commands) -> list:
+        """Выполнение нескольких команд одной пачкой на свободном соединении"""
+        async with self.connection() as connection:
+            return await connection.pipeline(*commands)
+
+    def close(self):
+        """Закрытие всех соединений"""
+        for connection in self._connections:
+            connection.close()
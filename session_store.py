@@ -0,0 +1,229 @@
+# session_store.py
+import struct
+import sys
+import time
+from collections import OrderedDict
+from typing import Optional
+
+# Упакованный вопрос сессии: (question_id << PERMUTATION_BITS) | номер перестановки
+PERMUTATION_BITS = 16
+PACKED_QUESTION = struct.Struct('<Q')
+# Номер сессии перед вопросами; у сессий, упакованных без него, длина кратна 8
+PACKED_NONCE = struct.Struct('<I')
+# После номера у адаптивной сессии — запланированное число вопросов (длина даёт 6 по модулю 8)
+PACKED_PLAN = struct.Struct('<H')
+# Флаг в PACKED_PLAN: квиз по одной теме — теме первого вопроса
+PLAN_CATEGORY_FLAG = 0x8000
+
+
+def rank_permutation(order) -> int:
+    """Номер перестановки в лексикографическом порядке (код Лемера)"""
+    items = list(range(len(order)))
+    rank = 0
+    for position, value in enumerate(order):
+        digit = items.index(value)
+        items.pop(digit)
+        rank = rank * (len(order) - position) + digit
+    return rank
+
+
+def unrank_permutation(rank: int, size: int) -> tuple:
+    """Восстановление перестановки из size элементов по её номеру"""
+    digits = []
+    for radix in range(1, size + 1):
+        digits.append(rank % radix)
+        rank //= radix
+    items = list(range(size))
+    return tuple(items.pop(digit) for digit in reversed(digits))
+
+
+class QuizSession:
+    """
+    Компактная запись активного квиза одного пользователя
+
+    Сессия хранит только идентификаторы вопросов и порядок вариантов, а сам
+    вопрос берётся из набора при показе или проверке ответа.
+    """
+
+    __slots__ = ('bank', 'question_ids', 'orders', 'nonce', 'length', 'category', 'last_access', 'shown_at')
+
+    def __init__(self, bank, question_ids: list, orders: list, nonce: int = 0, length: Optional[int] = None,
+                 category: Optional[str] = None):
+        """
+        Args:
+            bank: Набор вопросов (QuestionBank или MappedQuestionBank)
+            question_ids: Идентификаторы выбранных вопросов
+            orders: Для каждого вопроса — кортеж исходных индексов вариантов
+                в порядке их показа на кнопках
+            nonce: Номер сессии, который несут кнопки её вопросов
+            length: Сколько всего будет вопросов у адаптивной сессии, которая
+                добирает их по ходу квиза (None — все вопросы уже выбраны)
+            category: Тема, из которой добираются вопросы (None — все темы)
+        """
+        self.bank = bank
+        self.question_ids = tuple(question_ids)
+        self.orders = tuple(orders)
+        self.nonce = nonce
+        self.length = length
+        self.category = category
+        self.last_access = time.monotonic()
+        # Когда показан текущий вопрос (time.monotonic()); не упаковывается,
+        # поэтому у восстановленной сессии неизвестно до показа следующего
+        self.shown_at: Optional[float] = None
+
+    def __len__(self):
+        return self.length if self.length is not None else len(self.question_ids)
+
+    def set_question(self, index: int, question_id: int, order: tuple):
+        """Вопрос с номером index адаптивной сессии: добавляется в конец или заменяет выбранные с этого номера"""
+        self.question_ids = self.question_ids[:index] + (question_id,)
+        self.orders = self.orders[:index] + (order,)
+
+    def question(self, index: int):
+        """Вопрос сессии по его номеру в квизе"""
+        return self.bank.get(self.question_ids[index])
+
+    def correct_position(self, index: int) -> int:
+        """Позиция правильного ответа среди перемешанных вариантов"""
+        return self.orders[index].index(self.question(index).correct_option)
+
+    def pack(self) -> bytes:
+        """Упаковка сессии для хранения в базе: номер сессии, план адаптивной сессии и по 8 байт на вопрос"""
+        header = PACKED_NONCE.pack(self.nonce)
+        if self.length is not None:
+            header += PACKED_PLAN.pack(self.length | (PLAN_CATEGORY_FLAG if self.category is not None else 0))
+        return header + b''.join(
+            PACKED_QUESTION.pack((question_id << PERMUTATION_BITS) | rank_permutation(order))
+            for question_id, order in zip(self.question_ids, self.orders)
+        )
+
+    @classmethod
+    def unpack(cls, data: bytes, bank) -> Optional['QuizSession']:
+        """
+        Восстановление сессии из упакованного вида
+
+        Args:
+            data: Результат pack()
+            bank: Набор вопросов, из которого были выбраны вопросы
+
+        Returns:
+            Сессия или None, если данные повреждены или вопросы больше не существуют
+        """
+        if not data:
+            return None
+        nonce = 0
+        plan = None
+        if len(data) % PACKED_QUESTION.size == PACKED_NONCE.size + PACKED_PLAN.size:
+            (nonce,) = PACKED_NONCE.unpack_from(data)
+            (plan,) = PACKED_PLAN.unpack_from(data, PACKED_NONCE.size)
+            data = data[PACKED_NONCE.size + PACKED_PLAN.size:]
+        elif len(data) % PACKED_QUESTION.size == PACKED_NONCE.size:
+            (nonce,) = PACKED_NONCE.unpack_from(data)
+            data = data[PACKED_NONCE.size:]
+        if not data or len(data) % PACKED_QUESTION.size:
+            return None
+
+        question_ids, orders = [], []
+        for (packed,) in PACKED_QUESTION.iter_unpack(data):
+            question_id = packed >> PERMUTATION_BITS
+            size = bank.option_count(question_id)
+            if size is None:
+                return None
+
+            order = unrank_permutation(packed & ((1 << PERMUTATION_BITS) - 1), size)
+            question_ids.append(question_id)
+            orders.append(order)
+
+        if plan is None:
+            return cls(bank, question_ids, orders, nonce)
+        category = bank.get(question_ids[0]).category if plan & PLAN_CATEGORY_FLAG else None
+        return cls(bank, question_ids, orders, nonce, plan & ~PLAN_CATEGORY_FLAG, category)
+
+
+class SessionStore:
+    """
+    Ограниченное хранилище активных квизов в памяти
+
+    Сессии хранятся в порядке последнего обращения: при превышении capacity
+    вытесняется давно не использованная, а сессии без обращений дольше ttl
+    секунд удаляются как брошенные.
+    """
+
+    def __init__(self, capacity: int = 100_000, ttl: float = 6 * 60 * 60):
+        """
+        Args:
+            capacity: Максимальное количество сессий
+            ttl: Время простоя в секундах, после которого сессия считается брошенной
+        """
+        self.capacity = capacity
+        self.ttl = ttl
+        self._sessions: OrderedDict = OrderedDict()
+        self.evicted_by_capacity = 0
+        self.evicted_by_ttl = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, user_id: int):
+        return user_id in self._sessions
+
+    def get(self, user_id: int) -> Optional[QuizSession]:
+        """Получение сессии пользователя с обновлением времени обращения"""
+        now = time.monotonic()
+        self._evict_expired(now)
+
+        session = self._sessions.get(user_id)
+        if session is not None:
+            session.last_access = now
+            self._sessions.move_to_end(user_id)
+        return session
+
+    def put(self, user_id: int, session: QuizSession):
+        """Сохранение сессии пользователя (заменяет предыдущую)"""
+        now = time.monotonic()
+        session.last_access = now
+        self._sessions[user_id] = session
+        self._sessions.move_to_end(user_id)
+
+        self._evict_expired(now)
+        while len(self._sessions) > self.capacity:
+            self._sessions.popitem(last=False)
+            self.evicted_by_capacity += 1
+
+    def pop(self, user_id: int) -> Optional[QuizSession]:
+        """Удаление сессии пользователя"""
+        return self._sessions.pop(user_id, None)
+
+    def _evict_expired(self, now: float):
+        # Самые старые обращения — в начале, поэтому проверяем только голову
+        deadline = now - self.ttl
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session.last_access > deadline:
+                break
+            del self._sessions[user_id]
+            self.evicted_by_ttl += 1
+
+    def memory_usage(self) -> int:
+        """
+        Приблизительный объём памяти сессий в байтах
+
+        Учитываются словарь, записи и их кортежи; набор вопросов общий
+        для всех сессий и не считается.
+        """
+        total = sys.getsizeof(self._sessions)
+        for session in self._sessions.values():
+            total += sys.getsizeof(session) + sys.getsizeof(session.question_ids)
+            total += sys.getsizeof(session.orders)
+            total += sum(sys.getsizeof(order) for order in session.orders)
+        return total
+
+    def stats(self) -> dict:
+        """Сводка по хранилищу: размер, память и количество вытеснений"""
+        return {
+            'sessions': len(self._sessions),
+            'capacity': self.capacity,
+            'memory_bytes': self.memory_usage(),
+            'evicted_by_capacity': self.evicted_by_capacity,
+            'evicted_by_ttl': self.evicted_by_ttl,
+        }
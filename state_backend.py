@@ -0,0 +1,307 @@
+# state_backend.py
+"""
+Хранилища горячего состояния активных квизов: упакованная сессия, номер
+текущего вопроса и число правильных ответов. Они меняются на каждом ответе,
+поэтому вынесены из SQLite, где остаются итоги, статистика и колоды вопросов.
+
+- SQLiteStateBackend — таблица quiz_state (по умолчанию, переживает перезапуск);
+- MemoryStateBackend — словарь в памяти процесса (без обращений к диску);
+- RespStateBackend — сервер с протоколом RESP (Redis и совместимые), общий для
+  нескольких процессов и машин.
+"""
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import database
+from metrics import timed_query
+from resp_client import RespClient
+
+logger = logging.getLogger(__name__)
+
+# Попыток записать ответ, если состояние менялось между чтением и записью
+MAX_CAS_ATTEMPTS = 5
+
+# Выбор сессии по новому состоянию (question_index, correct_answers): упакованная сессия или None
+NextSession = Optional[Callable[[int, int], Optional[bytes]]]
+
+
+class AnswerConflictError(Exception):
+    """Ответ не записан: состояние квиза менялось при каждой из MAX_CAS_ATTEMPTS попыток"""
+
+
+class StateBackend:
+    """Интерфейс хранилища состояния активных квизов"""
+
+    async def start(self):
+        """Подготовка хранилища к работе"""
+
+    async def close(self):
+        """Освобождение ресурсов хранилища"""
+
+    async def reset_session(self, user_id: int, session_data: bytes):
+        """
+        Начало нового квиза: сохранение сессии и обнуление прогресса
+
+        Args:
+            user_id: ID пользователя
+            session_data: Упакованная сессия (QuizSession.pack())
+        """
+        raise NotImplementedError
+
+    async def get_session_data(self, user_id: int) -> Optional[bytes]:
+        """Упакованная сессия квиза пользователя или None"""
+        raise NotImplementedError
+
+    async def get_progress(self, user_id: int) -> tuple:
+        """Номер текущего вопроса и число правильных ответов ((0, 0), если квиза нет)"""
+        raise NotImplementedError
+
+    async def record_answer(self, user_id: int, expected_index: int, is_correct: bool,
+                            next_session: NextSession = None) -> Optional[tuple]:
+        """
+        Атомарная запись ответа: переход к следующему вопросу, только если
+        текущий вопрос совпадает с ожидаемым
+
+        Args:
+            next_session: Вызывается с новым состоянием перед записью (при повторе
+                записи — снова); возвращённая упакованная сессия сохраняется вместе
+                с ним, так адаптивный квиз добавляет следующий вопрос
+
+        Returns:
+            Новое состояние (question_index, correct_answers) или None,
+            если вопрос уже неактуален
+
+        Raises:
+            AnswerConflictError: Ответ не удалось записать из-за одновременных
+                изменений состояния — его можно отправить ещё раз
+        """
+        raise NotImplementedError
+
+    async def finish_session(self, user_id: int):
+        """Квиз завершён, результат сохранён в базе"""
+
+
+class SQLiteStateBackend(StateBackend):
+    """Состояние в таблице quiz_state (с буфером отложенной записи, если он включён)"""
+
+    async def reset_session(self, user_id: int, session_data: bytes):
+        await database.reset_quiz_session(user_id, session_data)
+
+    async def get_session_data(self, user_id: int) -> Optional[bytes]:
+        return await database.get_session_data(user_id)
+
+    async def get_progress(self, user_id: int) -> tuple:
+        return await database.get_quiz_session(user_id)
+
+    async def record_answer(self, user_id: int, expected_index: int, is_correct: bool,
+                            next_session: NextSession = None) -> Optional[tuple]:
+        return await database.record_answer(user_id, expected_index, is_correct, next_session)
+
+
+class MemoryStateBackend(StateBackend):
+    """
+    Состояние в памяти процесса
+
+    Между чтением и изменением записи нет await, поэтому проверка и запись
+    ответа атомарны без блокировок. Состояние теряется при перезапуске, а
+    при нескольких процессах каждый пользователь должен обслуживаться одним
+    из них (см. workers.py).
+    """
+
+    def __init__(self, ttl: float = 6 * 60 * 60, capacity: int = 100_000):
+        """
+        Args:
+            ttl: Время простоя в секундах, после которого квиз считается брошенным
+            capacity: Максимальное количество квизов (при превышении вытесняется
+                давно не использованный, как в SessionStore)
+        """
+        self.ttl = ttl
+        self.capacity = capacity
+        # user_id -> [session_data, question_index, correct_answers, last_access]
+        self._states: OrderedDict = OrderedDict()
+
+    def __len__(self):
+        return len(self._states)
+
+    def _get(self, user_id: int) -> Optional[list]:
+        now = time.monotonic()
+        # Самые старые обращения — в начале, поэтому проверяем только голову
+        deadline = now - self.ttl
+        while self._states:
+            oldest_id, oldest = next(iter(self._states.items()))
+            if oldest[3] > deadline:
+                break
+            del self._states[oldest_id]
+
+        state = self._states.get(user_id)
+        if state is not None:
+            state[3] = now
+            self._states.move_to_end(user_id)
+        return state
+
+    async def reset_session(self, user_id: int, session_data: bytes):
+        self._states[user_id] = [session_data, 0, 0, time.monotonic()]
+        self._states.move_to_end(user_id)
+        while len(self._states) > self.capacity:
+            self._states.popitem(last=False)
+
+    async def get_session_data(self, user_id: int) -> Optional[bytes]:
+        state = self._get(user_id)
+        return state[0] if state is not None else None
+
+    async def get_progress(self, user_id: int) -> tuple:
+        state = self._get(user_id)
+        return (state[1], state[2]) if state is not None else (0, 0)
+
+    async def record_answer(self, user_id: int, expected_index: int, is_correct: bool,
+                            next_session: NextSession = None) -> Optional[tuple]:
+        state = self._get(user_id)
+        if state is None or state[1] != expected_index:
+            return None
+        state[1] += 1
+        state[2] += int(is_correct)
+        session_data = next_session(state[1], state[2]) if next_session is not None else None
+        if session_data is not None:
+            state[0] = session_data
+        return state[1], state[2]
+
+    async def finish_session(self, user_id: int):
+        self._states.pop(user_id, None)
+
+
+class RespStateBackend(StateBackend):
+    """
+    Состояние в хеше {prefix}{user_id} на RESP-сервере: поля data, index и correct
+
+    Запись ответа — оптимистичная транзакция WATCH/MULTI/EXEC: если состояние
+    изменил другой процесс, EXEC не выполняется, и попытка повторяется.
+    """
+
+    def __init__(self, url: str, prefix: str = "icosa:quiz:", ttl: float = 6 * 60 * 60, pool_size: int = 8):
+        """
+        Args:
+            url: Адрес сервера redis://[:пароль@]хост[:порт][/номер базы]
+            prefix: Префикс ключей
+            ttl: Время жизни квиза без ответов в секундах
+            pool_size: Количество соединений
+        """
+        self.client = RespClient(url, pool_size)
+        self.prefix = prefix
+        self.ttl = int(ttl)
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}{user_id}"
+
+    async def start(self):
+        # Проверяем адрес сервера при запуске, а не на первом ответе пользователя
+        await self.client.execute('PING')
+
+    async def close(self):
+        self.client.close()
+
+    @timed_query
+    async def reset_session(self, user_id: int, session_data: bytes):
+        key = self._key(user_id)
+        await self.client.pipeline(
+            ('MULTI',),
+            ('DEL', key),
+            ('HSET', key, 'data', session_data, 'index', 0, 'correct', 0),
+            ('EXPIRE', key, self.ttl),
+            ('EXEC',)
+        )
+
+    @timed_query
+    async def get_session_data(self, user_id: int) -> Optional[bytes]:
+        return await self.client.execute('HGET', self._key(user_id), 'data')
+
+    @timed_query
+    async def get_progress(self, user_id: int) -> tuple:
+        index, correct = await self.client.execute('HMGET', self._key(user_id), 'index', 'correct')
+        return (int(index), int(correct)) if index is not None else (0, 0)
+
+    @timed_query
+    async def record_answer(self, user_id: int, expected_index: int, is_correct: bool,
+                            next_session: NextSession = None) -> Optional[tuple]:
+        key = self._key(user_id)
+        async with self.client.connection() as connection:
+            for _ in range(MAX_CAS_ATTEMPTS):
+                _, (index, correct) = await connection.pipeline(
+                    ('WATCH', key),
+                    ('HMGET', key, 'index', 'correct')
+                )
+                if index is None or int(index) != expected_index:
+                    await connection.execute('UNWATCH')
+                    return None
+
+                new_state = (expected_index + 1, int(correct) + int(is_correct))
+                fields = ['index', new_state[0], 'correct', new_state[1]]
+                session_data = next_session(*new_state) if next_session is not None else None
+                if session_data is not None:
+                    fields += ['data', session_data]
+                *_, result = await connection.pipeline(
+                    ('MULTI',),
+                    ('HSET', key, *fields),
+                    ('EXPIRE', key, self.ttl),
+                    ('EXEC',)
+                )
+                # EXEC возвращает nil, если ключ изменился после WATCH
+                if result is not None:
+                    return new_state
+        logger.warning(f"Ответ пользователя {user_id} не записан: состояние менялось при каждой из "
+                       f"{MAX_CAS_ATTEMPTS} попыток")
+        raise AnswerConflictError(f"Состояние квиза пользователя {user_id} менялось при записи ответа")
+
+    @timed_query
+    async def finish_session(self, user_id: int):
+        await self.client.execute('DEL', self._key(user_id))
+
+
+# Текущее хранилище (задаётся при запуске через set_state_backend())
+_backend: StateBackend = SQLiteStateBackend()
+
+
+def get_state_backend() -> StateBackend:
+    """Текущее хранилище состояния активных квизов"""
+    return _backend
+
+
+def set_state_backend(backend: StateBackend):
+    """Установка хранилища состояния активных квизов"""
+    global _backend
+    _backend = backend
+
+
+def create_state_backend(kind: str, url: Optional[str] = None, ttl: float = 6 * 60 * 60) -> StateBackend:
+    """
+    Создание хранилища по названию
+
+    Args:
+        kind: sqlite, memory или resp
+        url: Адрес RESP-сервера (для resp)
+        ttl: Время жизни брошенного квиза в секундах (для memory и resp)
+    """
+    if kind == "sqlite":
+        return SQLiteStateBackend()
+    if kind == "memory":
+        return MemoryStateBackend(ttl)
+    if kind == "resp":
+        if not url:
+            raise ValueError("Для хранилища resp необходимо задать адрес сервера")
+        return RespStateBackend(url, ttl=ttl)
+    raise ValueError(f"Неизвестное хранилище состояния квизов: {kind}. Допустимо: sqlite, memory, resp")
+
+
+async def open_state_backend(kind: str, url: Optional[str] = None, ttl: float = 6 * 60 * 60):
+    """Создание, запуск и установка хранилища (аргументы как у create_state_backend())"""
+    backend = create_state_backend(kind, url, ttl)
+    await backend.start()
+    set_state_backend(backend)
+
+
+async def close_state_backend():
+    """Закрытие текущего хранилища и возврат к SQLite"""
+    backend = get_state_backend()
+    set_state_backend(SQLiteStateBackend())
+    await backend.close()
@@ -0,0 +1,103 @@
+# user_locks.py
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+
+class _KeyedEntry:
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Сколько обновлений держат или ждут эту блокировку
+        self.users = 0
+
+
+class KeyedLock:
+    """
+    Набор блокировок по ключу с подсчётом ссылок
+
+    Запись о ключе существует, только пока его блокировку кто-то держит или
+    ждёт, поэтому память не растёт с числом пользователей, а простаивающие
+    ключи удаляются сразу после последнего освобождения.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Any, _KeyedEntry] = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def pending(self, key) -> int:
+        """Количество обновлений, держащих или ожидающих блокировку ключа"""
+        entry = self._entries.get(key)
+        return entry.users if entry is not None else 0
+
+    async def acquire(self, key):
+        """Захват блокировки ключа (в порядке поступления)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _KeyedEntry()
+        entry.users += 1
+        try:
+            await entry.lock.acquire()
+        except BaseException:
+            self._release_entry(key, entry)
+            raise
+
+    def release(self, key):
+        """Освобождение блокировки ключа"""
+        entry = self._entries[key]
+        entry.lock.release()
+        self._release_entry(key, entry)
+
+    def _release_entry(self, key, entry: _KeyedEntry):
+        entry.users -= 1
+        if not entry.users:
+            del self._entries[key]
+
+
+class UserLockMiddleware(BaseMiddleware):
+    """
+    Последовательная обработка обновлений одного пользователя
+
+    Регистрируется как outer middleware на dp.update: обновления разных
+    пользователей обрабатываются параллельно, а обновления одного — по одному
+    в порядке поступления. Это исключает гонки при двойном нажатии кнопки.
+    Если у пользователя уже max_pending необработанных обновлений, новые
+    отбрасываются, чтобы поток нажатий не копил задачи в памяти.
+    """
+
+    def __init__(self, max_pending: int = 8):
+        """
+        Args:
+            max_pending: Максимум обновлений одного пользователя в обработке и ожидании
+        """
+        self.max_pending = max_pending
+        self.locks = KeyedLock()
+        self.dropped = 0
+
+    async def __call__(
+            self,
+            handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+            event: Any,
+            data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        if self.locks.pending(user.id) >= self.max_pending:
+            self.dropped += 1
+            logger.warning(f"Пропущено обновление пользователя {user.id}: слишком много необработанных")
+            return None
+
+        await self.locks.acquire(user.id)
+        try:
+            return await handler(event, data)
+        finally:
+            self.locks.release(user.id)
@@ -0,0 +1,90 @@
+# webhook.py
+import asyncio
+import logging
+import secrets
+from typing import Awaitable, Callable, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Заголовок, в котором Telegram передаёт secret_token, заданный в setWebhook
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Приём обновлений Telegram по webhook на локальном aiohttp-сервере
+
+    Запрос подтверждается ответом 200 сразу после проверки секрета и разбора
+    JSON, а само обновление обрабатывается в отдельной задаче.
+    """
+
+    def __init__(
+            self,
+            process_update: Callable[[dict], Awaitable],
+            secret_token: str,
+            path: str = "/webhook",
+            host: str = "127.0.0.1",
+            port: int = 8080
+    ):
+        """
+        Args:
+            process_update: Корутина обработки обновления (dict из JSON Telegram)
+            secret_token: Секрет, который должен прийти в заголовке SECRET_HEADER
+            path: Путь webhook
+            host: Адрес, на котором слушает сервер
+            port: Порт сервера
+        """
+        self.process_update = process_update
+        self.secret_token = secret_token.encode()
+        self.path = path
+        self.host = host
+        self.port = port
+
+        self.app = web.Application()
+        self.app.router.add_post(path, self.handle)
+        self._runner: Optional[web.AppRunner] = None
+        self._tasks: set = set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Проверка секрета и постановка обновления в обработку"""
+        received_token = request.headers.get(SECRET_HEADER, "").encode()
+        if not secrets.compare_digest(received_token, self.secret_token):
+            return web.Response(status=401)
+
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+        # Обновление Telegram — всегда объект; список или число не обработать
+        if not isinstance(update, dict):
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: dict):
+        try:
+            await self.process_update(update)
+        except Exception as exc_update:
+            logger.error(f"Ошибка обработки обновления {update.get('update_id')}: {exc_update}", exc_info=True)
+
+    async def start(self):
+        """Запуск HTTP-сервера"""
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Webhook принимает обновления на http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self, timeout: float = 10.0):
+        """Остановка приёма и ожидание обновлений, которые ещё обрабатываются"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+        if self._tasks:
+            logger.info(f"Ожидание обработки {len(self._tasks)} обновлений...")
+            await asyncio.wait(set(self._tasks), timeout=timeout)
@@ -0,0 +1,351 @@
+# workers.py
+"""
+Многопроцессный режим: фронт принимает обновления (polling или webhook) и
+раздаёт их N процессам-обработчикам по хешу user_id через unix-сокеты.
+
+Все обновления одного пользователя попадают в один процесс и приходят туда
+по одному соединению в порядке получения, поэтому кэш сессий процесса
+остаётся для его пользователей источником истины.
+
+Формат кадра: 4 байта длины (big-endian) и JSON обновления Telegram.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import struct
+import sys
+from typing import Awaitable, Callable, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct('>I')
+# Обновление Telegram заведомо меньше; больший кадр — признак повреждённого потока
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+# Поля объектов обновления, в которых может быть пользователь
+_USER_FIELDS = ("from", "user", "actor_chat")
+
+
+def user_id_of(update: dict) -> Optional[int]:
+    """ID пользователя, от которого пришло обновление (или чата, если пользователя нет)"""
+    for key, value in update.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        for field in _USER_FIELDS:
+            user = value.get(field)
+            if isinstance(user, dict) and "id" in user:
+                return user["id"]
+        chat = value.get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+    return None
+
+
+def shard_of(update: dict, count: int) -> int:
+    """Номер процесса-обработчика для обновления"""
+    user_id = user_id_of(update)
+    return user_id % count if user_id is not None else 0
+
+
+def encode_frame(update: dict) -> bytes:
+    data = json.dumps(update, ensure_ascii=False, separators=(",", ":")).encode()
+    return FRAME_HEADER.pack(len(data)) + data
+
+
+class WorkerServer:
+    """
+    Приём обновлений от фронта в процессе-обработчике
+
+    Каждое обновление обрабатывается в отдельной задаче, как в webhook-режиме.
+    """
+
+    def __init__(self, process_update: Callable[[dict], Awaitable], socket_path: str):
+        """
+        Args:
+            process_update: Корутина обработки обновления (dict из JSON Telegram)
+            socket_path: Путь unix-сокета
+        """
+        self.process_update = process_update
+        self.socket_path = socket_path
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: set = set()
+        # Устанавливается, когда фронт закрыл соединение (остановился или упал)
+        self.disconnected = asyncio.Event()
+
+    async def start(self):
+        """Запуск приёма соединений"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle_connection, path=self.socket_path)
+        logger.info(f"Обработчик принимает обновления на {self.socket_path}")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                (size,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                if size > MAX_FRAME_SIZE:
+                    logger.error(f"Слишком большой кадр от фронта: {size} байт, соединение закрыто")
+                    break
+                update = json.loads(await reader.readexactly(size))
+
+                task = asyncio.create_task(self._process(update))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            self.disconnected.set()
+
+    async def _process(self, update: dict):
+        try:
+            await self.process_update(update)
+        except Exception as exc_update:
+            logger.error(f"Ошибка обработки обновления {update.get('update_id')}: {exc_update}", exc_info=True)
+
+    async def stop(self, timeout: float = 10.0):
+        """Остановка приёма и ожидание обновлений, которые ещё обрабатываются"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+        if self._tasks:
+            logger.info(f"Ожидание обработки {len(self._tasks)} обновлений...")
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+
+class WorkerProcess:
+    """
+    Процесс-обработчик под управлением фронта и соединение с ним
+
+    Кадры копятся в очереди процесса и отправляются отдельной задачей, поэтому
+    перезапуск одного процесса не задерживает обновления остальных.
+    """
+
+    def __init__(self, index: int, socket_path: str, argv: List[str], env: dict, queue_size: int):
+        self.index = index
+        self.socket_path = socket_path
+        self.argv = argv
+        self.env = env
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connected = asyncio.Event()
+        self._sender: Optional[asyncio.Task] = None
+
+    async def spawn(self):
+        """Запуск процесса и подключение к его сокету"""
+        self._connected.clear()
+        # Своя сессия: Ctrl+C в терминале получает только фронт, а он останавливает
+        # обработчики сам, после передачи им оставшихся обновлений
+        self.process = await asyncio.create_subprocess_exec(*self.argv, env=self.env, start_new_session=True)
+        logger.info(f"Запущен обработчик {self.index} (pid {self.process.pid})")
+
+        # Процесс открывает сокет после подключения к базе и регистрации обработчиков
+        while True:
+            if self.process.returncode is not None:
+                raise RuntimeError(f"Обработчик {self.index} завершился при запуске с кодом {self.process.returncode}")
+            try:
+                _, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(0.1)
+        self._connected.set()
+
+        if self._sender is None:
+            self._sender = asyncio.create_task(self._send_loop())
+
+    def disconnect(self):
+        """Пометка соединения разорванным (процесс завершился)"""
+        self._connected.clear()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def _send_loop(self):
+        frame = None
+        while True:
+            if frame is None:
+                frame = await self.queue.get()
+            await self._connected.wait()
+            try:
+                self._writer.write(frame)
+                await self._writer.drain()
+            except (ConnectionError, RuntimeError) as exc_send:
+                # Процесс упал: кадр отправим после перезапуска
+                logger.error(f"Соединение с обработчиком {self.index} потеряно: {exc_send}")
+                self._connected.clear()
+                continue
+            frame = None
+
+    async def stop(self, timeout: float):
+        """Отправка оставшихся кадров, закрытие соединения и штатная остановка процесса"""
+        if self._sender is not None:
+            if self._connected.is_set() and not self.queue.empty():
+                logger.info(f"Передача обработчику {self.index} оставшихся обновлений: {self.queue.qsize()}")
+                while not self.queue.empty() and self._connected.is_set():
+                    await asyncio.sleep(0.01)
+            self._sender.cancel()
+            self._sender = None
+            if not self.queue.empty():
+                logger.warning(f"Обработчик {self.index} не подключён, отброшено обновлений: {self.queue.qsize()}")
+
+        self.disconnect()
+        if self.process is None or self.process.returncode is not None:
+            return
+
+        self.process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"Обработчик {self.index} не остановился за {timeout} с, завершаем принудительно")
+            self.process.kill()
+            await self.process.wait()
+
+
+class WorkerPool:
+    """
+    Запуск N процессов-обработчиков, маршрутизация обновлений и перезапуск
+    упавших процессов
+    """
+
+    def __init__(self, count: int, socket_dir: str, script: str, env: Optional[dict] = None,
+                 queue_size: int = 10_000):
+        """
+        Args:
+            count: Количество процессов
+            socket_dir: Каталог для unix-сокетов
+            script: Скрипт процесса-обработчика (bot.py)
+            env: Переменные окружения процессов (к ним добавляются BOT_ROLE, WORKER_INDEX, WORKER_SOCKET)
+            queue_size: Обновлений в очереди одного процесса, после которых приём ждёт
+        """
+        self.count = count
+        self.workers = []
+        for index in range(count):
+            socket_path = os.path.join(socket_dir, f"worker-{index}.sock")
+            worker_env = dict(env if env is not None else os.environ)
+            worker_env.update(BOT_ROLE="worker", WORKER_INDEX=str(index), WORKER_SOCKET=socket_path)
+            self.workers.append(WorkerProcess(index, socket_path, [sys.executable, script], worker_env, queue_size))
+        self._monitors: set = set()
+        self._stopping = False
+        self.routed = [0] * count
+
+    async def start(self):
+        """Запуск всех процессов"""
+        await asyncio.gather(*(worker.spawn() for worker in self.workers))
+        for worker in self.workers:
+            task = asyncio.create_task(self._monitor(worker))
+            self._monitors.add(task)
+            task.add_done_callback(self._monitors.discard)
+        logger.info(f"Запущено обработчиков: {self.count}")
+
+    async def _monitor(self, worker: WorkerProcess):
+        while not self._stopping:
+            code = await worker.process.wait()
+            if self._stopping:
+                return
+            worker.disconnect()
+            logger.error(f"Обработчик {worker.index} завершился с кодом {code}, перезапуск")
+            await asyncio.sleep(1)
+            try:
+                await worker.spawn()
+            except Exception as exc_spawn:
+                logger.error(f"Не удалось перезапустить обработчик {worker.index}: {exc_spawn}")
+
+    async def route(self, update: dict):
+        """Передача обновления процессу, который обслуживает его пользователя"""
+        index = shard_of(update, self.count)
+        self.routed[index] += 1
+        await self.workers[index].queue.put(encode_frame(update))
+
+    @property
+    def backlog(self) -> int:
+        """Обновления, ещё не переданные обработчикам"""
+        return sum(worker.queue.qsize() for worker in self.workers)
+
+    async def stop(self, timeout: float = 15.0):
+        """Остановка процессов (каждый дописывает свой буфер и закрывает базу)"""
+        self._stopping = True
+        for task in list(self._monitors):
+            task.cancel()
+        await asyncio.gather(*(worker.stop(timeout) for worker in self.workers))
+        logger.info("Обработчики остановлены")
+
+
+async def poll_updates(
+        api_url: str,
+        route: Callable[[dict], Awaitable],
+        stop_event: asyncio.Event,
+        allowed_updates: Optional[list] = None,
+        timeout: int = 30
+):
+    """
+    Long polling getUpdates без разбора обновлений в модели aiogram
+
+    Фронт только читает JSON и раздаёт обновления, поэтому ему не нужны
+    pydantic-объекты, которые всё равно пересоберёт процесс-обработчик.
+
+    Args:
+        api_url: Адрес метода getUpdates (с токеном)
+        route: Корутина передачи обновления обработчику
+        stop_event: Событие остановки
+        allowed_updates: Типы обновлений
+        timeout: Таймаут long polling в секундах
+    """
+    offset = None
+    backoff = 1.0
+    params = {"timeout": timeout}
+    if allowed_updates is not None:
+        params["allowed_updates"] = allowed_updates
+
+    async with aiohttp.ClientSession() as session:
+        while not stop_event.is_set():
+            if offset is not None:
+                params["offset"] = offset
+            request = asyncio.ensure_future(
+                session.post(api_url, json=params, timeout=aiohttp.ClientTimeout(total=timeout + 10))
+            )
+            stop_wait = asyncio.ensure_future(stop_event.wait())
+            await asyncio.wait({request, stop_wait}, return_when=asyncio.FIRST_COMPLETED)
+            if not request.done():
+                request.cancel()
+                break
+            stop_wait.cancel()
+
+            try:
+                # Ответ освобождается и тогда, когда его тело не удалось разобрать
+                async with request.result() as response:
+                    data = await response.json()
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exc_poll:
+                logger.error(f"Ошибка getUpdates: {exc_poll}, повтор через {backoff:.0f} с")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            if not data.get("ok"):
+                retry_after = data.get("parameters", {}).get("retry_after")
+                delay = retry_after or backoff
+                logger.error(f"getUpdates вернул ошибку: {data.get('description')}, повтор через {delay:.0f} с")
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, 30.0)
+                continue
+
+            backoff = 1.0
+            for update in data["result"]:
+                offset = update["update_id"] + 1
+                await route(update)
+
+        # Подтверждаем полученные обновления, чтобы Telegram не прислал их снова после перезапуска
+        if offset is not None:
+            try:
+                async with session.post(api_url, json={"offset": offset, "timeout": 0, "limit": 1}) as response:
+                    await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as exc_confirm:
+                logger.error(f"Не удалось подтвердить полученные обновления: {exc_confirm}")
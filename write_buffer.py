@@ -0,0 +1,185 @@
+# write_buffer.py
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PendingState:
+    """Накопленные, но ещё не записанные изменения состояния квиза одного пользователя"""
+
+    __slots__ = ('reset', 'session_data', 'question_index', 'correct_delta')
+
+    def __init__(self):
+        self.reset = False  # сессия была сброшена (вопросы и счётчики заданы заново)
+        self.session_data = None  # упакованная сессия при сбросе или её замене
+        self.question_index = None  # последний установленный индекс вопроса
+        self.correct_delta = 0  # сколько правильных ответов добавить
+
+    def merge_newer(self, newer: 'PendingState'):
+        """Применение более поздних изменений поверх текущих"""
+        if newer.reset:
+            self.reset = True
+            self.session_data = newer.session_data
+            self.question_index = newer.question_index
+            self.correct_delta = newer.correct_delta
+            return
+
+        if newer.session_data is not None:
+            self.session_data = newer.session_data
+        if newer.question_index is not None:
+            self.question_index = newer.question_index
+        self.correct_delta += newer.correct_delta
+
+    def apply(self, question_index: int, correct_answers: int) -> tuple:
+        """Наложение изменений на состояние, прочитанное из базы"""
+        if self.reset:
+            question_index, correct_answers = 0, 0
+        if self.question_index is not None:
+            question_index = self.question_index
+        return question_index, correct_answers + self.correct_delta
+
+
+class WriteBehindBuffer:
+    """
+    Буфер отложенной записи прогресса квиза
+
+    Изменения, которые приходят на каждый ответ, копятся в памяти и
+    сворачиваются по пользователю, а затем записываются одной транзакцией
+    раз в flush_interval секунд или после max_operations изменений.
+    Чтения должны накладывать незаписанные изменения через overlay().
+    """
+
+    def __init__(
+            self,
+            writer: Callable[[Dict[int, PendingState]], Awaitable[None]],
+            flush_interval: float = 0.05,
+            max_operations: int = 500
+    ):
+        """
+        Args:
+            writer: Корутина, записывающая пачку изменений одной транзакцией
+            flush_interval: Максимальная задержка записи в секундах
+            max_operations: Число изменений, после которого запись начинается сразу
+        """
+        self._writer = writer
+        self.flush_interval = flush_interval
+        self.max_operations = max_operations
+
+        self._operations = 0
+        self._pending: Dict[int, PendingState] = {}
+        self._flushing: Dict[int, PendingState] = {}
+        self._flush_lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # Увеличивается после каждой успешно записанной пачки. Читатели сравнивают
+        # его до и после запроса, чтобы не наложить изменения на устаревшую строку.
+        self.generation = 0
+
+    def start(self):
+        """Запуск фоновой задачи периодической записи"""
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановка фоновой задачи и запись всех накопленных изменений"""
+        if self._task is not None:
+            # Не отменяем задачу посреди записи: просим её завершиться после текущей пачки
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def _state(self, user_id: int) -> PendingState:
+        self._operations += 1
+        if self._operations >= self.max_operations:
+            self._wakeup.set()
+
+        state = self._pending.get(user_id)
+        if state is None:
+            state = self._pending[user_id] = PendingState()
+        return state
+
+    def reset(self, user_id: int, session_data: bytes):
+        """Сброс сессии пользователя: предыдущие незаписанные изменения теряют смысл"""
+        state = self._state(user_id)
+        state.reset = True
+        state.session_data = session_data
+        state.question_index = None
+        state.correct_delta = 0
+
+    def set_session(self, user_id: int, session_data: bytes):
+        """Замена упакованной сессии без сброса прогресса"""
+        self._state(user_id).session_data = session_data
+
+    def set_index(self, user_id: int, question_index: int):
+        """Установка индекса текущего вопроса"""
+        self._state(user_id).question_index = question_index
+
+    def add_correct(self, user_id: int, delta: int = 1):
+        """Увеличение счётчика правильных ответов"""
+        self._state(user_id).correct_delta += delta
+
+    def pending_for(self, user_id: int) -> Optional[PendingState]:
+        """Все незаписанные изменения пользователя (включая записываемые сейчас)"""
+        flushing = self._flushing.get(user_id)
+        pending = self._pending.get(user_id)
+        if flushing is None or pending is None:
+            return pending or flushing
+
+        combined = PendingState()
+        combined.merge_newer(flushing)
+        combined.merge_newer(pending)
+        return combined
+
+    def overlay(self, user_id: int, question_index: int, correct_answers: int) -> tuple:
+        """Наложение незаписанных изменений на состояние из базы"""
+        state = self.pending_for(user_id)
+        if state is None:
+            return question_index, correct_answers
+        return state.apply(question_index, correct_answers)
+
+    async def flush(self):
+        """Запись всех накопленных изменений одной транзакцией"""
+        async with self._flush_lock:
+            self._wakeup.clear()
+            self._operations = 0
+            if not self._pending:
+                return
+
+            self._flushing, self._pending = self._pending, {}
+            try:
+                await self._writer(self._flushing)
+            except BaseException:
+                # Возвращаем пачку в очередь, более поздние изменения накладываем сверху
+                for user_id, newer in self._pending.items():
+                    older = self._flushing.get(user_id)
+                    if older is None:
+                        self._flushing[user_id] = newer
+                    else:
+                        older.merge_newer(newer)
+                self._pending = self._flushing
+                raise
+            else:
+                self.generation += 1
+            finally:
+                self._flushing = {}
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self._stopping:
+                return
+
+            try:
+                await self.flush()
+            except Exception as exc_flush:
+                logger.error(f"Ошибка записи буфера прогресса квиза: {exc_flush}")